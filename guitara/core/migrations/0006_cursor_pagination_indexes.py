@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-17 00:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_create_systemlog'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='systemlog',
+            index=models.Index(fields=['timestamp', 'id'], name='systemlog_keyset_idx'),
+        ),
+    ]
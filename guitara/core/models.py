@@ -44,6 +44,10 @@ class SystemLog(models.Model):
         ordering = ['-timestamp']
         managed = True  # Let Django manage this table to ensure it exists
         db_table = 'core_systemlog'  # Match the Supabase table name
+        indexes = [
+            # Cursor pagination seeks on (timestamp, id)
+            models.Index(fields=['timestamp', 'id'], name='systemlog_keyset_idx'),
+        ]
     
     def __str__(self):
         user_str = f"User {self.user_id}" if self.user_id else "Anonymous"
@@ -5,6 +5,7 @@ This enables background task processing for improved performance.
 
 import os
 from celery import Celery
+from celery.signals import worker_ready
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "guitara.settings")
@@ -37,6 +38,12 @@ app.conf.update(
         "scheduling.tasks.send_appointment_notifications": {"queue": "notifications"},
         "scheduling.tasks.cleanup_expired_appointments": {"queue": "maintenance"},
         "scheduling.tasks.auto_cancel_overdue_appointments": {"queue": "maintenance"},
+        "scheduling.tasks.warm_dashboard_caches": {"queue": "maintenance"},
+        "scheduling.tasks.prune_appointment_tombstones": {"queue": "maintenance"},
+        "scheduling.tasks.reconcile_unread_notification_counts": {
+            "queue": "maintenance"
+        },
+        "scheduling.tasks.archive_read_notifications": {"queue": "maintenance"},
     },
     # Beat schedule for periodic tasks
     beat_schedule={
@@ -52,10 +59,32 @@ app.conf.update(
             "task": "scheduling.tasks.sync_appointment_statuses",
             "schedule": 60.0,  # Every 1 minute
         },
+        "warm-dashboard-caches": {
+            "task": "scheduling.tasks.warm_dashboard_caches",
+            "schedule": 60.0,  # Every 1 minute, matching today's cache timeout
+        },
+        "prune-appointment-tombstones": {
+            "task": "scheduling.tasks.prune_appointment_tombstones",
+            "schedule": 86400.0,  # Daily
+        },
+        "reconcile-unread-notification-counts": {
+            "task": "scheduling.tasks.reconcile_unread_notification_counts",
+            "schedule": 3600.0,  # Hourly
+        },
+        "archive-read-notifications": {
+            "task": "scheduling.tasks.archive_read_notifications",
+            "schedule": 86400.0,  # Daily
+        },
     },
 )
 
 
+@worker_ready.connect
+def warm_caches_on_startup(sender, **kwargs):
+    """Start a fresh worker with warm dashboard caches"""
+    sender.app.send_task("scheduling.tasks.warm_dashboard_caches")
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f"Request: {self.request!r}")
@@ -22,6 +22,7 @@ from .serializers import (
 )
 from core.models import CustomUser
 from core.storage_service import storage_service
+from scheduling.count_service import count_service
 from .models import RegistrationMaterial
 from .serializers import RegistrationMaterialSerializer
 
@@ -58,6 +59,7 @@ def insert_into_table(table_name, data):
         logger.error(f"No data returned after insert into {table_name}")
         return None, "No data returned after insert"
 
+    count_service.invalidate_table(table_name)
     return result.data, None
 
 
@@ -69,13 +71,17 @@ class RegisterTherapist(APIView):
         page_size = int(request.query_params.get("page_size", 12))
         offset = (page - 1) * page_size
 
-        # Get total count first
-        count_result = (
-            supabase.table("registration_therapist")
-            .select("*", count="exact")
-            .execute()
+        # Get total count first (cached until the table changes)
+        total_count = (
+            count_service.cached_external_count(
+                "registration_therapist",
+                lambda: supabase.table("registration_therapist")
+                .select("*", count="exact", head=True)
+                .execute()
+                .count,
+            )
+            or 0
         )
-        total_count = count_result.count if hasattr(count_result, "count") else 0
 
         # Get paginated data
         result = (
@@ -284,17 +290,23 @@ class RegisterDriver(APIView):
         page_size = int(request.query_params.get("page_size", 12))
         offset = (page - 1) * page_size
 
-        # Get total count first
+        # Get total count first (cached until the table changes)
         def count_operation():
             return (
                 supabase.table("registration_driver")
-                .select("*", count="exact")
+                .select("*", count="exact", head=True)
                 .execute()
             )
 
-        count_result, count_error = safe_supabase_operation(count_operation, timeout=10)
+        def fetch_count():
+            count_result, count_error = safe_supabase_operation(
+                count_operation, timeout=10
+            )
+            return getattr(count_result, "count", None) if count_result else None
+
         total_count = (
-            count_result.count if count_result and hasattr(count_result, "count") else 0
+            count_service.cached_external_count("registration_driver", fetch_count)
+            or 0
         )
 
         def operation():
@@ -531,11 +543,17 @@ class RegisterOperator(APIView):
         page_size = int(request.query_params.get("page_size", 12))
         offset = (page - 1) * page_size
 
-        # Get total count first
-        count_result = (
-            supabase.table("registration_operator").select("*", count="exact").execute()
+        # Get total count first (cached until the table changes)
+        total_count = (
+            count_service.cached_external_count(
+                "registration_operator",
+                lambda: supabase.table("registration_operator")
+                .select("*", count="exact", head=True)
+                .execute()
+                .count,
+            )
+            or 0
         )
-        total_count = count_result.count if hasattr(count_result, "count") else 0
 
         # Get paginated data
         result = (
@@ -812,8 +830,8 @@ class RegisterClient(APIView):
         page_size = int(request.query_params.get("page_size", 12))
         offset = (page - 1) * page_size
 
-        # Get total count
-        total_count = Client.objects.count()
+        # Get total count (cached until a client is added or removed)
+        total_count = count_service.cached_count(Client.objects.all())
 
         # Get paginated data
         clients = Client.objects.all().order_by("id")[offset : offset + page_size]
@@ -995,11 +1013,17 @@ class RegisterMaterial(APIView):
         page_size = int(request.query_params.get("page_size", 12))
         offset = (page - 1) * page_size
 
-        # Get total count first
-        count_result = (
-            supabase.table("registration_material").select("*", count="exact").execute()
+        # Get total count first (cached until the table changes)
+        total_count = (
+            count_service.cached_external_count(
+                "registration_material",
+                lambda: supabase.table("registration_material")
+                .select("*", count="exact", head=True)
+                .execute()
+                .count,
+            )
+            or 0
         )
-        total_count = count_result.count if hasattr(count_result, "count") else 0
 
         # Fetch paginated materials from Supabase
         result = (
@@ -1150,8 +1174,8 @@ class RegisterService(APIView):
             page_size = int(request.query_params.get("page_size", 12))
             offset = (page - 1) * page_size
 
-            # Get total count
-            total_count = Service.objects.count()
+            # Get total count (cached until a service changes)
+            total_count = count_service.cached_count(Service.objects.all())
 
             # Use prefetch_related for optimized query
             services = (
@@ -1228,14 +1252,16 @@ class RegisterService(APIView):
                     page_size = int(request.query_params.get("page_size", 100))
                     offset = (page - 1) * page_size
 
-                    # Get total count first
-                    count_result = (
-                        supabase.table("registration_service")
-                        .select("*", count="exact")
-                        .execute()
-                    )
+                    # Get total count first (cached until the table changes)
                     total_count = (
-                        count_result.count if hasattr(count_result, "count") else 0
+                        count_service.cached_external_count(
+                            "registration_service",
+                            lambda: supabase.table("registration_service")
+                            .select("*", count="exact", head=True)
+                            .execute()
+                            .count,
+                        )
+                        or 0
                     )
 
                     # Fetch from Supabase
@@ -0,0 +1,423 @@
+"""
+Read-only projection path for appointment lists
+Appointments are read with values() and explicit joins, services, therapists,
+materials and rejections with one set-based query each, and converted by a
+plan compiled once from AppointmentSerializer's own fields, so the output
+matches the serializer without building model instances. JSON is encoded
+with orjson when it is installed.
+"""
+
+import logging
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    # Optional; DRF's renderer produces the same bytes, only slower
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+class UnsupportedField(Exception):
+    """A serializer field the projection cannot reproduce"""
+
+
+def _convert(field, column):
+    to_representation = field.to_representation
+
+    def convert(row):
+        value = row[column]
+        return None if value is None else to_representation(value)
+
+    return convert
+
+
+def _raw(column):
+    return lambda row: row[column]
+
+
+class AppointmentProjection:
+    """
+    represent(ids) returns what AppointmentSerializer(many=True).data would
+    for those appointments, in the given order.
+    """
+
+    # Method fields computed from the projected rows
+    METHOD_FIELDS = {
+        "total_duration",
+        "total_price",
+        "both_parties_accepted",
+        "pending_acceptances",
+        "formatted_date",
+        "formatted_start_time",
+        "formatted_end_time",
+        "urgency_level",
+        "material_usage_summary",
+        "appointment_materials",
+    }
+    MATERIAL_COLUMNS = {
+        "id": "id",
+        "name": "inventory_item__name",
+        "category": "inventory_item__category",
+        "quantity_used": "quantity_used",
+        "unit": "inventory_item__unit",
+        "usage_type": "usage_type",
+        "is_reusable": "is_reusable",
+        "deducted_at": "deducted_at",
+        "returned_at": "returned_at",
+        "notes": "notes",
+    }
+
+    def __init__(self):
+        self._compiled = None
+        self._unsupported = False
+
+    def available(self):
+        if not getattr(settings, "APPOINTMENT_LIST_PROJECTION", True):
+            return False
+        if self._compiled is None and not self._unsupported:
+            try:
+                self._compiled = self._compile()
+            except UnsupportedField as e:
+                logger.warning(f"Appointment projection disabled: {e}")
+                self._unsupported = True
+        return self._compiled is not None
+
+    # ------------------------------------------------------------------
+    # Compilation
+    # ------------------------------------------------------------------
+
+    def _compile_field(self, owner, field, model, prefix=""):
+        """
+        Columns and a row -> value step for one serializer field: a model
+        field, a forward relation (id or joined nested serializer) or a
+        method field that only reads the model's plain fields
+        """
+        label = f"{owner.__class__.__name__}.{field.field_name}"
+        if isinstance(field, serializers.SerializerMethodField):
+            method = getattr(owner, field.method_name)
+            names = [
+                model_field.attname
+                for model_field in model._meta.concrete_fields
+                if not model_field.is_relation
+            ]
+
+            def call_method(row):
+                values = {name: row[prefix + name] for name in names}
+                return method(SimpleNamespace(**values))
+
+            return {prefix + name for name in names}, call_method
+
+        try:
+            model_field = model._meta.get_field(field.source)
+        except Exception:
+            raise UnsupportedField(label)
+        column = prefix + getattr(model_field, "attname", field.source)
+
+        if isinstance(field, serializers.BaseSerializer):
+            if (
+                getattr(field, "many", False)
+                or not model_field.concrete
+                or not (model_field.many_to_one or model_field.one_to_one)
+            ):
+                raise UnsupportedField(label)
+            columns, build = self._compile_serializer(
+                field, model_field.related_model, f"{prefix}{field.source}__"
+            )
+            return columns | {column}, lambda row: (
+                None if row[column] is None else build(row)
+            )
+        if isinstance(field, serializers.RelatedField):
+            if not model_field.concrete or model_field.many_to_many:
+                raise UnsupportedField(label)
+            return {column}, _raw(column)
+        if isinstance(field, serializers.ManyRelatedField) or model_field.is_relation:
+            raise UnsupportedField(label)
+        return {column}, _convert(field, column)
+
+    def _compile_serializer(self, serializer, model, prefix=""):
+        """Columns and a row -> dict builder for a nested serializer"""
+        columns = {prefix + model._meta.pk.attname}
+        steps = []
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            field_columns, step = self._compile_field(serializer, field, model, prefix)
+            columns |= field_columns
+            steps.append((field.field_name, step))
+
+        def build(row):
+            return {name: step(row) for name, step in steps}
+
+        return columns, build
+
+    def _compile_many(self, field, model, m2m_name):
+        """Query plan for an m2m field: (through model, source FK, target prefix)"""
+        m2m_field = model._meta.get_field(m2m_name)
+        through = m2m_field.remote_field.through
+        source = m2m_field.m2m_field_name()
+        target = m2m_field.m2m_reverse_field_name()
+        columns, build = self._compile_serializer(
+            field.child, m2m_field.related_model, f"{target}__"
+        )
+        return {
+            "through": through,
+            "source": f"{source}_id",
+            "target": f"{target}_id",
+            "prefix": f"{target}__",
+            "columns": columns | {f"{source}_id", f"{target}_id"},
+            "build": build,
+        }
+
+    def _compile(self):
+        from .models import Appointment, AppointmentRejection
+        from .serializers import AppointmentSerializer
+
+        serializer = AppointmentSerializer()
+        fields = [field for field in serializer.fields.values() if not field.write_only]
+        self._serializer = serializer
+
+        columns = {"id", "date", "start_time", "end_time", "status"}
+        steps = []
+        many = {}
+        rejection = None
+        for field in fields:
+            name = field.field_name
+            if name in self.METHOD_FIELDS:
+                steps.append((name, None))
+            elif name in ("therapists", "services"):
+                steps.append((name, None))
+            elif name in ("therapists_details", "services_details"):
+                many[field.source] = self._compile_many(
+                    field, Appointment, field.source
+                )
+                steps.append((name, None))
+            elif name == "rejection_details":
+                rejection = self._compile_serializer(field, AppointmentRejection)
+                steps.append((name, None))
+            else:
+                field_columns, step = self._compile_field(
+                    serializer, field, Appointment
+                )
+                columns |= field_columns
+                steps.append((name, step))
+        if set(many) != {"therapists", "services"} or rejection is None:
+            raise UnsupportedField("AppointmentSerializer relations changed")
+
+        # Names for pending_acceptances
+        columns.update(
+            {
+                "therapist_id",
+                "driver_id",
+                "therapist_accepted",
+                "driver_accepted",
+                "therapist__first_name",
+                "therapist__last_name",
+                "driver__first_name",
+                "driver__last_name",
+            }
+        )
+        return {
+            "columns": sorted(columns),
+            "steps": steps,
+            "many": many,
+            "rejection": rejection,
+        }
+
+    # ------------------------------------------------------------------
+    # Projection
+    # ------------------------------------------------------------------
+
+    def _load_related(self, ids):
+        from .models import AppointmentMaterial, AppointmentRejection
+
+        compiled = self._compiled
+        related = {
+            appointment_id: {"therapists": [], "services": [], "materials": []}
+            for appointment_id in ids
+        }
+
+        for name, plan in compiled["many"].items():
+            rows = (
+                plan["through"]
+                .objects.filter(**{f"{plan['source']}__in": ids})
+                .order_by("id")
+                .values(*plan["columns"])
+            )
+            for row in rows:
+                related[row[plan["source"]]][name].append(row)
+
+        for row in (
+            AppointmentMaterial.objects.filter(appointment_id__in=ids)
+            .order_by("id")
+            .values("appointment_id", *self.MATERIAL_COLUMNS.values())
+        ):
+            related[row["appointment_id"]]["materials"].append(
+                {key: row[column] for key, column in self.MATERIAL_COLUMNS.items()}
+            )
+
+        columns, build = compiled["rejection"]
+        for row in AppointmentRejection.objects.filter(
+            appointment_id__in=ids
+        ).values("appointment_id", *columns):
+            related[row["appointment_id"]]["rejection"] = build(row)
+        return related
+
+    def represent(self, ids):
+        from .material_usage_service import MaterialUsageService
+        from .models import Appointment
+
+        compiled = self._compiled
+        ids = list(ids)
+        if not ids:
+            return []
+        rows = {
+            row["id"]: row
+            for row in Appointment.objects.filter(id__in=ids).values(
+                *compiled["columns"]
+            )
+        }
+        related = self._load_related(ids)
+        therapist_plan = compiled["many"]["therapists"]
+        service_plan = compiled["many"]["services"]
+        serializer = self._serializer
+
+        representation = []
+        for appointment_id in ids:
+            row = rows.get(appointment_id)
+            if row is None:
+                continue
+            extra = related[appointment_id]
+            services = extra["services"]
+            therapists = extra["therapists"]
+            materials = extra["materials"]
+            timing = SimpleNamespace(
+                date=row["date"],
+                start_time=row["start_time"],
+                end_time=row["end_time"],
+                status=row["status"],
+            )
+            data = {}
+            for name, step in compiled["steps"]:
+                if step is not None:
+                    data[name] = step(row)
+                elif name == "therapists":
+                    data[name] = [item[therapist_plan["target"]] for item in therapists]
+                elif name == "services":
+                    data[name] = [item[service_plan["target"]] for item in services]
+                elif name == "therapists_details":
+                    data[name] = [therapist_plan["build"](item) for item in therapists]
+                elif name == "services_details":
+                    data[name] = [service_plan["build"](item) for item in services]
+                elif name == "rejection_details":
+                    data[name] = extra.get("rejection")
+                elif name == "total_duration":
+                    data[name] = self._total_duration(services, service_plan)
+                elif name == "total_price":
+                    data[name] = sum(
+                        item[f"{service_plan['prefix']}price"] for item in services
+                    )
+                elif name == "both_parties_accepted":
+                    data[name] = self._both_parties_accepted(row)
+                elif name == "pending_acceptances":
+                    data[name] = self._pending_acceptances(row)
+                elif name == "formatted_date":
+                    data[name] = serializer.get_formatted_date(timing)
+                elif name == "formatted_start_time":
+                    data[name] = serializer.get_formatted_start_time(timing)
+                elif name == "formatted_end_time":
+                    data[name] = serializer.get_formatted_end_time(timing)
+                elif name == "urgency_level":
+                    data[name] = serializer.get_urgency_level(timing)
+                elif name == "material_usage_summary":
+                    data[name] = MaterialUsageService.summarize_materials(materials)
+                elif name == "appointment_materials":
+                    data[name] = [dict(material) for material in materials]
+            representation.append(data)
+        return representation
+
+    @staticmethod
+    def _total_duration(services, plan):
+        """Mirrors AppointmentSerializer.get_total_duration"""
+        column = f"{plan['prefix']}duration"
+        total_seconds = 0
+        for service in services:
+            duration = service[column]
+            if duration:
+                if hasattr(duration, "total_seconds"):
+                    total_seconds += duration.total_seconds()
+                elif isinstance(duration, (int, float)):
+                    total_seconds += duration
+        return int(total_seconds / 60)
+
+    @staticmethod
+    def _both_parties_accepted(row):
+        """Mirrors Appointment.both_parties_accepted"""
+        therapist_accepted = (
+            row["therapist_accepted"] if row["therapist_id"] is not None else True
+        )
+        driver_accepted = (
+            row["driver_accepted"] if row["driver_id"] is not None else True
+        )
+        return therapist_accepted and driver_accepted
+
+    @staticmethod
+    def _pending_acceptances(row):
+        """Mirrors Appointment.get_pending_acceptances"""
+        pending = []
+        for role, label in (("therapist", "Therapist"), ("driver", "Driver")):
+            if row[f"{role}_id"] is not None and not row[f"{role}_accepted"]:
+                full_name = (
+                    f"{row[f'{role}__first_name']} {row[f'{role}__last_name']}".strip()
+                )
+                pending.append(f"{label} ({full_name})")
+        return pending
+
+    # ------------------------------------------------------------------
+    # Encoding
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def encode(data):
+        """The bytes DRF's JSONRenderer would produce for data (compact form)"""
+        if orjson is None:
+            return JSONRenderer().render(data)
+        content = orjson.dumps(
+            data,
+            default=JSONEncoder().default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+        # DRF escapes these two so the JSON is also valid JavaScript
+        return content.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
+
+    def render(self, request, response):
+        """
+        Encode a Response's data directly when the client negotiated plain
+        compact JSON; other renderers (browsable API, indent) keep DRF's path
+        """
+        renderer = getattr(request, "accepted_renderer", None)
+        media_type = getattr(request, "accepted_media_type", "") or ""
+        if type(renderer) is not JSONRenderer or "indent" in media_type:
+            return response
+        fast = HttpResponse(
+            self.encode(response.data),
+            status=response.status_code,
+            content_type="application/json",
+        )
+        for header, value in response.items():
+            if header.lower() != "content-type":
+                fast[header] = value
+        return fast
+
+
+# Global instance
+appointment_projection = AppointmentProjection()
@@ -0,0 +1,470 @@
+"""
+Batch auto-assignment of therapists and drivers to pending appointments
+Builds a cost matrix over feasible (appointment, staff) pairs and solves it
+as a min-cost assignment, one round per role until nothing more fits
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+
+from .interval_index import DayIntervalIndex, normalize_range
+from .occupancy import DayOccupancy, minute_masks
+from .workload import workload_counters
+
+logger = logging.getLogger(__name__)
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # scipy is optional, fall back to the numpy solver below
+    linear_sum_assignment = None
+
+INFEASIBLE = 1e9
+# Hungarian is cubic; past this many cells the greedy solver is used instead
+HUNGARIAN_MAX_CELLS = 250_000
+
+WORKLOAD_WEIGHT = 10.0  # per appointment handled in the past week
+IDLE_GAP_WEIGHT = 1.0  # per hour waiting since the staff member's last booking
+TIGHT_TURNAROUND_MINUTES = 30
+TIGHT_TURNAROUND_PENALTY = 25.0  # not enough time to travel between bookings
+
+
+class StaleAssignmentPlan(Exception):
+    """
+    Raised when appointments changed between planning and applying, or a
+    planned staff member was deactivated or booked elsewhere in the meantime
+    """
+
+
+def _hungarian(cost):
+    """
+    Min-cost assignment for a rows <= cols matrix (shortest augmenting path).
+    Returns the assigned column for each row.
+    """
+    rows, cols = cost.shape
+    u = np.zeros(rows + 1)
+    v = np.zeros(cols + 1)
+    owner = np.zeros(cols + 1, dtype=int)  # row (1-based) holding each column
+    way = np.zeros(cols + 1, dtype=int)
+
+    for row in range(1, rows + 1):
+        owner[0] = row
+        column = 0
+        min_reduced = np.full(cols + 1, np.inf)
+        used = np.zeros(cols + 1, dtype=bool)
+        while True:
+            used[column] = True
+            current_row = owner[column]
+            reduced = cost[current_row - 1] - u[current_row] - v[1:]
+            free = ~used[1:]
+            improved = free & (reduced < min_reduced[1:])
+            min_reduced[1:][improved] = reduced[improved]
+            way[1:][improved] = column
+
+            candidates = np.where(free, min_reduced[1:], np.inf)
+            next_column = int(np.argmin(candidates)) + 1
+            delta = candidates[next_column - 1]
+
+            u[owner[used]] += delta
+            v[used] -= delta
+            min_reduced[1:][free] -= delta
+            column = next_column
+            if owner[column] == 0:
+                break
+
+        while column:
+            previous = way[column]
+            owner[column] = owner[previous]
+            column = previous
+
+    assignment = np.full(rows, -1, dtype=int)
+    for column in range(1, cols + 1):
+        if owner[column]:
+            assignment[owner[column] - 1] = column - 1
+    return assignment
+
+
+def _greedy(cost):
+    """Cheapest-first assignment, used for very large matrices"""
+    rows, cols = cost.shape
+    assignment = np.full(rows, -1, dtype=int)
+    taken_rows = np.zeros(rows, dtype=bool)
+    taken_cols = np.zeros(cols, dtype=bool)
+    for flat in np.argsort(cost, axis=None, kind="stable"):
+        row, column = divmod(int(flat), cols)
+        if cost[row, column] >= INFEASIBLE:
+            break
+        if taken_rows[row] or taken_cols[column]:
+            continue
+        assignment[row] = column
+        taken_rows[row] = taken_cols[column] = True
+    return assignment
+
+
+def solve_assignment(cost):
+    """Return (row, column) pairs of a min-cost assignment skipping infeasible cells"""
+    rows, cols = cost.shape
+    if not rows or not cols:
+        return []
+
+    if rows * cols > HUNGARIAN_MAX_CELLS:
+        assignment = _greedy(cost)
+    elif linear_sum_assignment is not None:
+        row_ids, column_ids = linear_sum_assignment(cost)
+        assignment = np.full(rows, -1, dtype=int)
+        assignment[row_ids] = column_ids
+    elif rows <= cols:
+        assignment = _hungarian(cost)
+    else:
+        transposed = _hungarian(cost.T)
+        assignment = np.full(rows, -1, dtype=int)
+        for column, row in enumerate(transposed):
+            if row >= 0:
+                assignment[row] = column
+
+    return [
+        (row, int(column))
+        for row, column in enumerate(assignment)
+        if column >= 0 and cost[row, column] < INFEASIBLE
+    ]
+
+
+class AssignmentPlanner:
+    """Plans therapist and driver assignments for one day"""
+
+    def __init__(self, day):
+        self.day = day
+        self.index = DayIntervalIndex(day)
+        self.workload = {}
+        self.extra_busy = {}
+
+    def _load_workload(self, user_ids):
+        """Appointments handled by each user in the past week"""
+        self.workload.update(workload_counters.scores(user_ids, self.day))
+
+    def _cost_matrix(self, slots, user_ids):
+        """
+        Vectorized cost of giving each slot to each user; infeasible pairs
+        (preferences not met, no covering availability, overlapping bookings)
+        get INFEASIBLE. Intervals are padded per user so coverage, overlap
+        and the previous booking are array comparisons over every cell.
+        """
+        starts = _minutes([slot["start"] for slot in slots])[:, None, None]
+        ends = _minutes([slot["end"] for slot in slots])[:, None, None]
+
+        feasible = np.zeros((len(slots), len(user_ids)), dtype=bool)
+        preferences = {}
+        for row, slot in enumerate(slots):
+            preferences.setdefault(slot["preference"], []).append(row)
+        for preference, rows in preferences.items():
+            feasible[rows] = [
+                _accepts(preference, self.index.staff[user_id]) for user_id in user_ids
+            ]
+
+        available_starts, available_ends = _padded_minutes(
+            [_pairs(self.index.availability.get(user_id)) for user_id in user_ids]
+        )
+        busy_starts, busy_ends = _padded_minutes(
+            [
+                _pairs(self.index.busy.get(user_id)) + self.extra_busy.get(user_id, [])
+                for user_id in user_ids
+            ]
+        )
+        # NaN padding compares False, so it neither covers nor overlaps
+        covered = (
+            (available_starts[None] <= starts) & (available_ends[None] >= ends)
+        ).any(axis=2)
+        overlapping = (
+            (busy_starts[None] <= ends) & (busy_ends[None] >= starts)
+        ).any(axis=2)
+        feasible &= covered & ~overlapping
+
+        previous_ends = np.where(busy_ends[None] <= starts, busy_ends[None], -np.inf)
+        last_end = previous_ends.max(axis=2)
+        last_end[np.isneginf(last_end)] = np.nan
+
+        workload = np.array(
+            [self.workload.get(user_id, 0) for user_id in user_ids], dtype=float
+        )
+        gap_minutes = starts[:, :, 0] - last_end
+        tight = np.nan_to_num(gap_minutes, nan=np.inf) < TIGHT_TURNAROUND_MINUTES
+        idle_hours = np.nan_to_num(gap_minutes, nan=0.0) / 60
+
+        cost = (
+            WORKLOAD_WEIGHT * workload[None, :]
+            + IDLE_GAP_WEIGHT * idle_hours
+            + TIGHT_TURNAROUND_PENALTY * tight
+        )
+        cost[~feasible] = INFEASIBLE
+        return cost
+
+    def _assign_role(self, slots, user_ids):
+        """
+        Repeated min-cost rounds: each round gives every user at most one
+        slot, then their new booking constrains the next round.
+        """
+        assignments = {}
+        remaining = list(slots)
+        while remaining and user_ids:
+            cost = self._cost_matrix(remaining, user_ids)
+            pairs = solve_assignment(cost)
+            if not pairs:
+                break
+            for row, column in pairs:
+                slot = remaining[row]
+                user_id = user_ids[column]
+                assignments[slot["appointment_id"]] = (user_id, float(cost[row, column]))
+                self.extra_busy.setdefault(user_id, []).append(
+                    (slot["start"], slot["end"])
+                )
+                self.workload[user_id] = self.workload.get(user_id, 0) + 1
+            assigned_rows = {row for row, _ in pairs}
+            remaining = [
+                slot for row, slot in enumerate(remaining) if row not in assigned_rows
+            ]
+        return assignments
+
+    def plan(self):
+        """Return a proposed plan for the day's pending appointments"""
+        from .models import Appointment
+
+        started = time.perf_counter()
+        appointments = list(
+            Appointment.objects.filter(date=self.day, status="pending")
+            .filter(Q(therapist__isnull=True) | Q(driver__isnull=True))
+            .values(
+                "id",
+                "start_time",
+                "end_time",
+                "therapist_id",
+                "driver_id",
+                "group_size",
+                "requires_car",
+                "metadata",
+            )
+            .order_by("start_time", "id")
+        )
+
+        therapist_ids = self.index.staff_ids("therapist")
+        driver_ids = self.index.staff_ids("driver")
+        self._load_workload(therapist_ids + driver_ids)
+
+        unassigned = []
+        therapist_slots = []
+        driver_slots = []
+        for row in appointments:
+            if row["group_size"] > 1:
+                unassigned.append(
+                    {"appointment_id": row["id"], "reason": "Group bookings are assigned manually"}
+                )
+                continue
+            start_dt, end_dt = normalize_range(
+                self.day, row["start_time"], row["end_time"]
+            )
+            slot = {
+                "appointment_id": row["id"],
+                "start": start_dt,
+                "end": end_dt,
+                "preference": _preference(row["metadata"] or {}),
+            }
+            if row["therapist_id"] is None:
+                therapist_slots.append(slot)
+            if row["driver_id"] is None:
+                if row["requires_car"]:
+                    unassigned.append(
+                        {"appointment_id": row["id"], "reason": "Requires a car driver"}
+                    )
+                else:
+                    driver_slots.append(dict(slot, preference=("", "")))
+
+        therapist_plan = self._assign_role(therapist_slots, therapist_ids)
+        driver_plan = self._assign_role(driver_slots, driver_ids)
+
+        assignments = []
+        for row in appointments:
+            therapist = therapist_plan.get(row["id"])
+            driver = driver_plan.get(row["id"])
+            if therapist or driver:
+                assignments.append(
+                    {
+                        "appointment_id": row["id"],
+                        "therapist_id": therapist[0] if therapist else None,
+                        "driver_id": driver[0] if driver else None,
+                        "cost": round(
+                            (therapist[1] if therapist else 0)
+                            + (driver[1] if driver else 0),
+                            2,
+                        ),
+                    }
+                )
+
+        for slot in therapist_slots:
+            if slot["appointment_id"] not in therapist_plan:
+                unassigned.append(
+                    {"appointment_id": slot["appointment_id"], "reason": "No available therapist"}
+                )
+        for slot in driver_slots:
+            if slot["appointment_id"] not in driver_plan:
+                unassigned.append(
+                    {"appointment_id": slot["appointment_id"], "reason": "No available driver"}
+                )
+
+        return {
+            "date": self.day.isoformat(),
+            "assignments": assignments,
+            "unassigned": unassigned,
+            "solve_seconds": round(time.perf_counter() - started, 4),
+        }
+
+
+def _preference(metadata):
+    """Specialization/pressure requests are stored in appointment metadata"""
+    return (
+        str(metadata.get("specialization") or "").lower(),
+        str(metadata.get("massage_pressure") or "").lower(),
+    )
+
+
+def _accepts(preference, staff):
+    specialization, massage_pressure = preference
+    if specialization and specialization not in (staff["specialization"] or "").lower():
+        return False
+    if massage_pressure and massage_pressure not in (
+        staff["massage_pressure"] or ""
+    ).lower():
+        return False
+    return True
+
+
+def _pairs(intervals):
+    """(start, end) pairs of an IntervalList, or none for a missing one"""
+    if intervals is None:
+        return []
+    return list(zip(intervals.starts, intervals.ends))
+
+
+def _minutes(datetimes):
+    return np.array([value.timestamp() / 60 for value in datetimes], dtype=float)
+
+
+def _padded_minutes(interval_lists):
+    """
+    (starts, ends) in minutes, one row per list of (start, end) pairs,
+    padded with NaN to the longest list
+    """
+    width = max([len(intervals) for intervals in interval_lists] + [1])
+    starts = np.full((len(interval_lists), width), np.nan)
+    ends = np.full((len(interval_lists), width), np.nan)
+    for row, intervals in enumerate(interval_lists):
+        if intervals:
+            starts[row, : len(intervals)] = _minutes(start for start, _ in intervals)
+            ends[row, : len(intervals)] = _minutes(end for _, end in intervals)
+    return starts, ends
+
+
+def _book(occupancies, appointment, user_id):
+    """
+    Check a user's fresh bookings against the appointment and record it;
+    returns the (start_time, end_time) of a clashing booking or None
+    """
+    same_day, next_day = minute_masks(appointment.start_time, appointment.end_time)
+    days = [(appointment.date, same_day)]
+    if next_day:
+        days.append((appointment.date + timedelta(days=1), next_day))
+    for day, mask in days:
+        if day not in occupancies:
+            occupancies[day] = DayOccupancy.from_db(day)
+        conflict = occupancies[day].conflict(user_id, mask, appointment.id)
+        if conflict:
+            return conflict
+    for day, mask in days:
+        occupancies[day].entries.setdefault(user_id, {})[appointment.id] = (
+            mask,
+            appointment.start_time,
+            appointment.end_time,
+        )
+    return None
+
+
+def apply_plan(plan):
+    """
+    Apply a plan from AssignmentPlanner.plan() in one transaction.
+    Raises StaleAssignmentPlan if any appointment was changed in the meantime
+    or a planned therapist or driver has since been deactivated or booked at
+    the same time.
+    """
+    from core.models import CustomUser
+    from .models import Appointment
+
+    assignments = {item["appointment_id"]: item for item in plan["assignments"]}
+    staff_ids = sorted(
+        {
+            item[field]
+            for item in assignments.values()
+            for field in ("therapist_id", "driver_id")
+            if item[field]
+        }
+    )
+    with transaction.atomic():
+        # Serialize with other plans booking the same staff, then re-check
+        # their bookings from the database rather than the cached bitmaps
+        active_ids = set(
+            CustomUser.objects.select_for_update()
+            .filter(id__in=staff_ids, is_active=True)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        appointments = list(
+            Appointment.objects.select_for_update()
+            .filter(id__in=list(assignments))
+            .order_by("start_time", "id")
+        )
+        stale = []
+        inactive = []
+        conflicts = []
+        occupancies = {}
+        for appointment in appointments:
+            item = assignments[appointment.id]
+            if appointment.status != "pending" or (
+                (item["therapist_id"] and appointment.therapist_id)
+                or (item["driver_id"] and appointment.driver_id)
+            ):
+                stale.append(appointment.id)
+                continue
+            if any(
+                item[field] and item[field] not in active_ids
+                for field in ("therapist_id", "driver_id")
+            ):
+                inactive.append(appointment.id)
+                continue
+            for field in ("therapist_id", "driver_id"):
+                if item[field] and _book(occupancies, appointment, item[field]):
+                    conflicts.append(appointment.id)
+                    break
+            else:
+                if item["therapist_id"]:
+                    appointment.therapist_id = item["therapist_id"]
+                if item["driver_id"]:
+                    appointment.driver_id = item["driver_id"]
+                appointment.save()
+
+        missing = set(assignments) - {appointment.id for appointment in appointments}
+        if stale or missing:
+            raise StaleAssignmentPlan(
+                f"Appointments changed since planning: {sorted(stale + list(missing))}"
+            )
+        if inactive:
+            raise StaleAssignmentPlan(
+                f"Staff deactivated since planning: {sorted(inactive)}"
+            )
+        if conflicts:
+            raise StaleAssignmentPlan(
+                f"Staff booked elsewhere since planning: {sorted(conflicts)}"
+            )
+
+    logger.info(f"Applied auto-assignment plan for {plan['date']}: {len(assignments)} appointments")
+    return len(assignments)
@@ -0,0 +1,282 @@
+"""
+Per key-family cache instrumentation
+Hits, misses, sets, bytes written and latency are counted per key prefix
+(appointments_user, conflicts, available_staff, ...) in per-thread shards
+that only their own thread writes, so recording takes no lock. Value sizes
+are measured on a sample of sets and scaled up. Each process publishes its
+totals to the shared cache every FLUSH_SECONDS and readers sum the published
+snapshots.
+"""
+
+import logging
+import os
+import pickle
+import socket
+import threading
+import time
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+FIELDS = (
+    "local_hits",
+    "hits",
+    "misses",
+    "sets",
+    "sized_sets",
+    "sized_bytes",
+    "get_seconds",
+    "set_seconds",
+)
+_INDEX = {field: index for index, field in enumerate(FIELDS)}
+
+
+def key_family(key):
+    """
+    The prefix of a cache key up to its first variable part: segments before
+    the first ':' and before the first '_'-separated segment with a digit
+    """
+    parts = []
+    for part in str(key).split(":", 1)[0].split("_"):
+        if not part or any(char.isdigit() for char in part):
+            break
+        parts.append(part)
+    return "_".join(parts) or "other"
+
+
+class CacheMetrics:
+    FLUSH_SECONDS = 30
+    PROCESS_KEY = "cache_metrics:process:{}"
+    PROCESSES_KEY = "cache_metrics:processes"
+    MAX_FAMILIES = 100  # Per thread; anything past it is counted as "other"
+    # Pickling a value only to measure it costs as much as the set itself,
+    # so one set in SIZE_SAMPLE_EVERY (per thread) is measured
+    SIZE_SAMPLE_EVERY = 16
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []  # (thread, {family: [counter per FIELDS]})
+        self._retired = {}  # Totals folded in from finished threads
+        self._registry_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._next_flush = time.monotonic() + self.FLUSH_SECONDS
+
+    # ------------------------------------------------------------------
+    # Recording (lock-free: each thread only writes its own shard)
+    # ------------------------------------------------------------------
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._registry_lock:
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _add(self, key, field, amount=1):
+        shard = self._shard()
+        family = key_family(key)
+        counters = shard.get(family)
+        if counters is None:
+            if len(shard) >= self.MAX_FAMILIES:
+                family = "other"
+                counters = shard.get(family)
+            if counters is None:
+                counters = shard[family] = [0] * len(FIELDS)
+        counters[_INDEX[field]] += amount
+
+    def record_local_hit(self, key):
+        self._add(key, "local_hits")
+
+    def record_get(self, keys, found, seconds):
+        """keys looked up in the shared tier, the subset found, total latency"""
+        if not keys:
+            return
+        share = seconds / len(keys)
+        for key in keys:
+            self._add(key, "hits" if key in found else "misses")
+            self._add(key, "get_seconds", share)
+        self.maybe_flush()
+
+    def record_set(self, mapping, seconds):
+        if not mapping:
+            return
+        share = seconds / len(mapping)
+        for key, value in mapping.items():
+            self._add(key, "sets")
+            self._add(key, "set_seconds", share)
+            if self._should_size():
+                try:
+                    size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+                except Exception:
+                    continue
+                self._add(key, "sized_sets")
+                self._add(key, "sized_bytes", size)
+        self.maybe_flush()
+
+    def _should_size(self):
+        countdown = getattr(self._local, "size_countdown", 0)
+        if countdown:
+            self._local.size_countdown = countdown - 1
+            return False
+        self._local.size_countdown = self.SIZE_SAMPLE_EVERY - 1
+        return True
+
+    # ------------------------------------------------------------------
+    # Aggregation
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _merge(into, families):
+        for family, counters in families.items():
+            total = into.setdefault(family, [0] * len(FIELDS))
+            for index, value in enumerate(counters):
+                total[index] += value
+        return into
+
+    def snapshot(self):
+        """This process's counters per family since it started"""
+        with self._registry_lock:
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                else:
+                    self._merge(self._retired, shard)
+            self._shards = live
+            totals = self._merge({}, self._retired)
+        for _, shard in live:
+            self._merge(totals, dict(list(shard.items())))
+        return totals
+
+    def _process_id(self):
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def maybe_flush(self):
+        if time.monotonic() >= self._next_flush:
+            self.flush()
+
+    def flush(self):
+        """Publish this process's snapshot; one thread at a time, never blocking"""
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_flush = time.monotonic() + self.FLUSH_SECONDS
+            process_id = self._process_id()
+            stale_after = self.FLUSH_SECONDS * 10
+            cache.set(
+                self.PROCESS_KEY.format(process_id), self.snapshot(), stale_after
+            )
+            # Rare read-modify-write; a lost update is repaired on the next flush
+            now = time.time()
+            processes = {
+                other: seen
+                for other, seen in (cache.get(self.PROCESSES_KEY) or {}).items()
+                if now - seen < stale_after
+            }
+            processes[process_id] = now
+            cache.set(self.PROCESSES_KEY, processes, None)
+        except Exception as e:
+            logger.warning(f"Failed to publish cache metrics: {e}")
+        finally:
+            self._flush_lock.release()
+
+    def aggregate(self):
+        """
+        Counters summed over every process that published recently, with
+        derived hit rates and average latencies per family
+        """
+        self.flush()
+        processes = cache.get(self.PROCESSES_KEY) or {}
+        snapshots = cache.get_many(
+            [self.PROCESS_KEY.format(process_id) for process_id in processes]
+        )
+        totals = {}
+        for snapshot in snapshots.values():
+            self._merge(totals, snapshot)
+
+        families = {
+            family: self._describe(counters)
+            for family, counters in sorted(totals.items())
+        }
+        overall = self._describe(
+            [sum(values) for values in zip(*totals.values())] or [0] * len(FIELDS)
+        )
+        return {"processes": len(snapshots), "overall": overall, "families": families}
+
+    @staticmethod
+    def _describe(counters):
+        stats = dict(zip(FIELDS, counters))
+        lookups = stats["local_hits"] + stats["hits"] + stats["misses"]
+        shared_lookups = stats["hits"] + stats["misses"]
+        avg_bytes = (
+            stats["sized_bytes"] / stats["sized_sets"] if stats["sized_sets"] else 0
+        )
+        return {
+            "local_hits": stats["local_hits"],
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "sets": stats["sets"],
+            # Estimated from the sampled sets
+            "bytes_written": int(avg_bytes * stats["sets"]),
+            "hit_rate": (
+                round((stats["local_hits"] + stats["hits"]) / lookups, 4)
+                if lookups
+                else 0.0
+            ),
+            "avg_get_ms": (
+                round(stats["get_seconds"] * 1000 / shared_lookups, 3)
+                if shared_lookups
+                else 0.0
+            ),
+            "avg_set_ms": (
+                round(stats["set_seconds"] * 1000 / stats["sets"], 3)
+                if stats["sets"]
+                else 0.0
+            ),
+            "avg_bytes": int(avg_bytes),
+        }
+
+
+class MeteredCache:
+    """
+    django.core.cache.cache with get/set traffic recorded in cache_metrics;
+    every other method passes straight through
+    """
+
+    def __getattr__(self, name):
+        return getattr(cache, name)
+
+    def get(self, key, default=None, version=None):
+        marker = object()
+        started = time.perf_counter()
+        value = cache.get(key, marker, version=version)
+        cache_metrics.record_get(
+            [key], () if value is marker else (key,), time.perf_counter() - started
+        )
+        return default if value is marker else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        started = time.perf_counter()
+        found = cache.get_many(keys, version=version)
+        cache_metrics.record_get(keys, found, time.perf_counter() - started)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        started = time.perf_counter()
+        cache.set(key, value, timeout, version=version)
+        cache_metrics.record_set({key: value}, time.perf_counter() - started)
+
+    def set_many(self, mapping, timeout=DEFAULT_TIMEOUT, version=None):
+        started = time.perf_counter()
+        failed = cache.set_many(mapping, timeout, version=version)
+        cache_metrics.record_set(mapping, time.perf_counter() - started)
+        return failed
+
+
+# Global instances
+cache_metrics = CacheMetrics()
+metered_cache = MeteredCache()
@@ -0,0 +1,121 @@
+"""
+Single-flight recomputation with stale-while-revalidate
+When a hot key is missing only one worker rebuilds it (guarded by a short
+cache lock); everyone else gets the previous value while the rebuild runs,
+or waits briefly for it if there is no previous value
+"""
+
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import connections
+
+from .cache_tags import tagged_cache
+from .two_tier_cache import two_tier_cache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class CacheRefresher:
+    """get_or_compute() for expensive cached reads"""
+
+    LOCK_KEY = "refresh_lock:{}"
+    STALE_KEY = "{}:stale"
+    LOCK_SECONDS = 15  # Upper bound on a rebuild before another worker may try
+    WAIT_SECONDS = 3  # How long a worker without a stale copy waits for the rebuild
+    STALE_SECONDS = 30  # How long past its timeout a value may still be served
+
+    def get_or_compute(self, key, compute, timeout, tags=None, force=False):
+        """
+        Return the cached value for key, computing it at most once across
+        workers. tags are cache_tags tags; invalidating them makes the fresh
+        entry unreachable while the stale copy keeps serving readers.
+        """
+        fresh_key = self.fresh_key(key, tags)
+        if not force:
+            value = two_tier_cache.get(fresh_key, _MISSING)
+            if value is not _MISSING:
+                return value
+
+        stale = cache.get(self.STALE_KEY.format(key))
+        has_stale = not force and stale is not None and time.time() <= stale[1]
+
+        lock_key = self.LOCK_KEY.format(fresh_key)
+        if cache.add(lock_key, 1, self.LOCK_SECONDS):
+            if has_stale:
+                threading.Thread(
+                    target=self._refresh,
+                    args=(key, fresh_key, lock_key, compute, timeout),
+                    daemon=True,
+                ).start()
+                return stale[0]
+            try:
+                return self._compute_and_store(key, fresh_key, compute, timeout)
+            finally:
+                cache.delete(lock_key)
+
+        # Another worker is rebuilding this key
+        if has_stale:
+            return stale[0]
+        deadline = time.monotonic() + self.WAIT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            value = cache.get(fresh_key, _MISSING)
+            if value is not _MISSING:
+                return value
+        logger.warning(f"Timed out waiting for {key} to be rebuilt, computing it")
+        return self._compute_and_store(key, fresh_key, compute, timeout)
+
+    def fresh_key(self, key, tags=None):
+        """The concrete key for key under the current generations of tags"""
+        return tagged_cache.versioned_key(key, tags) if tags else key
+
+    def store_many(self, entries):
+        """
+        Write precomputed values as if get_or_compute had built them.
+        entries are (key, fresh_key, value, timeout); take fresh_key before
+        loading the values so a concurrent invalidation is not papered over.
+        """
+        by_timeout = {}
+        for key, fresh_key, value, timeout in entries:
+            fresh, stale = by_timeout.setdefault(timeout, ({}, {}))
+            fresh[fresh_key] = value
+            stale[self.STALE_KEY.format(key)] = (
+                value,
+                time.time() + timeout + self.STALE_SECONDS,
+            )
+        for timeout, (fresh, stale) in by_timeout.items():
+            two_tier_cache.set_many(fresh, timeout)
+            cache.set_many(stale, timeout + self.STALE_SECONDS)
+
+    def _compute_and_store(self, key, fresh_key, compute, timeout):
+        value = compute()
+        try:
+            two_tier_cache.set(fresh_key, value, timeout)
+            cache.set(
+                self.STALE_KEY.format(key),
+                (value, time.time() + timeout + self.STALE_SECONDS),
+                timeout + self.STALE_SECONDS,
+            )
+        except Exception as e:
+            logger.error(f"Failed to cache {key}: {e}")
+        return value
+
+    def _refresh(self, key, fresh_key, lock_key, compute, timeout):
+        """Background rebuild for stale-while-revalidate"""
+        try:
+            self._compute_and_store(key, fresh_key, compute, timeout)
+        except Exception as e:
+            logger.error(f"Background refresh of {key} failed: {e}")
+        finally:
+            cache.delete(lock_key)
+            # The thread's database connection is not reused
+            connections.close_all()
+
+
+# Global instance
+cache_refresher = CacheRefresher()
@@ -0,0 +1,100 @@
+"""
+Tag-based cache invalidation with generation counters
+Every tag has a counter in the cache; entry keys embed the counters of their
+tags, so invalidating a tag is one increment and stale entries simply stop
+being addressed and expire on their own
+"""
+
+import logging
+import time
+
+from django.core.cache import cache
+
+from .two_tier_cache import two_tier_cache
+
+logger = logging.getLogger(__name__)
+
+# Appointments that are not narrowed by date or staff member
+APPOINTMENTS_TAG = "appointments"
+# Recurring availability templates can affect any date
+RECURRING_AVAILABILITY_TAG = "recurring_availability"
+
+
+def date_tag(day):
+    """Everything cached for one date: appointments and availability"""
+    return f"date:{day.isoformat() if hasattr(day, 'isoformat') else day}"
+
+
+def user_tag(user_id):
+    return f"user:{user_id}"
+
+
+def role_tag(role):
+    return f"role:{role}"
+
+
+class TaggedCache:
+    """Cache get/set keyed by the current generations of a set of tags"""
+
+    GENERATION_KEY = "cache_tag_gen:{}"
+
+    def _generations(self, tags):
+        keys = {tag: self.GENERATION_KEY.format(tag) for tag in tags}
+        stored = two_tier_cache.get_many(list(keys.values()))
+        generations = {}
+        for tag, key in keys.items():
+            generation = stored.get(key)
+            if generation is None:
+                # Seed from the clock so an evicted counter never restarts at
+                # a generation that older entries were stored under
+                cache.add(key, time.time_ns(), None)
+                generation = cache.get(key, 0)
+            generations[tag] = generation
+        return generations
+
+    def versioned_key(self, key, tags):
+        """The concrete cache key for an entry under the current generations"""
+        if not tags:
+            return key
+        generations = self._generations(sorted(set(tags)))
+        suffix = ".".join(str(generations[tag]) for tag in sorted(generations))
+        return f"{key}:g{suffix}"
+
+    def get(self, key, tags, default=None):
+        try:
+            return two_tier_cache.get(self.versioned_key(key, tags), default)
+        except Exception as e:
+            logger.error(f"Tagged cache get failed for {key}: {e}")
+            return default
+
+    def set(self, key, value, tags, timeout=None):
+        try:
+            two_tier_cache.set(self.versioned_key(key, tags), value, timeout)
+        except Exception as e:
+            logger.error(f"Tagged cache set failed for {key}: {e}")
+
+    def invalidate(self, *tags):
+        """Bump the generation of every tag; O(1) per tag on any backend"""
+        keys = [self.GENERATION_KEY.format(tag) for tag in set(tags) if tag]
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, time.time_ns(), None)
+            except Exception as e:
+                logger.error(f"Failed to bump cache tag {key}: {e}")
+        # Workers holding the old generations in their local tier drop them
+        two_tier_cache.discard(keys)
+
+
+def appointment_tags(dates=(), user_ids=()):
+    """Tags to bump when appointments on these dates / for these staff change"""
+    return (
+        [APPOINTMENTS_TAG]
+        + [date_tag(day) for day in dates if day]
+        + [user_tag(user_id) for user_id in user_ids if user_id]
+    )
+
+
+# Global instance
+tagged_cache = TaggedCache()
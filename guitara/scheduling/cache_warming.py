@@ -0,0 +1,116 @@
+"""
+Batched warming of the dashboard appointment caches
+One pass loads today's and tomorrow's appointments for every active operator,
+therapist and driver with two queries, partitions them per user in memory and
+writes all the entries in bulk, so a shift start does not stampede the database
+"""
+
+import logging
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .cache_refresh import cache_refresher
+from .cache_tags import date_tag
+from .optimized_data_manager import data_manager
+
+logger = logging.getLogger(__name__)
+
+
+class DashboardCacheWarmer:
+    """Fills the entries read by the today/upcoming dashboard endpoints"""
+
+    ROLES = ("operator", "therapist", "driver")
+    DAYS_AHEAD = 1  # Today and tomorrow
+
+    def warm(self, user_ids=None):
+        """
+        Warm every active staff member, or only user_ids. Returns the number
+        of appointments loaded and cache entries written.
+        """
+        from django.db.models import Q
+
+        from core.models import CustomUser
+
+        from .models import Appointment
+
+        today = timezone.now().date()
+        days = [
+            today + timedelta(days=offset) for offset in range(self.DAYS_AHEAD + 1)
+        ]
+
+        staff = CustomUser.objects.filter(role__in=self.ROLES, is_active=True)
+        if user_ids is not None:
+            staff = staff.filter(id__in=list(user_ids))
+        staff = list(staff.only("id", "role"))
+        if not staff:
+            return {"appointments": 0, "entries": 0}
+
+        # Keys are resolved before loading so an appointment change committed
+        # while the query runs leaves these entries under the old generation
+        planned = []
+        for user in staff:
+            planned.append(
+                (
+                    data_manager.today_appointments_cache_key(user),
+                    [date_tag(today)],
+                    user,
+                    today,
+                )
+            )
+            for day in days:
+                planned.append(
+                    (
+                        data_manager.appointments_cache_key(user, day),
+                        data_manager._appointment_list_tags(user, day),
+                        user,
+                        day,
+                    )
+                )
+        planned = [
+            (key, cache_refresher.fresh_key(key, tags), user, day)
+            for key, tags, user, day in planned
+        ]
+
+        appointments = Appointment.objects.select_related(
+            "client", "therapist", "driver", "operator"
+        ).filter(date__in=days)
+        if not any(user.role == "operator" for user in staff):
+            staff_ids = [user.id for user in staff]
+            appointments = appointments.filter(
+                Q(therapist_id__in=staff_ids) | Q(driver_id__in=staff_ids)
+            )
+        appointments = list(appointments.order_by("date", "start_time"))
+        serialized = data_manager._serialize_appointments(appointments)
+
+        # Partition in memory, keeping the date/start_time order per list
+        by_day = {day: [] for day in days}
+        by_staff = {}
+        for appointment, data in zip(appointments, serialized):
+            by_day[appointment.date].append(data)
+            for staff_id in (appointment.therapist_id, appointment.driver_id):
+                if staff_id:
+                    by_staff.setdefault((staff_id, appointment.date), []).append(
+                        data
+                    )
+
+        entries = []
+        for key, fresh_key, user, day in planned:
+            if user.role == "operator":
+                value = by_day[day]
+            else:
+                value = by_staff.get((user.id, day), [])
+            entries.append(
+                (key, fresh_key, value, data_manager.appointments_timeout(day))
+            )
+        cache_refresher.store_many(entries)
+
+        logger.info(
+            f"Warmed {len(entries)} dashboard cache entries for {len(staff)} staff "
+            f"from {len(appointments)} appointments"
+        )
+        return {"appointments": len(appointments), "entries": len(entries)}
+
+
+# Global instance
+cache_warmer = DashboardCacheWarmer()
@@ -0,0 +1,111 @@
+"""
+Conditional GET support for list endpoints
+Viewsets compute a cheap fingerprint of what a list would contain (an
+aggregate or a scope timestamp) and answer polls with 304 Not Modified
+before running the serializer when the client's copy is still current
+"""
+
+import hashlib
+import logging
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+SCOPE_MODIFIED_KEY = "list_modified:{}"
+
+# Availability rows have no timestamps, so the whole table is one scope
+AVAILABILITY_SCOPE = "availability"
+# Deletions do not show up in max(updated_at)
+APPOINTMENT_DELETIONS_SCOPE = "appointments:deleted"
+# urgency_level moves with the clock, not with the rows
+URGENCY_BUCKET_MINUTES = 15
+
+
+def notifications_scope(user_id):
+    return f"notifications:user:{user_id}"
+
+
+def touch_scopes(*scopes):
+    """Record that the lists in these scopes changed just now"""
+    try:
+        now = timezone.now()
+        cache.set_many(
+            {SCOPE_MODIFIED_KEY.format(scope): now for scope in scopes}, None
+        )
+    except Exception as e:
+        logger.error(f"Failed to touch list scopes {scopes}: {e}")
+
+
+def time_bucket(minutes):
+    """Start of the current fixed-length window of the clock"""
+    now = timezone.now()
+    hour = now.replace(minute=0, second=0, microsecond=0)
+    return now - (now - hour) % timedelta(minutes=minutes)
+
+
+def scope_modified(scope):
+    """
+    When a scope last changed. A scope without a recorded time (new or
+    evicted) counts as changed now, so clients refetch once at worst.
+    """
+    key = SCOPE_MODIFIED_KEY.format(scope)
+    modified = cache.get(key)
+    if modified is None:
+        cache.add(key, timezone.now(), None)
+        modified = cache.get(key) or timezone.now()
+    return modified
+
+
+class ConditionalListMixin:
+    """
+    ETag / Last-Modified handling for viewset list actions.
+
+    If-None-Match takes precedence over If-Modified-Since, as in RFC 9110.
+    ETags also cover the full path and the user, since both change the
+    response body.
+    """
+
+    def make_etag(self, request, *parts):
+        source = "|".join(
+            [self.__class__.__name__, str(request.user.pk), request.get_full_path()]
+            + [str(part) for part in parts]
+        )
+        return f'"{hashlib.sha1(source.encode()).hexdigest()}"'
+
+    def not_modified_response(self, request, etag, last_modified=None):
+        """A 304 response if the client's validators still match, else None"""
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match:
+            client_etags = {
+                tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+            }
+            matches = "*" in client_etags or etag in client_etags
+        else:
+            if_modified_since = parse_http_date_safe(
+                request.headers.get("If-Modified-Since") or ""
+            )
+            matches = (
+                if_modified_since is not None
+                and last_modified is not None
+                and int(last_modified.timestamp()) <= if_modified_since
+            )
+        if not matches:
+            return None
+        return self.with_validators(
+            Response(status=status.HTTP_304_NOT_MODIFIED), etag, last_modified
+        )
+
+    def with_validators(self, response, etag, last_modified=None):
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified.timestamp())
+            # Per-user data: browsers may keep it but must revalidate
+            response["Cache-Control"] = "private, no-cache"
+        return response
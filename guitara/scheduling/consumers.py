@@ -1,13 +1,18 @@
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from .models import Appointment, Notification, Availability, Client
+from .models import Appointment, Availability, Client
 from core.models import CustomUser
 from django.utils.timezone import make_aware
 from datetime import datetime
 import json
 import asyncio
 import logging
-from django.core.cache import cache
+from .cache_refresh import cache_refresher
+from .cache_tags import date_tag
+from .delta_sync import DEFAULT_LIMIT, ExpiredCursor, changes_since
+from .notification_dispatcher import notification_dispatcher
+from .two_tier_cache import two_tier_cache
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models import Q
 
 logger = logging.getLogger(__name__)
@@ -309,7 +314,7 @@ class AppointmentConsumer(AsyncWebsocketConsumer):
 
             # Use cached availability data
             cache_key = f"availability_{role}_{date_str}_{specialization or 'all'}"
-            availabilities = cache.get(cache_key)
+            availabilities = two_tier_cache.get(cache_key)
 
             if not availabilities:
                 if role == "therapist":
@@ -320,7 +325,7 @@ class AppointmentConsumer(AsyncWebsocketConsumer):
                     availabilities = await self.get_available_drivers(date_obj)
 
                 # Cache for 5 minutes
-                cache.set(cache_key, availabilities, 300)
+                two_tier_cache.set(cache_key, availabilities, 300)
 
             await self.send(
                 text_data=json.dumps(
@@ -329,7 +334,7 @@ class AppointmentConsumer(AsyncWebsocketConsumer):
                         "date": date_str,
                         "role": role,
                         "availabilities": availabilities,
-                        "cached": cache.get(cache_key) is not None,
+                        "cached": two_tier_cache.get(cache_key) is not None,
                     }
                 )
             )
@@ -343,6 +348,10 @@ class AppointmentConsumer(AsyncWebsocketConsumer):
 
     async def handle_refresh_request(self, data):
         """Handle manual refresh requests"""
+        if data.get("since"):
+            await self.handle_delta_refresh(data)
+            return
+
         try:
             if self.user.role == "operator":
                 appointments = await self.get_today_appointments_cached(
@@ -370,6 +379,49 @@ class AppointmentConsumer(AsyncWebsocketConsumer):
                 )
             )
 
+    async def handle_delta_refresh(self, data):
+        """Send only what changed since the client's sync cursor"""
+        try:
+            changes = await self.get_appointment_changes(
+                data["since"], data.get("limit", DEFAULT_LIMIT)
+            )
+            await self.send(
+                text_data=json.dumps(
+                    {"type": "delta_data", **changes}, cls=DjangoJSONEncoder
+                )
+            )
+        except ExpiredCursor:
+            # Fall back to a full refresh the client can reset its cursor from
+            await self.handle_refresh_request({})
+        except Exception as e:
+            logger.error(f"Error handling delta refresh: {e}")
+            await self.send(
+                text_data=json.dumps(
+                    {"type": "error", "message": "Failed to sync changes"}
+                )
+            )
+
+    @database_sync_to_async
+    def get_appointment_changes(self, since, limit):
+        from .serializers import AppointmentSerializer, with_appointment_relations
+
+        user = self.scope["user"]
+        appointments = with_appointment_relations(Appointment.objects.all())
+        if user.role == "therapist":
+            appointments = appointments.filter(
+                Q(therapist=user) | Q(therapists=user)
+            ).distinct()
+        elif user.role == "driver":
+            appointments = appointments.filter(driver=user)
+        elif user.role != "operator":
+            appointments = appointments.none()
+
+        changes = changes_since(appointments, since, user, limit)
+        changes["appointments"] = AppointmentSerializer(
+            changes["appointments"], many=True
+        ).data
+        return changes
+
     async def handle_appointment_subscription(self, data):
         """Subscribe to specific appointment updates"""
         appointment_id = data.get("appointment_id")
@@ -487,21 +539,23 @@ class AppointmentConsumer(AsyncWebsocketConsumer):
         try:
             appointment = await self.get_appointment(appointment_id)
             if appointment:
-                # Invalidate today's appointments cache
-                cache.delete(f"appointments_today_operator")
-                cache.delete(f"appointments_today_{appointment.therapist_id}")
-                cache.delete(f"appointments_today_{appointment.driver_id}")
+                # Today's list is tagged with its date, and the appointment
+                # save that led here already bumped that tag
+                keys = []
 
                 # Invalidate user-specific caches
                 if appointment.therapist_id:
-                    cache.delete(f"user_appointments_{appointment.therapist_id}")
+                    keys.append(f"user_appointments_{appointment.therapist_id}")
                 if appointment.driver_id:
-                    cache.delete(f"user_appointments_{appointment.driver_id}")
+                    keys.append(f"user_appointments_{appointment.driver_id}")
 
                 # Invalidate availability caches for the appointment date
                 date_str = appointment.date.isoformat()
-                cache.delete(f"availability_therapist_{date_str}_all")
-                cache.delete(f"availability_driver_{date_str}_all")
+                keys.append(f"availability_therapist_{date_str}_all")
+                keys.append(f"availability_driver_{date_str}_all")
+
+                # One round trip, and every worker drops its local copies
+                two_tier_cache.delete_many(keys)
         except Exception as e:
             logger.error(f"Error invalidating caches: {e}")
 
@@ -594,80 +648,45 @@ class AppointmentConsumer(AsyncWebsocketConsumer):
         self, appointment_id, notification_type, message
     ):
         try:
-            appointment = Appointment.objects.select_related(
-                "therapist", "driver", "operator"
-            ).get(id=appointment_id)
-
-            notifications_to_create = []
-
-            # Create notification for therapist if assigned
-            if appointment.therapist:
-                notifications_to_create.append(
-                    Notification(
-                        user=appointment.therapist,
-                        appointment=appointment,
-                        notification_type=notification_type,
-                        message=message,
-                    )
-                )
-
-            # Create notification for driver if assigned
-            if appointment.driver:
-                notifications_to_create.append(
-                    Notification(
-                        user=appointment.driver,
-                        appointment=appointment,
-                        notification_type=notification_type,
-                        message=message,
-                    )
-                )
-
-            # Create notification for operator if assigned
-            if appointment.operator:
-                notifications_to_create.append(
-                    Notification(
-                        user=appointment.operator,
-                        appointment=appointment,
-                        notification_type=notification_type,
-                        message=message,
-                    )
-                )
+            appointment = Appointment.objects.get(id=appointment_id)
 
-            # Bulk create notifications for better performance
-            if notifications_to_create:
-                Notification.objects.bulk_create(notifications_to_create)
+            # One bulk insert for every recipient, pushed to each after commit
+            notification_dispatcher.notify_appointment(
+                appointment, notification_type, message
+            )
 
             return True
         except Appointment.DoesNotExist:
             return False
 
     async def get_today_appointments_cached(self, force_refresh=False):
-        """Get today's appointments with caching"""
-        cache_key = f"appointments_today_operator"
-
-        if not force_refresh:
-            appointments = cache.get(cache_key)
-            if appointments:
-                return appointments
+        """
+        Get today's appointments with caching. Reconnecting clients share one
+        rebuild and get the previous list while it runs.
+        """
+        from django.utils import timezone
 
-        appointments = await self.get_today_appointments()
-        cache.set(cache_key, appointments, 300)  # Cache for 5 minutes
-        return appointments
+        return await database_sync_to_async(cache_refresher.get_or_compute)(
+            "appointments_today_operator",
+            self.get_today_appointments,
+            300,  # Cache for 5 minutes
+            tags=[date_tag(timezone.now().date())],
+            force=force_refresh,
+        )
 
     async def get_user_appointments_cached(self, force_refresh=False):
         """Get user appointments with caching"""
         cache_key = f"user_appointments_{self.user.id}"
 
         if not force_refresh:
-            appointments = cache.get(cache_key)
+            appointments = two_tier_cache.get(cache_key)
             if appointments:
                 return appointments
 
         appointments = await self.get_user_appointments()
-        cache.set(cache_key, appointments, 300)  # Cache for 5 minutes
+        two_tier_cache.set(cache_key, appointments, 300)  # Cache for 5 minutes
         return appointments
 
-    @database_sync_to_async
     def get_today_appointments(self):
         from django.utils import timezone
 
@@ -0,0 +1,147 @@
+"""
+Row counts for list endpoints
+Exact counts are cached per query signature under a tag for every table the
+query reads, and the writes that change those tables bump the tags. Unfiltered
+counts of large PostgreSQL tables can be estimated from planner statistics.
+"""
+
+import hashlib
+import logging
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from .cache_tags import tagged_cache
+
+logger = logging.getLogger(__name__)
+
+# Bounds staleness for writes that skip signals (update(), bulk_create, Supabase)
+COUNT_TIMEOUT = 300
+# Below this many rows an exact count is cheap and an estimate not worth its error
+ESTIMATE_THRESHOLD = 100_000
+
+
+def table_tag(table):
+    return f"count:{table}"
+
+
+class CountService:
+    """
+    count(queryset, mode) returns (count, exact):
+    - "exact": a fresh COUNT(*)
+    - "cached": COUNT(*) cached until a tracked write touches one of its tables
+    - "estimate": reltuples for unfiltered tables past ESTIMATE_THRESHOLD rows
+      on PostgreSQL, otherwise the cached count
+    """
+
+    MODES = ("exact", "cached", "estimate")
+
+    def track(self, *models):
+        """Drop cached counts over these models' tables whenever they change"""
+        for model in models:
+            label = model._meta.label_lower
+            post_save.connect(
+                self._model_changed,
+                sender=model,
+                weak=False,
+                dispatch_uid=f"count_service:{label}:save",
+            )
+            post_delete.connect(
+                self._model_changed,
+                sender=model,
+                weak=False,
+                dispatch_uid=f"count_service:{label}:delete",
+            )
+            for field in model._meta.local_many_to_many:
+                m2m_changed.connect(
+                    self._model_changed,
+                    sender=field.remote_field.through,
+                    weak=False,
+                    dispatch_uid=f"count_service:{label}:{field.name}",
+                )
+
+    def _model_changed(self, sender, **kwargs):
+        self.invalidate_table(sender._meta.db_table)
+
+    def invalidate_table(self, *tables):
+        tagged_cache.invalidate(*[table_tag(table) for table in tables])
+
+    # ------------------------------------------------------------------
+    # Counting
+    # ------------------------------------------------------------------
+
+    def count(self, queryset, mode="cached"):
+        if mode == "estimate":
+            estimate = self.estimated_count(queryset)
+            if estimate is not None:
+                return estimate, False
+        if mode == "exact":
+            return queryset.count(), True
+        return self.cached_count(queryset), True
+
+    def cached_count(self, queryset, timeout=COUNT_TIMEOUT):
+        query = queryset.query.clone()
+        if not query.is_sliced:
+            query.clear_ordering(force=True)
+        try:
+            sql, params = query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        signature = hashlib.sha1(f"{queryset.db}|{sql}|{params!r}".encode())
+        tables = {alias.table_name for alias in query.alias_map.values()}
+        tables.add(queryset.model._meta.db_table)
+        tags = [table_tag(table) for table in sorted(tables)]
+
+        key = f"list_count:{signature.hexdigest()}"
+        count = tagged_cache.get(key, tags)
+        if count is None:
+            count = queryset.count()
+            tagged_cache.set(key, count, tags, timeout)
+        return count
+
+    def estimated_count(self, queryset):
+        """Planner row estimate for an unfiltered large table, else None"""
+        query = queryset.query
+        connection = connections[queryset.db]
+        if (
+            connection.vendor != "postgresql"
+            or query.where
+            or query.distinct
+            or query.is_sliced
+            or query.combinator
+        ):
+            return None
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class "
+                    "WHERE oid = to_regclass(%s)",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+        except Exception as e:
+            logger.warning(f"Failed to read row estimate: {e}")
+            return None
+        # reltuples is -1 (or 0) until the table has been analyzed
+        if not row or row[0] < ESTIMATE_THRESHOLD:
+            return None
+        return row[0]
+
+    def cached_external_count(self, table, fetch, timeout=COUNT_TIMEOUT):
+        """
+        Count of a table read through another client (Supabase); fetch()
+        returns the count or None on failure, which is not cached
+        """
+        key = f"list_count:external:{table}"
+        tags = [table_tag(table)]
+        count = tagged_cache.get(key, tags)
+        if count is None:
+            count = fetch()
+            if count is not None:
+                tagged_cache.set(key, count, tags, timeout)
+        return count
+
+
+# Global instance
+count_service = CountService()
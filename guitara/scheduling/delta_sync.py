@@ -0,0 +1,191 @@
+"""
+Incremental appointment sync
+Clients keep an opaque cursor and ask for what changed after it: appointments
+whose updated_at moved past it plus tombstones for the ones that left the
+reader's scope, deleted or reassigned to someone else
+"""
+
+import base64
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 200
+MAX_LIMIT = 1000
+# updated_at is stamped before commit, so a slow transaction can land behind a
+# cursor that was already handed out; cursors that have caught up are held
+# back this far and the overlap is sent again (clients upsert by id)
+SETTLE_SECONDS = 5
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class ExpiredCursor(Exception):
+    """The cursor predates the tombstone retention window; do a full reload"""
+
+
+def tombstone_retention_days():
+    return getattr(settings, "APPOINTMENT_TOMBSTONE_RETENTION_DAYS", 30)
+
+
+def _position(moment, pk=0):
+    return [moment.isoformat(), pk]
+
+
+def encode_cursor(appointments, tombstones):
+    """Opaque cursor holding the (timestamp, id) keyset of both streams"""
+    payload = json.dumps({"a": appointments, "t": tombstones}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        payload = json.loads(
+            base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        )
+        positions = {}
+        for stream in ("a", "t"):
+            moment, pk = payload[stream]
+            moment = parse_datetime(moment)
+            if moment is None:
+                raise ValueError(f"bad timestamp in {stream}")
+            positions[stream] = (moment, int(pk))
+        return positions
+    except Exception as e:
+        raise InvalidCursor(f"Invalid sync cursor: {e}") from e
+
+
+def current_cursor():
+    """
+    Cursor for a client that is about to do a full load: take it first, load
+    everything, then sync from it so nothing changed in between is missed
+    """
+    settled = _position(timezone.now() - timedelta(seconds=SETTLE_SECONDS))
+    return encode_cursor(settled, settled)
+
+
+def _after(queryset, field, position):
+    moment, pk = position
+    return queryset.filter(
+        Q(**{f"{field}__gt": moment}) | Q(**{field: moment, "id__gt": pk})
+    ).order_by(field, "id")
+
+
+def _take(queryset, field, position, limit, settled):
+    rows = list(_after(queryset, field, position)[: limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    moment, pk = position
+    if rows:
+        moment, pk = getattr(rows[-1], field), rows[-1].id
+    if not has_more and moment > settled:
+        moment, pk = settled, 0
+    return rows, _position(moment, pk), has_more
+
+
+def scoped_tombstones(user, appointments):
+    """
+    Tombstones meant for this user: their own removals for therapists and
+    drivers, plain deletions for operators. Removals of appointments that are
+    back in the user's scope are stale and left out.
+    """
+    from .models import AppointmentTombstone
+
+    role = getattr(user, "role", None)
+    if role == "operator":
+        return AppointmentTombstone.objects.filter(user__isnull=True)
+    if role in ("therapist", "driver"):
+        return AppointmentTombstone.objects.filter(user=user).exclude(
+            appointment_id__in=appointments.order_by().values("id")
+        )
+    return AppointmentTombstone.objects.none()
+
+
+def changes_since(appointments, cursor, user, limit=DEFAULT_LIMIT):
+    """
+    Appointments from the given queryset changed after the cursor, the user's
+    tombstones after it, the next cursor and whether another page is waiting.
+    Raises InvalidCursor or ExpiredCursor.
+    """
+    positions = decode_cursor(cursor)
+    horizon = timezone.now() - timedelta(days=tombstone_retention_days())
+    if positions["t"][0] < horizon:
+        raise ExpiredCursor("Sync cursor is older than the deletion log")
+
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    settled = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    changed, appointments_position, more_changed = _take(
+        appointments, "updated_at", positions["a"], limit, settled
+    )
+    deleted, tombstones_position, more_deleted = _take(
+        scoped_tombstones(user, appointments),
+        "deleted_at",
+        positions["t"],
+        limit,
+        settled,
+    )
+    return {
+        "appointments": changed,
+        "deleted": [
+            {
+                "id": tombstone.appointment_id,
+                "date": tombstone.date.isoformat() if tombstone.date else None,
+            }
+            for tombstone in deleted
+        ],
+        "cursor": encode_cursor(appointments_position, tombstones_position),
+        "has_more": more_changed or more_deleted,
+    }
+
+
+def appointment_staff_ids(appointment):
+    """Therapists and driver who can see an appointment through delta sync"""
+    user_ids = {appointment.therapist_id, appointment.driver_id}
+    if appointment.pk:
+        user_ids.update(appointment.therapists.values_list("id", flat=True))
+    user_ids.discard(None)
+    return user_ids
+
+
+def _record(appointment, user_ids):
+    from .models import AppointmentTombstone
+
+    AppointmentTombstone.objects.bulk_create(
+        [
+            AppointmentTombstone(
+                appointment_id=appointment.id, date=appointment.date, user_id=user_id
+            )
+            for user_id in user_ids
+        ]
+    )
+
+
+def record_deletion(appointment, staff_ids=()):
+    """Tombstones for a deleted appointment: operators and each staff member"""
+    _record(appointment, [None, *sorted(staff_ids)])
+
+
+def record_removal(appointment, user_ids):
+    """Tombstones for staff who can no longer see an appointment"""
+    if user_ids:
+        _record(appointment, sorted(user_ids))
+
+
+def prune_tombstones():
+    """Drop tombstones past the retention window; returns the number removed"""
+    from .models import AppointmentTombstone
+
+    horizon = timezone.now() - timedelta(days=tombstone_retention_days())
+    removed, _ = AppointmentTombstone.objects.filter(deleted_at__lt=horizon).delete()
+    if removed:
+        logger.info(f"Pruned {removed} appointment tombstones")
+    return removed
@@ -0,0 +1,315 @@
+"""
+FIFO queue of drivers available for pickup assignment
+Drivers are ordered by when they became available; a Redis sorted set is
+used when the cache backend is django-redis, otherwise an in-process heap
+"""
+
+import heapq
+import logging
+import threading
+import time
+
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Appointment statuses during which the assigned driver is busy
+BUSY_DRIVER_STATUSES = [
+    "in_progress",
+    "journey",
+    "arrived",
+    "driver_assigned_pickup",
+    "return_journey",
+]
+# Statuses that hand the driver back to the queue
+DRIVER_RELEASE_STATUSES = ["dropped_off", "transport_completed", "completed"]
+
+
+class _LocalQueue:
+    """Heap with lazy deletion so push, remove and pop stay O(log n)"""
+
+    def __init__(self):
+        self.heap = []
+        self.scores = {}
+
+    def push(self, driver_id, score):
+        self.scores[driver_id] = score
+        heapq.heappush(self.heap, (score, driver_id))
+
+    def remove(self, driver_id):
+        self.scores.pop(driver_id, None)
+
+    def pop(self):
+        while self.heap:
+            score, driver_id = heapq.heappop(self.heap)
+            if self.scores.get(driver_id) == score:
+                del self.scores[driver_id]
+                return driver_id, score
+        return None
+
+    def ids(self):
+        return [driver_id for _, driver_id in sorted((s, d) for d, s in self.scores.items())]
+
+
+class DriverQueue:
+    """
+    Per-day queue of idle drivers keyed by last_available_at.
+
+    Pops are atomic (ZPOPMIN in Redis, a lock in process), so two concurrent
+    pickup requests never get the same driver; a popped driver is re-checked
+    against the database before being handed out. Availability changes keep
+    the queue itself current, so that re-check is two point lookups.
+    """
+
+    KEY = "guitara:driver_queue:{}"
+    SEEDED_KEY = "guitara:driver_queue_seeded:{}"
+    SEEDING_KEY = "guitara:driver_queue_seeding:{}"
+    KEY_TTL = 60 * 60 * 48
+    SEED_LOCK_TTL = 30
+    SEED_WAIT_SECONDS = 5
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seed_lock = threading.Lock()
+        self._local = {}
+        self._local_seeded = set()
+        self._redis_client = None
+        self._redis_checked = False
+
+    def _redis(self):
+        if not self._redis_checked:
+            self._redis_checked = True
+            try:
+                from django_redis import get_redis_connection
+
+                self._redis_client = get_redis_connection("default")
+            except Exception:
+                # LocMemCache or django-redis not installed
+                self._redis_client = None
+        return self._redis_client
+
+    def _run(self, redis_op, local_op):
+        """Run against Redis, falling back to the in-process queue on errors"""
+        client = self._redis()
+        if client is not None:
+            try:
+                return redis_op(client)
+            except Exception as e:
+                logger.warning(f"Driver queue Redis error, using local queue: {e}")
+        with self._lock:
+            return local_op()
+
+    def _local_queue(self, day):
+        return self._local.setdefault(day, _LocalQueue())
+
+    @staticmethod
+    def _score(last_available_at):
+        return (last_available_at or timezone.now()).timestamp()
+
+    # ------------------------------------------------------------------
+    # Queue maintenance
+    # ------------------------------------------------------------------
+
+    def push(self, driver_id, last_available_at=None, day=None):
+        """Add (or re-order) a driver as available"""
+        day = day or timezone.localdate()
+        score = self._score(last_available_at)
+        key = self.KEY.format(day.isoformat())
+
+        def redis_op(client):
+            pipe = client.pipeline()
+            pipe.zadd(key, {str(driver_id): score})
+            pipe.expire(key, self.KEY_TTL)
+            pipe.execute()
+
+        self._run(redis_op, lambda: self._local_queue(day).push(driver_id, score))
+
+    def remove(self, driver_id, day=None):
+        """Drop a driver that became busy"""
+        day = day or timezone.localdate()
+        key = self.KEY.format(day.isoformat())
+        self._run(
+            lambda client: client.zrem(key, str(driver_id)),
+            lambda: self._local_queue(day).remove(driver_id),
+        )
+
+    def _pop(self, day):
+        key = self.KEY.format(day.isoformat())
+
+        def redis_op(client):
+            popped = client.zpopmin(key, 1)
+            return (int(popped[0][0]), popped[0][1]) if popped else None
+
+        return self._run(redis_op, lambda: self._local_queue(day).pop())
+
+    def snapshot(self, day=None):
+        """Driver ids in queue order, for diagnostics"""
+        day = day or timezone.localdate()
+        self.ensure_seeded(day)
+        key = self.KEY.format(day.isoformat())
+        return self._run(
+            lambda client: [int(member) for member in client.zrange(key, 0, -1)],
+            lambda: self._local_queue(day).ids(),
+        )
+
+    def ensure_seeded(self, day):
+        """
+        Build the queue from the database the first time a day is used.
+        The day is only marked seeded once its drivers are in the queue: one
+        caller builds under a short lock while the others wait for the flag.
+        """
+        key = self.KEY.format(day.isoformat())
+        seeded_key = self.SEEDED_KEY.format(day.isoformat())
+        seeding_key = self.SEEDING_KEY.format(day.isoformat())
+
+        def redis_op(client):
+            deadline = time.monotonic() + self.SEED_WAIT_SECONDS
+            while not client.exists(seeded_key):
+                if client.set(seeding_key, 1, nx=True, ex=self.SEED_LOCK_TTL):
+                    try:
+                        eligible = self._eligible_drivers(day)
+                        drivers = {
+                            str(driver_id): self._score(last_available_at)
+                            for driver_id, last_available_at in eligible
+                        }
+                        pipe = client.pipeline()
+                        if drivers:
+                            # NX: drivers released meanwhile keep their newer score
+                            pipe.zadd(key, drivers, nx=True)
+                            pipe.expire(key, self.KEY_TTL)
+                        pipe.set(seeded_key, 1, ex=self.KEY_TTL)
+                        pipe.execute()
+                    finally:
+                        client.delete(seeding_key)
+                    return
+                if time.monotonic() >= deadline:
+                    logger.warning(f"Timed out waiting for driver queue seed of {day}")
+                    return
+                time.sleep(0.05)
+
+        def local_op():
+            with self._seed_lock:
+                if day in self._local_seeded:
+                    return
+                eligible = self._eligible_drivers(day)
+                with self._lock:
+                    queue = self._local_queue(day)
+                    for driver_id, last_available_at in eligible:
+                        # Drivers released meanwhile keep their newer score
+                        if driver_id not in queue.scores:
+                            queue.push(driver_id, self._score(last_available_at))
+                    self._local_seeded.add(day)
+
+        client = self._redis()
+        if client is not None:
+            try:
+                return redis_op(client)
+            except Exception as e:
+                logger.warning(f"Driver queue Redis error, using local queue: {e}")
+        local_op()
+
+    def reset(self, day=None):
+        """Forget a day's queue so it is rebuilt from the database"""
+        day = day or timezone.localdate()
+        keys = [
+            self.KEY.format(day.isoformat()),
+            self.SEEDED_KEY.format(day.isoformat()),
+        ]
+
+        def local_op():
+            self._local.pop(day, None)
+            self._local_seeded.discard(day)
+
+        self._run(lambda client: client.delete(*keys), local_op)
+
+    # ------------------------------------------------------------------
+    # Assignment
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _eligible_drivers(day, driver_ids=None):
+        """(id, last_available_at) of active drivers with availability and no active trip"""
+        from core.models import CustomUser
+        from .models import Appointment
+
+        from .recurring_availability import recurring_user_ids
+
+        drivers = CustomUser.objects.filter(
+            Q(availabilities__date=day, availabilities__is_available=True)
+            | Q(id__in=recurring_user_ids(day, role="driver")),
+            role="driver",
+            is_active=True,
+        )
+        if driver_ids is not None:
+            drivers = drivers.filter(id__in=driver_ids)
+        busy_ids = Appointment.objects.filter(
+            date=day, status__in=BUSY_DRIVER_STATUSES, driver__isnull=False
+        ).values("driver_id")
+        return list(
+            drivers.exclude(id__in=busy_ids)
+            .distinct()
+            .values_list("id", "last_available_at")
+        )
+
+    def claim(self, day=None):
+        """
+        Pop the driver who has been idle longest.
+        Stale entries (inactive, or busy with a trip) are discarded. The
+        driver keeps their queue score on _queue_score for requeue().
+        """
+        from core.models import CustomUser
+        from .models import Appointment
+
+        day = day or timezone.localdate()
+        self.ensure_seeded(day)
+
+        while True:
+            popped = self._pop(day)
+            if popped is None:
+                return None
+            driver_id, score = popped
+            driver = CustomUser.objects.filter(
+                id=driver_id, role="driver", is_active=True
+            ).first()
+            if (
+                driver is not None
+                and not Appointment.objects.filter(
+                    date=day, driver_id=driver_id, status__in=BUSY_DRIVER_STATUSES
+                ).exists()
+            ):
+                driver._queue_score = score
+                return driver
+            logger.info(f"Discarded stale driver {driver_id} from pickup queue")
+
+    def requeue(self, driver, day):
+        """Put back a claimed driver whose assignment failed, in their old place"""
+        score = getattr(driver, "_queue_score", None)
+        key = self.KEY.format(day.isoformat())
+        if score is None:
+            score = self._score(driver.last_available_at)
+
+        def redis_op(client):
+            pipe = client.pipeline()
+            pipe.zadd(key, {str(driver.id): score})
+            pipe.expire(key, self.KEY_TTL)
+            pipe.execute()
+
+        self._run(redis_op, lambda: self._local_queue(day).push(driver.id, score))
+
+    def release(self, driver_id, day, last_available_at=None):
+        """Queue a driver again if they are still eligible for the day"""
+        for eligible_id, stored_at in self._eligible_drivers(day, [driver_id]):
+            self.push(eligible_id, last_available_at or stored_at, day)
+
+    def refresh(self, driver_id, day):
+        """Queue or drop a driver after their availability for the day changed"""
+        eligible = self._eligible_drivers(day, [driver_id])
+        if eligible:
+            self.push(driver_id, eligible[0][1], day)
+        else:
+            self.remove(driver_id, day)
+
+
+# Global instance
+driver_queue = DriverQueue()
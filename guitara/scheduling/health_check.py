@@ -52,10 +52,20 @@ def health_check(request):
     except Exception as e:
         asgi_status = f"error: {str(e)}"
 
+    # Cache hit/miss counters per key family, summed across processes
+    try:
+        from .cache_metrics import cache_metrics
+
+        cache_stats = cache_metrics.aggregate()
+    except Exception as e:
+        logger.error(f"Cache metrics collection failed: {e}")
+        cache_stats = f"error: {str(e)}"
+
     health_data = {
         "status": "healthy",
         "database": db_status,
         "cache": redis_status,
+        "cache_metrics": cache_stats,
         "asgi": asgi_status,
         "timestamp": timezone.now().isoformat(),
     }
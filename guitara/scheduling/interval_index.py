@@ -0,0 +1,316 @@
+"""
+In-memory interval index for staff availability lookups
+Answers "who is free from start to end on this date" without per-staff queries
+"""
+
+import bisect
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+
+from .cache_metrics import metered_cache
+from .recurring_availability import expand_for_day
+from .time_ranges import day_bounds, normalize_range, overlapping
+
+logger = logging.getLogger(__name__)
+
+# Appointment statuses that block a staff member's time
+ACTIVE_APPOINTMENT_STATUSES = ["pending", "confirmed", "in_progress"]
+
+
+class IntervalList:
+    """
+    Sorted list of closed intervals with a running max of end points.
+    Both overlap and containment checks are a single bisect.
+    """
+
+    __slots__ = ("starts", "ends", "payloads", "max_ends")
+
+    def __init__(self, intervals):
+        intervals = sorted(intervals, key=lambda item: (item[0], item[1]))
+        self.starts = [item[0] for item in intervals]
+        self.ends = [item[1] for item in intervals]
+        self.payloads = [item[2] for item in intervals]
+        self.max_ends = []
+        running = None
+        for end in self.ends:
+            running = end if running is None or end > running else running
+            self.max_ends.append(running)
+
+    def overlaps(self, start, end):
+        """True if any interval touches or overlaps [start, end]"""
+        idx = bisect.bisect_right(self.starts, end)
+        return idx > 0 and self.max_ends[idx - 1] >= start
+
+    def covering(self, start, end):
+        """Return the payload of an interval fully containing [start, end], or None"""
+        idx = bisect.bisect_right(self.starts, start)
+        if idx == 0 or self.max_ends[idx - 1] < end:
+            return None
+        for i in range(idx - 1, -1, -1):
+            if self.ends[i] >= end:
+                return self.payloads[i]
+        return None
+
+
+class DayIntervalIndex:
+    """
+    Availability and booked intervals for every staff member around one date.
+
+    Availability is loaded for every slot whose absolute range touches the
+    date (including cross-day slots from the previous day); appointments are
+    loaded through the following day so windows spilling past midnight are
+    still checked.
+    """
+
+    def __init__(self, day):
+        self.day = day
+        self.built_at = time.monotonic()
+        self.staff = {}
+        self.availability = {}
+        self.busy = {}
+        self._build()
+
+    def _build(self):
+        from .models import Availability, Appointment
+
+        day_start, day_end = day_bounds(self.day)
+        availability_rows = overlapping(
+            Availability.objects.filter(is_available=True), day_start, day_end
+        ).values(
+            "id",
+            "date",
+            "start_time",
+            "end_time",
+            "is_available",
+            "user_id",
+            "user__role",
+            "user__is_active",
+            "user__first_name",
+            "user__last_name",
+            "user__email",
+            "user__specialization",
+            "user__massage_pressure",
+            "user__motorcycle_plate",
+        )
+
+        # Recurring templates are expanded for this date only
+        availability_rows = list(availability_rows) + [
+            {
+                "id": None,
+                "date": slot.date,
+                "start_time": slot.start_time,
+                "end_time": slot.end_time,
+                "is_available": slot.is_available,
+                "user_id": slot.user_id,
+                "user__role": slot.user.role,
+                "user__is_active": slot.user.is_active,
+                "user__first_name": slot.user.first_name,
+                "user__last_name": slot.user.last_name,
+                "user__email": slot.user.email,
+                "user__specialization": slot.user.specialization,
+                "user__massage_pressure": slot.user.massage_pressure,
+                "user__motorcycle_plate": slot.user.motorcycle_plate,
+                "recurring_template_id": slot.recurring_template_id,
+            }
+            for slot in expand_for_day(self.day)
+        ]
+
+        availability = {}
+        for row in availability_rows:
+            user_id = row["user_id"]
+            if user_id not in self.staff:
+                self.staff[user_id] = {
+                    "id": user_id,
+                    "role": row["user__role"],
+                    "is_active": row["user__is_active"],
+                    "first_name": row["user__first_name"],
+                    "last_name": row["user__last_name"],
+                    "email": row["user__email"],
+                    "specialization": row["user__specialization"],
+                    "massage_pressure": row["user__massage_pressure"],
+                    "motorcycle_plate": row["user__motorcycle_plate"],
+                }
+            start_dt, end_dt = normalize_range(
+                row["date"], row["start_time"], row["end_time"]
+            )
+            availability.setdefault(user_id, []).append((start_dt, end_dt, row))
+
+        # Windows on this date may run past midnight, so bookings touching the
+        # next day matter as well
+        appointment_rows = list(
+            overlapping(
+                Appointment.objects.filter(status__in=ACTIVE_APPOINTMENT_STATUSES),
+                day_start,
+                day_bounds(self.day, days=2)[1],
+            ).values(
+                "id", "date", "start_time", "end_time", "therapist_id", "driver_id"
+            )
+        )
+        ranges = {
+            row["id"]: normalize_range(row["date"], row["start_time"], row["end_time"])
+            for row in appointment_rows
+        }
+
+        busy = {}
+        for row in appointment_rows:
+            start_dt, end_dt = ranges[row["id"]]
+            for user_id in (row["therapist_id"], row["driver_id"]):
+                if user_id:
+                    busy.setdefault(user_id, []).append((start_dt, end_dt, row["id"]))
+
+        # Group bookings keep additional therapists in the M2M table
+        group_rows = Appointment.therapists.through.objects.filter(
+            appointment_id__in=list(ranges)
+        ).values_list("appointment_id", "customuser_id")
+        for appointment_id, user_id in group_rows:
+            start_dt, end_dt = ranges[appointment_id]
+            busy.setdefault(user_id, []).append((start_dt, end_dt, appointment_id))
+
+        self.availability = {
+            user_id: IntervalList(intervals)
+            for user_id, intervals in availability.items()
+        }
+        self.busy = {user_id: IntervalList(intervals) for user_id, intervals in busy.items()}
+
+    def staff_ids(self, role, specialization=None, massage_pressure=None):
+        """Active staff with availability around this date matching the filters"""
+        specialization = (specialization or "").lower()
+        massage_pressure = (massage_pressure or "").lower()
+
+        user_ids = []
+        for user_id in sorted(self.availability):
+            staff = self.staff[user_id]
+            if staff["role"] != role or not staff["is_active"]:
+                continue
+            if specialization and specialization not in (
+                staff["specialization"] or ""
+            ).lower():
+                continue
+            if massage_pressure and massage_pressure not in (
+                staff["massage_pressure"] or ""
+            ).lower():
+                continue
+            user_ids.append(user_id)
+        return user_ids
+
+    def free_staff(
+        self,
+        role,
+        start_time,
+        end_time,
+        specialization=None,
+        massage_pressure=None,
+    ):
+        """
+        Return (staff, availability_row) pairs for everyone of the given role
+        who has a slot covering the window and no active booking touching it.
+        """
+        start_dt, end_dt = normalize_range(self.day, start_time, end_time)
+
+        results = []
+        for user_id in self.staff_ids(role, specialization, massage_pressure):
+            staff = self.staff[user_id]
+            slot = self.availability[user_id].covering(start_dt, end_dt)
+            if slot is None:
+                continue
+
+            busy = self.busy.get(user_id)
+            if busy is not None and busy.overlaps(start_dt, end_dt):
+                continue
+
+            results.append((staff, slot))
+
+        return results
+
+
+class IntervalIndexManager:
+    """
+    Process-local cache of DayIntervalIndex objects.
+
+    Each date has a version counter in the shared cache. Signals bump the
+    counters for the dates touched by an Availability or Appointment write,
+    and only those days are rebuilt on their next lookup.
+    """
+
+    VERSION_KEY = "interval_index_version_{}"
+    # Recurring templates can affect any date, so they share one counter
+    TEMPLATES_VERSION_KEY = "interval_index_version_templates"
+    MAX_AGE_SECONDS = 300  # Safety net for changes that bypass signals
+
+    def __init__(self):
+        self._days = {}
+        self._lock = threading.Lock()
+
+    def version(self, day):
+        """Current cache version for a date, including the template version"""
+        day_key = self.VERSION_KEY.format(day.isoformat())
+        versions = metered_cache.get_many([day_key, self.TEMPLATES_VERSION_KEY])
+        return f"{versions.get(day_key, 0)}.{versions.get(self.TEMPLATES_VERSION_KEY, 0)}"
+
+    def get_day(self, day):
+        """Return an up-to-date index for the given date"""
+        version = self.version(day)
+        with self._lock:
+            entry = self._days.get(day)
+            if (
+                entry is not None
+                and entry[0] == version
+                and time.monotonic() - entry[1].built_at < self.MAX_AGE_SECONDS
+            ):
+                return entry[1]
+
+        index = DayIntervalIndex(day)
+        with self._lock:
+            self._days[day] = (version, index)
+            # Keep memory bounded to a small window of recently used days
+            if len(self._days) > 31:
+                oldest = min(self._days.items(), key=lambda item: item[1][1].built_at)
+                self._days.pop(oldest[0], None)
+        return index
+
+    def invalidate(self, *days):
+        """Mark each date (and its neighbours, for cross-day slots) as stale"""
+        affected = set()
+        for day in days:
+            if day is None:
+                continue
+            affected.update(
+                [day - timedelta(days=1), day, day + timedelta(days=1)]
+            )
+
+        for day in affected:
+            key = self.VERSION_KEY.format(day.isoformat())
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, None)
+            except Exception as e:
+                logger.error(f"Failed to bump interval index version for {day}: {e}")
+
+        with self._lock:
+            for day in affected:
+                self._days.pop(day, None)
+
+    def invalidate_staff(self):
+        """Mark every date as stale after a staff member was (de)activated"""
+        self.invalidate_templates()
+
+    def invalidate_templates(self):
+        """Mark every date as stale after a recurring template changed"""
+        try:
+            cache.incr(self.TEMPLATES_VERSION_KEY)
+        except ValueError:
+            cache.set(self.TEMPLATES_VERSION_KEY, 1, None)
+        except Exception as e:
+            logger.error(f"Failed to bump recurring template version: {e}")
+
+        with self._lock:
+            self._days.clear()
+
+
+# Global instance
+interval_index = IntervalIndexManager()
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from scheduling.notification_retention import (
+    archivable_notifications,
+    archive_notifications,
+    notification_retention_days,
+)
+
+
+class Command(BaseCommand):
+    help = "Move read notifications past the retention window into the archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            help="Archive read notifications older than this many days "
+            f"(default: {notification_retention_days()})",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="Notifications moved per transaction",
+        )
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            help="Stop after this many batches (default: until none are left)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many notifications would be archived",
+        )
+
+    def handle(self, *args, **options):
+        days = options["days"]
+        if days is not None and days < 0:
+            raise CommandError("--days must not be negative")
+        if options["batch_size"] is not None and options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        if options["dry_run"]:
+            count = archivable_notifications(days).count()
+            self.stdout.write(f"{count} read notifications would be archived")
+            return
+
+        archived, batches = archive_notifications(
+            days=days,
+            batch_size=options["batch_size"],
+            max_batches=options["max_batches"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived {archived} read notifications in {batches} batches"
+            )
+        )
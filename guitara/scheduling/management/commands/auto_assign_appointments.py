@@ -0,0 +1,67 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from scheduling.auto_assignment import (
+    AssignmentPlanner,
+    StaleAssignmentPlan,
+    apply_plan,
+)
+
+
+class Command(BaseCommand):
+    help = "Assign therapists and drivers to a day's pending appointments in one batch"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date",
+            help="Date to plan in YYYY-MM-DD format (defaults to today)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Show the proposed plan without applying it",
+        )
+
+    def handle(self, *args, **options):
+        if options["date"]:
+            try:
+                day = datetime.strptime(options["date"], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError("Invalid date format. Use YYYY-MM-DD")
+        else:
+            day = timezone.localdate()
+
+        plan = AssignmentPlanner(day).plan()
+
+        for item in plan["assignments"]:
+            self.stdout.write(
+                f"Appointment {item['appointment_id']}: "
+                f"therapist={item['therapist_id'] or '-'} "
+                f"driver={item['driver_id'] or '-'} cost={item['cost']}"
+            )
+        for item in plan["unassigned"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Appointment {item['appointment_id']} left unassigned: {item['reason']}"
+                )
+            )
+        self.stdout.write(f"Solved in {plan['solve_seconds']}s")
+
+        if options["dry_run"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"DRY RUN: Would have assigned {len(plan['assignments'])} appointments"
+                )
+            )
+            return
+
+        try:
+            applied = apply_plan(plan)
+        except StaleAssignmentPlan as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Successfully assigned {applied} appointments for {day}")
+        )
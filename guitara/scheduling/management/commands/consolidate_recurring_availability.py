@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from scheduling.recurring_availability import consolidate_weekly_rows
+
+
+class Command(BaseCommand):
+    help = "Replace weekly repeated availability rows with recurring templates"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-weeks",
+            type=int,
+            default=4,
+            help="Minimum number of repeats before a day pattern becomes a template",
+        )
+        parser.add_argument(
+            "--since",
+            help="Only consolidate rows from this date (YYYY-MM-DD) onwards",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Show what would be consolidated without changing anything",
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            try:
+                since = datetime.strptime(options["since"], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError("Invalid date format. Use YYYY-MM-DD")
+
+        templates, rows = consolidate_weekly_rows(
+            min_weeks=options["min_weeks"],
+            since=since,
+            dry_run=options["dry_run"],
+        )
+        if options["dry_run"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"DRY RUN: would replace {rows} availability rows with {templates} templates"
+                )
+            )
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Replaced {rows} availability rows with {templates} templates"
+                )
+            )
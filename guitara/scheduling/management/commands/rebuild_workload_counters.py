@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from scheduling.workload import workload_counters
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily staff workload counters from appointments"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            help="Only rebuild counters from this date (YYYY-MM-DD) onwards",
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            try:
+                since = datetime.strptime(options["since"], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError("Invalid date format. Use YYYY-MM-DD")
+
+        rows = workload_counters.rebuild(since=since)
+        self.stdout.write(
+            self.style.SUCCESS(f"Corrected {rows} staff workload counter rows")
+        )
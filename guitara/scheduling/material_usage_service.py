@@ -202,12 +202,42 @@ class MaterialUsageService:
         Returns:
             Dict with material usage summary
         """
-        materials = AppointmentMaterial.objects.filter(
-            appointment=appointment
-        ).select_related('inventory_item')
+        # Use prefetched materials when the caller loaded them
+        materials = getattr(appointment, '_prefetched_objects_cache', {}).get(
+            'appointment_materials'
+        )
+        if materials is None:
+            materials = AppointmentMaterial.objects.filter(
+                appointment=appointment
+            ).select_related('inventory_item').order_by('id')
         
+        return cls.summarize_materials(
+            {
+                'name': material.inventory_item.name,
+                'category': material.inventory_item.category,
+                'quantity_used': material.quantity_used,
+                'unit': material.inventory_item.unit,
+                'deducted_at': material.deducted_at,
+                'returned_at': material.returned_at,
+                'is_reusable': material.is_reusable,
+            }
+            for material in materials
+        )
+    
+    @classmethod
+    def summarize_materials(cls, materials):
+        """
+        Build the material usage summary from already-loaded rows
+        
+        Args:
+            materials: Dicts with name, category, quantity_used, unit,
+                deducted_at, returned_at and is_reusable
+            
+        Returns:
+            Dict with material usage summary
+        """
         summary = {
-            'total_materials': materials.count(),
+            'total_materials': 0,
             'consumable_materials': [],
             'reusable_materials': [],
             'reusable_returned': 0,
@@ -215,18 +245,19 @@ class MaterialUsageService:
         }
         
         for material in materials:
+            summary['total_materials'] += 1
             material_info = {
-                'name': material.inventory_item.name,
-                'category': material.inventory_item.category,
-                'quantity_used': material.quantity_used,
-                'unit': material.inventory_item.unit,
-                'deducted_at': material.deducted_at,
-                'returned_at': material.returned_at
+                'name': material['name'],
+                'category': material['category'],
+                'quantity_used': material['quantity_used'],
+                'unit': material['unit'],
+                'deducted_at': material['deducted_at'],
+                'returned_at': material['returned_at']
             }
             
-            if material.is_reusable:
+            if material['is_reusable']:
                 summary['reusable_materials'].append(material_info)
-                if material.returned_at:
+                if material['returned_at']:
                     summary['reusable_returned'] += 1
                 else:
                     summary['reusable_pending'] += 1
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_workload(apps, schema_editor):
+    Appointment = apps.get_model("scheduling", "Appointment")
+    StaffDailyWorkload = apps.get_model("scheduling", "StaffDailyWorkload")
+
+    totals = {}
+    appointments = Appointment.objects.filter(status__in=["completed", "in_progress"])
+    for field in ("therapist_id", "driver_id"):
+        rows = (
+            appointments.exclude(**{field: None})
+            .values(field, "date")
+            .annotate(total=Count("id"))
+        )
+        for row in rows:
+            key = (row[field], row["date"])
+            totals[key] = totals.get(key, 0) + row["total"]
+
+    StaffDailyWorkload.objects.bulk_create(
+        [
+            StaffDailyWorkload(user_id=user_id, date=date, appointment_count=total)
+            for (user_id, date), total in totals.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0019_appointment_metadata'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaffDailyWorkload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('appointment_count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_workloads', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'user'], name='scheduling__date_ad827c_idx')],
+                'unique_together': {('user', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_workload, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:45
+
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_ranges(apps, schema_editor):
+    """Resolve date/start_time/end_time (cross-day aware) into start_at/end_at"""
+    for model_name in ("Availability", "Appointment"):
+        model = apps.get_model("scheduling", model_name)
+        batch = []
+        for row in model.objects.only("id", "date", "start_time", "end_time").iterator(
+            chunk_size=2000
+        ):
+            if row.date is None or row.start_time is None or row.end_time is None:
+                continue
+            start_dt = datetime.combine(row.date, row.start_time)
+            end_dt = datetime.combine(row.date, row.end_time)
+            if end_dt < start_dt:
+                end_dt += timedelta(days=1)
+            row.start_at = timezone.make_aware(start_dt)
+            row.end_at = timezone.make_aware(end_dt)
+            batch.append(row)
+            if len(batch) >= 2000:
+                model.objects.bulk_update(batch, ["start_at", "end_at"])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ["start_at", "end_at"])
+
+
+GIST_INDEXES = [
+    (
+        "scheduling_availability",
+        "availability_range_gist_idx",
+    ),
+    (
+        "scheduling_appointment",
+        "appointment_range_gist_idx",
+    ),
+]
+
+
+def create_range_indexes(apps, schema_editor):
+    """PostgreSQL gets GiST indexes over tstzrange; other backends keep the btrees"""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table, name in GIST_INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {table} "
+            "USING gist (tstzrange(start_at, end_at, '[]'));"
+        )
+
+
+def drop_range_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for _, name in GIST_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name};")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0006_alter_material_name_alter_registrationmaterial_name_and_more'),
+        ('scheduling', '0020_staffdailyworkload'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='end_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='start_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='availability',
+            name='end_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='availability',
+            name='start_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['start_at', 'end_at'], name='appointment_range_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='availability',
+            index=models.Index(fields=['user', 'start_at', 'end_at'], name='availability_user_range_idx'),
+        ),
+        migrations.RunPython(backfill_ranges, migrations.RunPython.noop),
+        migrations.RunPython(create_range_indexes, drop_range_indexes),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0021_absolute_datetime_ranges'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday_mask', models.PositiveSmallIntegerField()),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('is_available', models.BooleanField(default=True)),
+                ('effective_from', models.DateField()),
+                ('effective_until', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_availabilities', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Recurring availabilities',
+            },
+        ),
+        migrations.CreateModel(
+            name='RecurringAvailabilityException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('reason', models.CharField(blank=True, max_length=255)),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exceptions', to='scheduling.recurringavailability')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recurringavailability',
+            index=models.Index(fields=['effective_from', 'effective_until'], name='recurring_avail_effective_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='recurringavailabilityexception',
+            unique_together={('template', 'date')},
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.4 on 2026-10-17 00:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0022_recurring_availability'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('appointment_id', models.IntegerField()),
+                ('date', models.DateField(blank=True, null=True)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['updated_at', 'id'], name='appointment_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointmenttombstone',
+            index=models.Index(fields=['deleted_at', 'id'], name='appointment_tombstone_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.4 on 2026-10-17 00:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduling', '0025_unread_notification_counter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedNotification',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('notification_type', models.CharField(choices=[('appointment_created', 'Appointment Created'), ('appointment_updated', 'Appointment Updated'), ('appointment_reminder', 'Appointment Reminder'), ('appointment_cancelled', 'Appointment Cancelled'), ('appointment_accepted', 'Appointment Accepted'), ('appointment_rejected', 'Appointment Rejected'), ('appointment_started', 'Appointment Started'), ('appointment_completed', 'Appointment Completed'), ('appointment_auto_cancelled', 'Appointment Auto Cancelled'), ('rejection_reviewed', 'Rejection Reviewed'), ('therapist_disabled', 'Therapist Disabled')], max_length=30)),
+                ('message', models.TextField()),
+                ('appointment_id', models.IntegerField(blank=True, null=True)),
+                ('rejection_id', models.IntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'created_at', 'id'], name='archived_notification_idx')],
+            },
+        ),
+    ]
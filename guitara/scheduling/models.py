@@ -6,6 +6,9 @@ from django.db import transaction
 from django.utils import timezone
 import json
 
+from .recurring_availability import has_recurring_cover
+from .time_ranges import absolute_range, covering, overlapping
+
 
 class Client(models.Model):
     """Model to store client information"""
@@ -45,10 +48,30 @@ class Availability(models.Model):
     start_time = models.TimeField()
     end_time = models.TimeField()
     is_available = models.BooleanField(default=True)
+    # Absolute range derived from date/start_time/end_time on save
+    start_at = models.DateTimeField(null=True, blank=True, editable=False)
+    end_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     class Meta:
         verbose_name_plural = "Availabilities"
         unique_together = ("user", "date", "start_time", "end_time")
+        indexes = [
+            models.Index(
+                fields=["user", "start_at", "end_at"],
+                name="availability_user_range_idx",
+            )
+        ]
+
+    def sync_datetime_range(self):
+        """Resolve the slot (including cross-day slots) into start_at/end_at"""
+        self.start_at, self.end_at = absolute_range(
+            self.date, self.start_time, self.end_time
+        )
+
+    def save(self, *args, **kwargs):
+        self.sync_datetime_range()
+        kwargs = _with_range_update_fields(kwargs)
+        return super().save(*args, **kwargs)
 
     def clean(self):
         # Support cross-day availability (e.g., 13:00 to 01:00 next day)
@@ -68,6 +91,105 @@ class Availability(models.Model):
         )
 
 
+class RecurringAvailability(models.Model):
+    """
+    Weekly availability template, expanded on demand for the requested dates.
+    Concrete Availability rows for a user and date override the template on
+    that date; exceptions skip single occurrences.
+    """
+
+    WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+    user = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name="recurring_availabilities"
+    )
+    # Bit n set means the template applies on date.weekday() == n
+    weekday_mask = models.PositiveSmallIntegerField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    is_available = models.BooleanField(default=True)
+    effective_from = models.DateField()
+    effective_until = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Recurring availabilities"
+        indexes = [
+            models.Index(
+                fields=["effective_from", "effective_until"],
+                name="recurring_avail_effective_idx",
+            )
+        ]
+
+    @classmethod
+    def mask_for(cls, weekdays):
+        """Bit mask for a list of weekday numbers (0=Monday) or names"""
+        mask = 0
+        for weekday in weekdays:
+            if isinstance(weekday, str):
+                weekday = cls.WEEKDAYS.index(weekday.lower()[:3])
+            mask |= 1 << weekday
+        return mask
+
+    @property
+    def weekdays(self):
+        return [
+            name
+            for bit, name in enumerate(self.WEEKDAYS)
+            if self.weekday_mask & (1 << bit)
+        ]
+
+    def occurs_on(self, day):
+        """True if the template applies on the date (exceptions not considered)"""
+        return (
+            self.weekday_mask & (1 << day.weekday())
+            and self.effective_from <= day
+            and (self.effective_until is None or day <= self.effective_until)
+        )
+
+    def clean(self):
+        if self.start_time == self.end_time:
+            raise ValidationError("Start time and end time cannot be the same")
+        if not 0 < self.weekday_mask < 1 << 7:
+            raise ValidationError("At least one weekday must be selected")
+        if self.effective_until and self.effective_until < self.effective_from:
+            raise ValidationError("Effective until must not be before effective from")
+        if self.user.role not in ["therapist", "driver"]:
+            raise ValidationError(
+                "Only therapists and drivers can have availability slots"
+            )
+
+    def __str__(self):
+        return f"{self.user.username} - {','.join(self.weekdays)} ({self.start_time} to {self.end_time})"
+
+
+class RecurringAvailabilityException(models.Model):
+    """A date on which a recurring availability template does not apply"""
+
+    template = models.ForeignKey(
+        RecurringAvailability, on_delete=models.CASCADE, related_name="exceptions"
+    )
+    date = models.DateField()
+    reason = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        unique_together = ("template", "date")
+
+    def __str__(self):
+        return f"{self.template} skipped on {self.date}"
+
+
+def _with_range_update_fields(kwargs):
+    """Save start_at/end_at whenever a partial save touches the slot fields"""
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and {"date", "start_time", "end_time"} & set(
+        update_fields
+    ):
+        kwargs["update_fields"] = set(update_fields) | {"start_at", "end_at"}
+    return kwargs
+
+
 class Appointment(models.Model):
     """Model to store appointment/booking information"""
 
@@ -347,11 +469,42 @@ class Appointment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Absolute range derived from date/start_time/end_time on save
+    start_at = models.DateTimeField(null=True, blank=True, editable=False)
+    end_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["start_at", "end_at"], name="appointment_range_idx"
+            ),
+            # Delta sync walks (updated_at, id) as a keyset
+            models.Index(
+                fields=["updated_at", "id"], name="appointment_updated_idx"
+            ),
+            # Cursor pagination seeks on (date, start_time, id)
+            models.Index(
+                fields=["date", "start_time", "id"], name="appointment_keyset_idx"
+            ),
+        ]
+
+    def sync_datetime_range(self):
+        """Resolve the booking (including cross-day bookings) into start_at/end_at"""
+        self.start_at, self.end_at = absolute_range(
+            self.date, self.start_time, self.end_time
+        )
+
     def save(self, *args, **kwargs):
         # Set response deadline when creating a new pending appointment
         if not self.pk and self.status == "pending":
             self.response_deadline = timezone.now() + timedelta(minutes=30)
 
+        self.sync_datetime_range()
+        kwargs = _with_range_update_fields(kwargs)
+        if kwargs.get("update_fields") is not None:
+            # Partial saves must still advance updated_at for delta sync
+            kwargs["update_fields"] = set(kwargs["update_fields"]) | {"updated_at"}
+
         with transaction.atomic():
             # Calculate end time based on service durations if not provided
             if not self.end_time or kwargs.pop("recalculate_duration", False):
@@ -371,6 +524,7 @@ class Appointment(models.Model):
 
                 # Update end time
                 self.end_time = end_datetime.time()
+                self.sync_datetime_range()
 
                 # Save again with the calculated end time
                 return super().save(*args, **kwargs)
@@ -390,19 +544,19 @@ class Appointment(models.Model):
     def both_parties_accepted(self):
         """Check if both therapist and driver have accepted the appointment"""
         therapist_accepted = (
-            self.therapist_accepted if self.therapist else True
+            self.therapist_accepted if self.therapist_id else True
         )  # No therapist means no acceptance needed
         driver_accepted = (
-            self.driver_accepted if self.driver else True
+            self.driver_accepted if self.driver_id else True
         )  # No driver means no acceptance needed
         return therapist_accepted and driver_accepted
 
     def get_pending_acceptances(self):
         """Get list of parties that still need to accept"""
         pending = []
-        if self.therapist and not self.therapist_accepted:
+        if self.therapist_id and not self.therapist_accepted:
             pending.append(f"Therapist ({self.therapist.get_full_name()})")
-        if self.driver and not self.driver_accepted:
+        if self.driver_id and not self.driver_accepted:
             pending.append(f"Driver ({self.driver.get_full_name()})")
         return pending
 
@@ -418,34 +572,37 @@ class Appointment(models.Model):
         """Validate appointment constraints including conflict detection"""
         super().clean()
 
+        start_at, end_at = absolute_range(self.date, self.start_time, self.end_time)
+        if start_at is None:
+            return
+
         # Check for therapist conflicts
         if self.therapist:
-            conflicting_appointments = Appointment.objects.filter(
-                therapist=self.therapist,
-                date=self.date,
-                status__in=["pending", "confirmed", "in_progress"],
-            ).exclude(pk=self.pk)
-
-            for appointment in conflicting_appointments:
-                # Check if time ranges overlap
-                if (
-                    self.start_time <= appointment.end_time
-                    and self.end_time >= appointment.start_time
-                ):
-                    raise ValidationError(
-                        {
-                            "therapist": f"Therapist is already booked during this time slot ({appointment.start_time} - {appointment.end_time})"
-                        }
-                    )
+            appointment = (
+                overlapping(
+                    Appointment.objects.filter(
+                        therapist=self.therapist,
+                        status__in=["pending", "confirmed", "in_progress"],
+                    ),
+                    start_at,
+                    end_at,
+                )
+                .exclude(pk=self.pk)
+                .first()
+            )
+            if appointment:
+                raise ValidationError(
+                    {
+                        "therapist": f"Therapist is already booked during this time slot ({appointment.start_time} - {appointment.end_time})"
+                    }
+                )
 
             # Check if therapist is available at this time
-            has_availability = Availability.objects.filter(
-                user=self.therapist,
-                date=self.date,
-                start_time__lte=self.start_time,
-                end_time__gte=self.end_time,
-                is_available=True,
-            ).exists()
+            has_availability = covering(
+                Availability.objects.filter(user=self.therapist, is_available=True),
+                start_at,
+                end_at,
+            ).exists() or has_recurring_cover(self.therapist.id, start_at, end_at)
 
             if not has_availability:
                 raise ValidationError(
@@ -454,32 +611,31 @@ class Appointment(models.Model):
 
         # Check for driver conflicts
         if self.driver:
-            conflicting_appointments = Appointment.objects.filter(
-                driver=self.driver,
-                date=self.date,
-                status__in=["pending", "confirmed", "in_progress"],
-            ).exclude(pk=self.pk)
-
-            for appointment in conflicting_appointments:
-                # Check if time ranges overlap
-                if (
-                    self.start_time <= appointment.end_time
-                    and self.end_time >= appointment.start_time
-                ):
-                    raise ValidationError(
-                        {
-                            "driver": f"Driver is already booked during this time slot ({appointment.start_time} - {appointment.end_time})"
-                        }
-                    )
+            appointment = (
+                overlapping(
+                    Appointment.objects.filter(
+                        driver=self.driver,
+                        status__in=["pending", "confirmed", "in_progress"],
+                    ),
+                    start_at,
+                    end_at,
+                )
+                .exclude(pk=self.pk)
+                .first()
+            )
+            if appointment:
+                raise ValidationError(
+                    {
+                        "driver": f"Driver is already booked during this time slot ({appointment.start_time} - {appointment.end_time})"
+                    }
+                )
 
             # Check if driver is available at this time
-            has_availability = Availability.objects.filter(
-                user=self.driver,
-                date=self.date,
-                start_time__lte=self.start_time,
-                end_time__gte=self.end_time,
-                is_available=True,
-            ).exists()
+            has_availability = covering(
+                Availability.objects.filter(user=self.driver, is_available=True),
+                start_at,
+                end_at,
+            ).exists() or has_recurring_cover(self.driver.id, start_at, end_at)
 
             if not has_availability:
                 raise ValidationError(
@@ -724,6 +880,14 @@ class Notification(models.Model):
         related_name="notifications",
     )
 
+    class Meta:
+        indexes = [
+            # Cursor pagination seeks on (created_at, id) within a user
+            models.Index(
+                fields=["user", "created_at", "id"], name="notification_keyset_idx"
+            ),
+        ]
+
     def __str__(self):
         return f"{self.notification_type} for {self.user.username}"
 
@@ -783,3 +947,101 @@ class AppointmentMaterial(models.Model):
     def is_returned(self):
         """Check if reusable material has been returned"""
         return self.is_reusable and self.returned_at is not None
+
+
+class StaffDailyWorkload(models.Model):
+    """Per-user, per-day count of completed and in-progress appointments"""
+
+    user = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name="daily_workloads"
+    )
+    date = models.DateField()
+    appointment_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("user", "date")
+        indexes = [models.Index(fields=["date", "user"])]
+
+    def __str__(self):
+        return f"{self.user} - {self.date}: {self.appointment_count}"
+
+
+class UnreadNotificationCounter(models.Model):
+    """Stored unread-notification count per user, behind the cached copy"""
+
+    user = models.OneToOneField(
+        CustomUser,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="unread_notification_counter",
+    )
+    unread_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user}: {self.unread_count} unread"
+
+
+class ArchivedNotification(models.Model):
+    """Read notification moved out of the hot table by the retention job"""
+
+    # The original notification id, so a retried batch cannot archive twice
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name="archived_notifications"
+    )
+    notification_type = models.CharField(
+        max_length=30, choices=Notification.NOTIFICATION_TYPES
+    )
+    message = models.TextField()
+    # Plain ids: the archive outlives the appointments and rejections it names
+    appointment_id = models.IntegerField(null=True, blank=True)
+    rejection_id = models.IntegerField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # History pages seek on (created_at, id) within a user
+            models.Index(
+                fields=["user", "created_at", "id"],
+                name="archived_notification_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Archived {self.notification_type} for user {self.user_id}"
+
+
+class AppointmentTombstone(models.Model):
+    """
+    Removal log read by delta sync; rows are pruned after a retention window.
+    A row with a user tells that staff member the appointment left their scope
+    (deleted or reassigned); a row without one records a deletion for the
+    readers who see every appointment.
+    """
+
+    appointment_id = models.IntegerField()
+    date = models.DateField(null=True, blank=True)
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="appointment_tombstones",
+    )
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["deleted_at", "id"], name="appointment_tombstone_idx"
+            ),
+            models.Index(
+                fields=["user", "deleted_at", "id"],
+                name="appointment_tombstone_user_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Appointment #{self.appointment_id} deleted at {self.deleted_at}"
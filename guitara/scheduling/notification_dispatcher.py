@@ -0,0 +1,192 @@
+"""
+Notification fan-out
+An event's recipients are collected first, their rows written with one
+bulk_create, and every recipient's user group is pushed in a single
+channel-layer batch once the transaction commits
+"""
+
+import asyncio
+import logging
+from functools import partial
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_TITLES = {
+    "appointment_created": "New Appointment",
+    "appointment_updated": "Appointment Updated",
+    "appointment_reminder": "Appointment Reminder",
+    "appointment_cancelled": "Appointment Cancelled",
+    "appointment_accepted": "Appointment Accepted",
+    "appointment_rejected": "Appointment Rejected",
+    "appointment_started": "Appointment Started",
+    "appointment_completed": "Appointment Completed",
+    "appointment_auto_cancelled": "Appointment Auto Cancelled",
+    "rejection_reviewed": "Rejection Reviewed",
+    "therapist_disabled": "Therapist Disabled",
+}
+
+
+def _payload(notification_type, title, message, data):
+    """Same shape as NotificationWebSocketHandler.send_notification"""
+    return {
+        "type": "notification",
+        "notification_type": notification_type,
+        "title": title,
+        "message": message,
+        "data": data,
+        "timestamp": timezone.now().isoformat(),
+    }
+
+
+async def _send_all(channel_layer, events):
+    await asyncio.gather(
+        *(
+            channel_layer.group_send(f"user_{user_id}", event)
+            for user_id, event in events
+        )
+    )
+
+
+class NotificationDispatcher:
+    def appointment_recipients(self, appointment):
+        """Ids of the therapist(s), driver and operator of an appointment"""
+        user_ids = [
+            appointment.therapist_id,
+            appointment.driver_id,
+            appointment.operator_id,
+        ]
+        if appointment.pk:
+            prefetched = getattr(appointment, "_prefetched_objects_cache", {})
+            if "therapists" in prefetched:
+                user_ids.extend(t.id for t in prefetched["therapists"])
+            else:
+                user_ids.extend(appointment.therapists.values_list("id", flat=True))
+        return user_ids
+
+    def notify(
+        self, user_ids, notification_type, message, appointment=None, rejection=None
+    ):
+        """
+        Create one notification per distinct recipient and push them all
+        after commit; returns the created rows
+        """
+        from .conditional_requests import notifications_scope, touch_scopes
+        from .count_service import count_service
+        from .models import Notification
+        from .unread_counter import unread_counter
+
+        user_ids = list(dict.fromkeys(uid for uid in user_ids if uid))
+        if not user_ids:
+            return []
+
+        # The rows and their unread-count increments commit together
+        with transaction.atomic():
+            notifications = Notification.objects.bulk_create(
+                [
+                    Notification(
+                        user_id=user_id,
+                        appointment=appointment,
+                        rejection=rejection,
+                        notification_type=notification_type,
+                        message=message,
+                    )
+                    for user_id in user_ids
+                ]
+            )
+            unread_counter.adjust({user_id: 1 for user_id in user_ids})
+
+        # bulk_create skips post_save, so refresh what its receivers maintain
+        touch_scopes(*[notifications_scope(user_id) for user_id in user_ids])
+        count_service.invalidate_table(Notification._meta.db_table)
+        self.push_on_commit(notifications)
+        logger.info(f"Created {len(notifications)} {notification_type} notifications")
+        return notifications
+
+    def notify_appointment(
+        self, appointment, notification_type, message, rejection=None
+    ):
+        return self.notify(
+            self.appointment_recipients(appointment),
+            notification_type,
+            message,
+            appointment=appointment,
+            rejection=rejection,
+        )
+
+    # ------------------------------------------------------------------
+    # Real-time delivery
+    # ------------------------------------------------------------------
+
+    def push_on_commit(self, notifications):
+        transaction.on_commit(partial(self.push, list(notifications)))
+
+    def push(self, notifications):
+        """Send stored notifications to their recipients in one batch"""
+        self.send_batch(
+            [
+                (
+                    notification.user_id,
+                    _payload(
+                        notification.notification_type,
+                        NOTIFICATION_TITLES.get(
+                            notification.notification_type, "Notification"
+                        ),
+                        notification.message,
+                        {
+                            "notification_id": notification.id,
+                            "related_object_id": notification.appointment_id
+                            or notification.rejection_id,
+                            "is_read": notification.is_read,
+                        },
+                    ),
+                )
+                for notification in notifications
+            ]
+        )
+
+    def announce(self, user_ids, notification_type, title, message, data=None):
+        """Push a message that is not stored to several users after commit"""
+        payload = _payload(notification_type, title, message, data or {})
+        messages = [
+            (user_id, payload) for user_id in dict.fromkeys(user_ids) if user_id
+        ]
+        if messages:
+            transaction.on_commit(partial(self.send_batch, messages))
+
+    def broadcast_on_commit(self, group, event):
+        """Send one event to a shared group (e.g. "appointments") after commit"""
+        transaction.on_commit(partial(self.broadcast, group, event))
+
+    def broadcast(self, group, event):
+        try:
+            async_to_sync(get_channel_layer().group_send)(group, event)
+        except Exception as e:
+            logger.error(f"Error broadcasting to {group}: {e}")
+
+    def send_batch(self, messages):
+        """messages: (user_id, payload) pairs, sent in one event-loop pass"""
+        self.send_events(
+            [
+                (user_id, {"type": "send_notification", "data": payload})
+                for user_id, payload in messages
+            ]
+        )
+
+    def send_events(self, events):
+        """events: (user_id, channel-layer event) pairs for user groups"""
+        if not events:
+            return
+        try:
+            async_to_sync(_send_all)(get_channel_layer(), events)
+            logger.info(f"Pushed {len(events)} user events")
+        except Exception as e:
+            logger.error(f"Error pushing notifications: {e}")
+
+
+# Global instance
+notification_dispatcher = NotificationDispatcher()
@@ -0,0 +1,103 @@
+"""
+Notification retention
+Read notifications older than the retention window are copied into the
+compact ArchivedNotification table and deleted from the hot table in bounded
+batches, one transaction each, so list queries stay small and no batch holds
+its locks for long. The archive is served by the notification history endpoint.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FIELDS = (
+    "id",
+    "user_id",
+    "notification_type",
+    "message",
+    "appointment_id",
+    "rejection_id",
+    "created_at",
+)
+
+
+def notification_retention_days():
+    return getattr(settings, "NOTIFICATION_RETENTION_DAYS", 30)
+
+
+def archive_batch_size():
+    return getattr(settings, "NOTIFICATION_ARCHIVE_BATCH_SIZE", 1000)
+
+
+def archive_max_batches():
+    """Batches per scheduled run; whatever is left waits for the next run"""
+    return getattr(settings, "NOTIFICATION_ARCHIVE_MAX_BATCHES", 100)
+
+
+def archivable_notifications(days=None):
+    """Read notifications older than the retention window"""
+    from .models import Notification
+
+    if days is None:
+        days = notification_retention_days()
+    horizon = timezone.now() - timedelta(days=days)
+    return Notification.objects.filter(is_read=True, created_at__lt=horizon)
+
+
+def _archive_batch(queryset, batch_size):
+    """Move one batch into the archive; returns the ids of the users touched"""
+    from .models import ArchivedNotification, Notification
+
+    with transaction.atomic():
+        rows = list(
+            queryset.order_by("id")
+            .select_for_update(skip_locked=True)
+            .values(*ARCHIVE_FIELDS)[:batch_size]
+        )
+        if not rows:
+            return 0, set()
+        ArchivedNotification.objects.bulk_create(
+            [ArchivedNotification(**row) for row in rows], ignore_conflicts=True
+        )
+        # Nothing references notifications and these rows are read, so the
+        # per-row delete signals (unread counter, count cache) have nothing to do
+        doomed = Notification.objects.filter(id__in=[row["id"] for row in rows])
+        doomed._raw_delete(doomed.db)
+    return len(rows), {row["user_id"] for row in rows}
+
+
+def archive_notifications(days=None, batch_size=None, max_batches=None):
+    """
+    Archive read notifications past the retention window in batches of
+    batch_size, stopping after max_batches (None: until none are left).
+    Returns (notifications archived, batches run).
+    """
+    from .conditional_requests import notifications_scope, touch_scopes
+    from .count_service import count_service
+    from .models import ArchivedNotification, Notification
+
+    batch_size = batch_size or archive_batch_size()
+    queryset = archivable_notifications(days)
+    archived = batches = 0
+    users = set()
+    while max_batches is None or batches < max_batches:
+        moved, batch_users = _archive_batch(queryset, batch_size)
+        archived += moved
+        users |= batch_users
+        if moved:
+            batches += 1
+        if moved < batch_size:
+            break
+
+    if archived:
+        count_service.invalidate_table(
+            Notification._meta.db_table, ArchivedNotification._meta.db_table
+        )
+        touch_scopes(*[notifications_scope(user_id) for user_id in users])
+        logger.info(f"Archived {archived} read notifications in {batches} batches")
+    return archived, batches
@@ -0,0 +1,158 @@
+"""
+Minute-resolution occupancy bitmaps for appointment conflict detection
+Each staff member's booked time on a day is a 1440-bit integer, so an
+overlap check is a single bitwise AND
+"""
+
+import logging
+from datetime import timedelta
+
+from .cache_metrics import metered_cache
+from .interval_index import ACTIVE_APPOINTMENT_STATUSES, interval_index
+from .time_ranges import day_bounds, overlapping
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 1440
+
+
+def _minute_of_day(value):
+    return value.hour * 60 + value.minute
+
+
+def _bit_range(first, last):
+    """Bits first..last inclusive"""
+    return ((1 << (last - first + 1)) - 1) << first
+
+
+def minute_masks(start_time, end_time):
+    """
+    Return (same_day_mask, next_day_mask) for a slot.
+    Both end points are included, matching the closed-interval overlap rule
+    used elsewhere, and a slot ending before it starts spills past midnight.
+    """
+    start_minute = _minute_of_day(start_time)
+    end_minute = _minute_of_day(end_time)
+    if end_minute >= start_minute:
+        return _bit_range(start_minute, end_minute), 0
+    return (
+        _bit_range(start_minute, MINUTES_PER_DAY - 1),
+        _bit_range(0, end_minute),
+    )
+
+
+class DayOccupancy:
+    """
+    Booked minutes for every staff member on one date.
+
+    Entries keep one mask per appointment so an update can ignore its own
+    booking; cross-day bookings from the previous date are folded in.
+    """
+
+    def __init__(self, day, entries):
+        self.day = day
+        self.entries = entries
+
+    @classmethod
+    def from_db(cls, day):
+        """Rebuild the bitmaps for a date from active appointments"""
+        from .models import Appointment
+
+        rows = list(
+            overlapping(
+                Appointment.objects.filter(status__in=ACTIVE_APPOINTMENT_STATUSES),
+                *day_bounds(day),
+            ).values("id", "date", "start_time", "end_time", "therapist_id", "driver_id")
+        )
+
+        masks = {}
+        for row in rows:
+            same_day, next_day = minute_masks(row["start_time"], row["end_time"])
+            mask = same_day if row["date"] == day else next_day
+            if mask:
+                masks[row["id"]] = (mask, row["start_time"], row["end_time"])
+
+        staff_rows = [
+            (row["id"], user_id)
+            for row in rows
+            if row["id"] in masks
+            for user_id in (row["therapist_id"], row["driver_id"])
+            if user_id
+        ]
+        staff_rows.extend(
+            Appointment.therapists.through.objects.filter(
+                appointment_id__in=list(masks)
+            ).values_list("appointment_id", "customuser_id")
+        )
+
+        entries = {}
+        for appointment_id, user_id in staff_rows:
+            mask, start_time, end_time = masks[appointment_id]
+            user_entries = entries.setdefault(user_id, {})
+            user_entries[appointment_id] = (mask, start_time, end_time)
+        return cls(day, entries)
+
+    def occupied(self, user_id, exclude_id=None):
+        """OR of every booking mask for a user"""
+        result = 0
+        for appointment_id, (mask, _, _) in self.entries.get(user_id, {}).items():
+            if appointment_id != exclude_id:
+                result |= mask
+        return result
+
+    def conflict(self, user_id, mask, exclude_id=None):
+        """Return (start_time, end_time) of a booking overlapping the mask, or None"""
+        if not mask or not self.occupied(user_id, exclude_id) & mask:
+            return None
+        for appointment_id, (booked, start_time, end_time) in self.entries.get(
+            user_id, {}
+        ).items():
+            if appointment_id != exclude_id and booked & mask:
+                return start_time, end_time
+        return None
+
+
+class OccupancyManager:
+    """
+    Cached DayOccupancy lookups.
+
+    Cache keys embed the interval index version for the date, so the same
+    signal-driven bumps that refresh the interval index retire stale bitmaps.
+    """
+
+    CACHE_KEY = "occupancy_{}_v{}"
+    CACHE_TIMEOUT = 300
+
+    def get_day(self, day):
+        key = self.CACHE_KEY.format(day.isoformat(), interval_index.version(day))
+        entries = metered_cache.get(key)
+        if entries is not None:
+            return DayOccupancy(day, entries)
+
+        occupancy = DayOccupancy.from_db(day)
+        try:
+            metered_cache.set(key, occupancy.entries, self.CACHE_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Failed to cache occupancy for {day}: {e}")
+        return occupancy
+
+    def find_conflicts(self, day, start_time, end_time, staff, exclude_id=None):
+        """
+        Check every (field, user_id) pair in staff against the slot.
+        Returns the first (field, start_time, end_time) conflict, or None.
+        """
+        same_day_mask, next_day_mask = minute_masks(start_time, end_time)
+        days = [(self.get_day(day), same_day_mask)]
+        if next_day_mask:
+            days.append((self.get_day(day + timedelta(days=1)), next_day_mask))
+
+        for field, user_id in staff:
+            for occupancy, mask in days:
+                conflict = occupancy.conflict(user_id, mask, exclude_id)
+                if conflict:
+                    return (field,) + conflict
+        return None
+
+
+# Global instance
+occupancy = OccupancyManager()
@@ -4,7 +4,7 @@ Handles caching, database optimization, and real-time data synchronization
 """
 
 from django.core.cache import cache
-from django.db.models import Q, Prefetch, select_related
+from django.db.models import Q, Prefetch
 from django.utils import timezone
 from datetime import datetime, timedelta
 import logging
@@ -13,6 +13,21 @@ from typing import List, Dict, Optional, Any
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
+from .recurring_availability import expand_availability, recurring_user_ids
+from .cache_refresh import cache_refresher
+from .cache_tags import (
+    APPOINTMENTS_TAG,
+    RECURRING_AVAILABILITY_TAG,
+    appointment_tags,
+    date_tag,
+    role_tag,
+    tagged_cache,
+    user_tag,
+)
+from .time_ranges import absolute_range, overlapping
+from .two_tier_cache import two_tier_cache
+from .workload import workload_counters
+
 logger = logging.getLogger(__name__)
 
 
@@ -30,26 +45,38 @@ class OptimizedDataManager:
         """Generate consistent cache keys"""
         return f"{prefix}_{'_'.join(str(arg) for arg in args)}"
 
-    def invalidate_cache_pattern(self, pattern: str):
-        """Invalidate caches matching a pattern - with Redis fallback"""
-        try:
-            # Try Redis pattern deletion first
-            cache.delete_pattern(pattern)
-        except AttributeError:
-            # Fallback for non-Redis cache backends (e.g., LocMemCache)
-            logger.warning(
-                f"Cache backend doesn't support pattern deletion for {pattern}"
-            )
-            # For local memory cache, we'll clear the entire cache as fallback
-            # This isn't ideal but ensures the app doesn't crash
-            try:
-                cache.clear()
-                logger.info("Cleared entire cache as fallback for pattern deletion")
-            except Exception as clear_error:
-                logger.error(f"Failed to clear cache as fallback: {clear_error}")
-        except Exception as e:
-            logger.error(f"Error invalidating cache pattern {pattern}: {e}")
-            # Don't re-raise the exception to prevent crashing the view
+    def appointments_cache_key(self, user=None, date=None, status=None):
+        cache_key_parts = ["appointments"]
+        if user:
+            cache_key_parts.append(f"user_{user.id}")
+        if date:
+            cache_key_parts.append(date.isoformat())
+        if status:
+            cache_key_parts.append(status)
+        return self.get_cache_key(*cache_key_parts)
+
+    def today_appointments_cache_key(self, user=None):
+        return self.get_cache_key("today_appointments", user.id if user else "all")
+
+    def appointments_timeout(self, date=None):
+        """Today's lists change most often and get the short timeout"""
+        return (
+            self.short_cache_timeout
+            if date == timezone.now().date()
+            else self.cache_timeout
+        )
+
+    @staticmethod
+    def _appointment_list_tags(user=None, date=None):
+        """
+        Narrowest tag covering an appointment list: its date, else the staff
+        member it is filtered to, else every appointment
+        """
+        if date:
+            return [date_tag(date)]
+        if user and user.role in ("therapist", "driver"):
+            return [user_tag(user.id)]
+        return [APPOINTMENTS_TAG]
 
     # ==========================================
     # APPOINTMENT OPTIMIZATION METHODS
@@ -61,24 +88,21 @@ class OptimizedDataManager:
         """
         Get appointments with optimized queries and caching
         """
-        # Build cache key
-        cache_key_parts = ["appointments"]
-        if user:
-            cache_key_parts.append(f"user_{user.id}")
-        if date:
-            cache_key_parts.append(date.isoformat())
-        if status:
-            cache_key_parts.append(status)
-
-        cache_key = self.get_cache_key(*cache_key_parts)
-
-        # Try cache first
-        if use_cache:
-            cached_data = cache.get(cache_key)
-            if cached_data:
-                return cached_data
+        if not use_cache:
+            return self._load_appointments(user, date, status)
+
+        cache_key = self.appointments_cache_key(user, date, status)
+        timeout = self.appointments_timeout(date)
+        # Single-flight rebuild; stale results are served while it runs
+        return cache_refresher.get_or_compute(
+            cache_key,
+            lambda: self._load_appointments(user, date, status),
+            timeout,
+            tags=self._appointment_list_tags(user, date),
+        )
 
-        # Build optimized query
+    def _load_appointments(self, user=None, date=None, status=None):
+        """Query and serialize appointments without caching"""
         from .models import Appointment
 
         queryset = Appointment.objects.select_related(
@@ -102,39 +126,24 @@ class OptimizedDataManager:
 
         # Execute query and serialize
         appointments = list(queryset.order_by("date", "start_time"))
-        serialized_appointments = self._serialize_appointments(appointments)
-
-        # Cache the results
-        if use_cache:
-            timeout = (
-                self.short_cache_timeout
-                if date == timezone.now().date()
-                else self.cache_timeout
-            )
-            cache.set(cache_key, serialized_appointments, timeout)
-
-        return serialized_appointments
+        return self._serialize_appointments(appointments)
 
     def get_today_appointments_ultra_fast(self, user=None):
         """
         Ultra-fast today's appointments with aggressive caching
         """
         today = timezone.now().date()
-        cache_key = self.get_cache_key("today_appointments", user.id if user else "all")
-
-        # Try cache first
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            return cached_data
-
-        appointments = self.get_appointments_optimized(
-            user=user, date=today, use_cache=False
+        cache_key = self.today_appointments_cache_key(user)
+
+        # Cache with shorter timeout for today's data; only one worker
+        # rebuilds it when it expires
+        return cache_refresher.get_or_compute(
+            cache_key,
+            lambda: self._load_appointments(user=user, date=today),
+            self.short_cache_timeout,
+            tags=[date_tag(today)],
         )
 
-        # Cache with shorter timeout for today's data
-        cache.set(cache_key, appointments, self.short_cache_timeout)
-        return appointments
-
     def get_appointment_conflicts_optimized(self, appointment_data):
         """
         Optimized conflict detection with indexed queries
@@ -157,16 +166,25 @@ class OptimizedDataManager:
             driver_id or 0,
         )
 
-        cached_conflicts = cache.get(cache_key)
+        # Cross-day bookings on the neighbouring dates can conflict too
+        cache_tags = [
+            date_tag(date + timedelta(days=offset)) for offset in (-1, 0, 1)
+        ]
+        cached_conflicts = tagged_cache.get(cache_key, cache_tags)
         if cached_conflicts is not None:
             return cached_conflicts
 
         conflicts = []
 
-        # Base conflict query - uses composite indexes
-        base_query = Appointment.objects.filter(
-            date=date, status__in=["pending", "confirmed", "in_progress"]
-        ).filter(Q(start_time__lt=end_time) & Q(end_time__gt=start_time))
+        # Base conflict query - a single range lookup on the absolute
+        # start/end columns, which also catches cross-day bookings
+        base_query = overlapping(
+            Appointment.objects.filter(
+                status__in=["pending", "confirmed", "in_progress"]
+            ),
+            *absolute_range(date, start_time, end_time),
+            inclusive=False,
+        )
 
         if exclude_id:
             base_query = base_query.exclude(id=exclude_id)
@@ -186,7 +204,7 @@ class OptimizedDataManager:
             )
 
         # Cache for 2 minutes (conflicts change frequently)
-        cache.set(cache_key, conflicts, 120)
+        tagged_cache.set(cache_key, conflicts, cache_tags, 120)
         return conflicts
 
     # ==========================================
@@ -197,17 +215,26 @@ class OptimizedDataManager:
         """
         Optimized availability lookup with caching and SQL debug logging
         """
-        import time
-        from django.db import connection
-
         cache_key = self.get_cache_key(
             "availability", date.isoformat(), role or "all", specialization or "none"
         )
 
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            return cached_data
+        cache_tags = [date_tag(date), RECURRING_AVAILABILITY_TAG]
+        if role:
+            cache_tags.append(role_tag(role))
+
+        # Cache for 5 minutes, rebuilt by a single worker
+        return cache_refresher.get_or_compute(
+            cache_key,
+            lambda: self._load_availability(date, role, specialization),
+            self.cache_timeout,
+            tags=cache_tags,
+        )
 
+    def _load_availability(self, date, role=None, specialization=None):
+        """Query and serialize availability without caching"""
+        import time
+        from django.db import connection
         from .models import Availability
         from core.models import CustomUser
 
@@ -239,6 +266,22 @@ class OptimizedDataManager:
 
         start_time = time.time()
         availabilities = list(queryset.order_by("user__last_available_at"))
+
+        # Recurring templates are expanded for this date only
+        recurring = [
+            availability
+            for availability in expand_availability(date, date, role=role)
+            if not specialization
+            or availability.user.specialization == specialization
+        ]
+        if recurring:
+            availabilities = sorted(
+                availabilities + recurring,
+                key=lambda availability: (
+                    availability.user.last_available_at is None,
+                    availability.user.last_available_at or timezone.now(),
+                ),
+            )
         duration = time.time() - start_time
 
         # Debug: log SQL and timing if DEBUG is True
@@ -255,11 +298,7 @@ class OptimizedDataManager:
                 f"[Availability] Query duration: {duration:.3f}s, count: {len(availabilities)}"
             )
 
-        serialized_data = self._serialize_availability(availabilities)
-
-        # Cache for 5 minutes
-        cache.set(cache_key, serialized_data, self.cache_timeout)
-        return serialized_data
+        return self._serialize_availability(availabilities)
         # For further profiling, consider using Django Debug Toolbar or EXPLAIN in DB shell.
 
     def get_next_available_slot(self, user_id, date, duration_minutes=60):
@@ -270,7 +309,8 @@ class OptimizedDataManager:
             "next_slot", user_id, date.isoformat(), duration_minutes
         )
 
-        cached_slot = cache.get(cache_key)
+        cache_tags = [date_tag(date)]
+        cached_slot = tagged_cache.get(cache_key, cache_tags)
         if cached_slot:
             return cached_slot
 
@@ -303,7 +343,7 @@ class OptimizedDataManager:
                     "end_time": current_time + duration,
                     "available": True,
                 }
-                cache.set(cache_key, next_slot, self.cache_timeout)
+                tagged_cache.set(cache_key, next_slot, cache_tags, self.cache_timeout)
                 return next_slot
 
             # Move current time to after this appointment
@@ -317,11 +357,11 @@ class OptimizedDataManager:
                 "end_time": current_time + duration,
                 "available": True,
             }
-            cache.set(cache_key, next_slot, self.cache_timeout)
+            tagged_cache.set(cache_key, next_slot, cache_tags, self.cache_timeout)
             return next_slot
 
         # No available slot found
-        cache.set(cache_key, None, self.cache_timeout)
+        tagged_cache.set(cache_key, None, cache_tags, self.cache_timeout)
         return None
 
     # ==========================================
@@ -336,7 +376,8 @@ class OptimizedDataManager:
             "available_staff", role, date.isoformat(), specialization or "all"
         )
 
-        cached_staff = cache.get(cache_key)
+        cache_tags = [date_tag(date), role_tag(role), RECURRING_AVAILABILITY_TAG]
+        cached_staff = tagged_cache.get(cache_key, cache_tags)
         if cached_staff:
             return cached_staff
 
@@ -350,22 +391,36 @@ class OptimizedDataManager:
             users_query = users_query.filter(specialization=specialization)
 
         # Get users who have availability on the date
+        # Exclude users who are currently busy; NULLs would turn the
+        # NOT IN below into a filter that excludes everyone
+        staff_field = "therapist_id" if role == "therapist" else "driver_id"
+        busy_user_ids = Appointment.objects.filter(
+            date=date,
+            status__in=[
+                "in_progress",
+                "journey",
+                "arrived",
+                "driver_assigned_pickup",
+                "return_journey",
+            ],
+            **{f"{staff_field}__isnull": False},
+        ).values(staff_field)
+
         available_users = (
-            users_query.filter(availability__date=date, availability__is_available=True)
-            .exclude(
-                # Exclude users who are currently busy
-                appointments__date=date,
-                appointments__status__in=[
-                    "in_progress",
-                    "journey",
-                    "arrived",
-                    "driver_assigned_pickup",
-                    "return_journey",
-                ],
+            users_query.filter(
+                Q(availabilities__date=date, availabilities__is_available=True)
+                | Q(id__in=recurring_user_ids(date, role=role))
             )
+            .exclude(id__in=busy_user_ids)
+            .distinct()
             .order_by("last_available_at")
         )  # FIFO ordering
 
+        available_users = list(available_users)
+        workload_scores = workload_counters.scores(
+            [user.id for user in available_users], date
+        )
+
         staff_list = []
         for user in available_users:
             staff_data = {
@@ -379,29 +434,18 @@ class OptimizedDataManager:
                     if user.last_available_at
                     else None
                 ),
-                "workload_score": self._calculate_workload_score(user, date),
+                "workload_score": workload_scores[user.id],
             }
             staff_list.append(staff_data)
 
         # Cache for 3 minutes (staff availability changes frequently)
-        cache.set(cache_key, staff_list, 180)
+        tagged_cache.set(cache_key, staff_list, cache_tags, 180)
         return staff_list
 
     def _calculate_workload_score(self, user, date):
         """Calculate workload score for fair distribution"""
-        from .models import Appointment
-
-        # Count appointments for this user in the past week
-        week_ago = date - timedelta(days=7)
-
-        appointment_count = Appointment.objects.filter(
-            Q(therapist=user) | Q(driver=user),
-            date__gte=week_ago,
-            date__lte=date,
-            status__in=["completed", "in_progress"],
-        ).count()
-
-        return appointment_count
+        # Appointments in the past week, read from the rolling daily counters
+        return workload_counters.scores([user.id], date)[user.id]
 
     # ==========================================
     # REAL-TIME SYNCHRONIZATION METHODS
@@ -445,30 +489,24 @@ class OptimizedDataManager:
             therapist_id = appointment_data.get("therapist_id")
             driver_id = appointment_data.get("driver_id")
 
-            # Invalidate patterns
-            patterns_to_invalidate = [
-                "appointments_*",
-                "today_appointments_*",
-                "conflicts_*",
-                "available_staff_*",
-            ]
-
-            if date:
-                patterns_to_invalidate.append(f"*_{date}*")
-
-            for pattern in patterns_to_invalidate:
-                self.invalidate_cache_pattern(pattern)
+            # Bump the generation of every tag the appointment belongs to;
+            # entries cached under the old generations are no longer read
+            tagged_cache.invalidate(
+                *appointment_tags(
+                    dates=[date], user_ids=[therapist_id, driver_id]
+                )
+            )
 
             # Invalidate specific user caches with error handling
             if therapist_id:
                 try:
-                    cache.delete(f"user_appointments_{therapist_id}")
+                    two_tier_cache.delete(f"user_appointments_{therapist_id}")
                 except Exception as e:
                     logger.error(f"Failed to delete therapist cache: {e}")
 
             if driver_id:
                 try:
-                    cache.delete(f"user_appointments_{driver_id}")
+                    two_tier_cache.delete(f"user_appointments_{driver_id}")
                 except Exception as e:
                     logger.error(f"Failed to delete driver cache: {e}")
 
@@ -539,6 +577,9 @@ class OptimizedDataManager:
                 "end_time": availability.end_time.isoformat(),
                 "is_available": availability.is_available,
                 "specialization": getattr(availability.user, "specialization", ""),
+                "recurring_template_id": getattr(
+                    availability, "recurring_template_id", None
+                ),
             }
             serialized.append(data)
 
@@ -549,8 +590,10 @@ class OptimizedDataManager:
     # ==========================================
 
     def get_performance_metrics(self):
-        """Get cached performance metrics"""
-        return cache.get("performance_metrics", {})
+        """Get cached performance metrics with this process's cache tier counters"""
+        metrics = dict(cache.get("performance_metrics", {}))
+        metrics["cache_tiers"] = two_tier_cache.stats()
+        return metrics
 
     def log_query_performance(self, operation, duration, query_count=1):
         """Log query performance for monitoring"""
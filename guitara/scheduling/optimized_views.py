@@ -12,7 +12,11 @@ from django.db.models import Q, Prefetch
 from datetime import datetime, timedelta
 import time
 import logging
+from .models import Appointment
 from .optimized_data_manager import data_manager
+from .serializers import AppointmentSerializer
+from .two_tier_cache import two_tier_cache
+from .views import AppointmentViewSet
 from .tasks import process_driver_assignment, send_appointment_notifications
 
 logger = logging.getLogger(__name__)
@@ -32,11 +36,11 @@ class OptimizedAPIViewMixin:
 
     def get_cached_response(self, cache_key, timeout=300):
         """Get cached response if available"""
-        return cache.get(cache_key)
+        return two_tier_cache.get(cache_key)
 
     def set_cached_response(self, cache_key, data, timeout=300):
         """Cache response data"""
-        cache.set(cache_key, data, timeout)
+        two_tier_cache.set(cache_key, data, timeout)
 
     def get_optimized_queryset(self):
         """Get queryset with optimized select_related and prefetch_related"""
@@ -75,10 +79,18 @@ class OptimizedAppointmentViewSet(OptimizedAPIViewMixin, viewsets.ModelViewSet):
     """
 
     permission_classes = [IsAuthenticated]
+    serializer_class = AppointmentSerializer
 
     def get_queryset(self):
         return self.get_optimized_queryset()
 
+    def get_optimized_queryset(self):
+        """
+        The appointments AppointmentViewSet shows this user (operators all,
+        staff their own), with every relation AppointmentSerializer reads
+        """
+        return AppointmentViewSet.get_queryset(self)
+
     @action(detail=False, methods=["get"])
     def today(self, request):
         """Get today's appointments with aggressive caching"""
@@ -244,8 +256,6 @@ class OptimizedAppointmentViewSet(OptimizedAPIViewMixin, viewsets.ModelViewSet):
                 )
 
             # Validate status
-            from .models import Appointment
-
             valid_statuses = [choice[0] for choice in Appointment.STATUS_CHOICES]
             if new_status not in valid_statuses:
                 return Response(
@@ -2,10 +2,225 @@
 Custom pagination classes for the scheduling app
 """
 
+import base64
+import json
+
+from django.core.paginator import EmptyPage, Paginator
+from django.db.models import Q
+from django.template import loader
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 from collections import OrderedDict
 
+from .count_service import count_service
+
+
+class CountedPaginator(Paginator):
+    """
+    Paginator whose total comes from count_service: cached per filter
+    signature, or estimated from table statistics in "estimate" mode
+    """
+
+    count_mode = "cached"
+    count_is_exact = True
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, "query"):
+            return super().count
+        count, self.count_is_exact = count_service.count(
+            self.object_list, self.count_mode
+        )
+        return count
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # An estimate can fall short of the real total; serve pages past it
+            if self.count_is_exact or int(number) < 1:
+                raise
+            return int(number)
+
+
+class EstimatedCountPaginator(CountedPaginator):
+    count_mode = "estimate"
+
+
+class KeysetPaginationMixin:
+    """
+    Opt-in keyset pagination for page-number paginators.
+    A request carrying `cursor` (empty for the first page) seeks past the
+    last row seen on cursor_ordering instead of running COUNT(*) and an
+    OFFSET scan, so deep pages cost the same as the first one. Requests
+    without it keep the page-number behaviour.
+    """
+
+    cursor_query_param = "cursor"
+    cursor_ordering = ("-id",)  # Must end with a unique field
+    # ?total=approx counts up to approximate_total_cap rows, ?total=estimate
+    # reads table statistics, ?total=exact is the cached exact count
+    total_query_param = "total"
+    approximate_total_cap = 1000
+    cursor_template = "rest_framework/pagination/previous_and_next.html"
+
+    keyset = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.model = queryset.model
+        self.page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(
+            request.query_params[self.cursor_query_param]
+        )
+        self.total = self.count_total(queryset, request)
+
+        ordering = [
+            self._flip(field) if reverse else field for field in self.cursor_ordering
+        ]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._seek(ordering, position))
+
+        rows = list(queryset[: self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if reverse:
+            rows.reverse()
+
+        came_from = position is not None
+        self.has_next = came_from if reverse else has_more
+        self.has_previous = has_more if reverse else came_from
+        first = self._key(rows[0]) if rows else position
+        last = self._key(rows[-1]) if rows else position
+        self.next_cursor = self.encode_cursor(last, False) if self.has_next else None
+        self.previous_cursor = (
+            self.encode_cursor(first, True) if self.has_previous else None
+        )
+        self.display_page_controls = self.has_next or self.has_previous
+        return rows
+
+    # ------------------------------------------------------------------
+    # Cursors
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    def _key(self, row):
+        return [getattr(row, field.lstrip("-")) for field in self.cursor_ordering]
+
+    @staticmethod
+    def _seek(ordering, position):
+        """Rows strictly after position in ordering, as OR-ed prefix matches"""
+        condition = Q(pk__in=[])
+        for index, field in enumerate(ordering):
+            lookup = "lt" if field.startswith("-") else "gt"
+            equal = {
+                ordering[prior].lstrip("-"): position[prior] for prior in range(index)
+            }
+            condition |= Q(
+                **equal, **{f"{field.lstrip('-')}__{lookup}": position[index]}
+            )
+        return condition
+
+    def encode_cursor(self, key, reverse):
+        values = [
+            value if isinstance(value, (int, str)) else value.isoformat()
+            for value in key
+        ]
+        payload = json.dumps({"k": values, "r": int(reverse)}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        """(position, reverse); position is None for the first page"""
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(
+                base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            )
+            values = payload["k"]
+            if len(values) != len(self.cursor_ordering):
+                raise ValueError("wrong key length")
+            position = [
+                self.model._meta.get_field(field.lstrip("-")).to_python(value)
+                for field, value in zip(self.cursor_ordering, values)
+            ]
+            return position, bool(payload.get("r"))
+        except Exception:
+            raise NotFound("Invalid cursor")
+
+    # ------------------------------------------------------------------
+    # Totals and links
+    # ------------------------------------------------------------------
+
+    def count_total(self, queryset, request):
+        """(count, exact) when the client asked for a total, else None"""
+        mode = request.query_params.get(self.total_query_param)
+        if mode == "exact":
+            return count_service.count(queryset, "cached")
+        if mode == "estimate":
+            return count_service.count(queryset, "estimate")
+        if mode == "approx":
+            cap = self.approximate_total_cap
+            count = queryset.order_by()[: cap + 1].count()
+            return min(count, cap), count <= cap
+        return None
+
+    def _cursor_link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param
+        )
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        if self.keyset:
+            return self._cursor_link(self.next_cursor)
+        return super().get_next_link()
+
+    def get_previous_link(self):
+        if self.keyset:
+            return self._cursor_link(self.previous_cursor)
+        return super().get_previous_link()
+
+    def get_keyset_response(self, data):
+        fields = [
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("has_next", self.has_next),
+            ("has_previous", self.has_previous),
+            ("page_size", self.page_size),
+        ]
+        if self.total is not None:
+            fields += [("count", self.total[0]), ("count_is_exact", self.total[1])]
+        return Response(OrderedDict(fields + [("results", data)]))
+
+    def get_html_context(self):
+        if self.keyset:
+            return {
+                "previous_url": self.get_previous_link(),
+                "next_url": self.get_next_link(),
+            }
+        return super().get_html_context()
+
+    def to_html(self):
+        if self.keyset:
+            return loader.get_template(self.cursor_template).render(
+                self.get_html_context()
+            )
+        return super().to_html()
+
 
 class StandardResultsPagination(PageNumberPagination):
     """
@@ -14,6 +229,7 @@ class StandardResultsPagination(PageNumberPagination):
 
     page_size = 12  # Set to 12 items per page for production use
     page_size_query_param = "page_size"
+    django_paginator_class = CountedPaginator
     max_page_size = 200  # Increased max page size
 
     def get_paginated_response(self, data):
@@ -32,7 +248,7 @@ class StandardResultsPagination(PageNumberPagination):
         )
 
 
-class AppointmentsPagination(PageNumberPagination):
+class AppointmentsPagination(KeysetPaginationMixin, PageNumberPagination):
     """
     Pagination class specifically for appointments
     Allows larger page sizes for dashboard views
@@ -40,9 +256,13 @@ class AppointmentsPagination(PageNumberPagination):
 
     page_size = 12  # Set to 12 items per page for production use
     page_size_query_param = "page_size"
+    django_paginator_class = CountedPaginator
     max_page_size = 200  # Increased max page size
+    cursor_ordering = ("date", "start_time", "id")
 
     def get_paginated_response(self, data):
+        if self.keyset:
+            return self.get_keyset_response(data)
         return Response(
             OrderedDict(
                 [
@@ -60,7 +280,7 @@ class AppointmentsPagination(PageNumberPagination):
         )
 
 
-class NotificationsPagination(PageNumberPagination):
+class NotificationsPagination(KeysetPaginationMixin, PageNumberPagination):
     """
     Pagination class for notifications
     Smaller page size for better UX
@@ -68,9 +288,13 @@ class NotificationsPagination(PageNumberPagination):
 
     page_size = 12  # Set to 12 items per page for production use
     page_size_query_param = "page_size"
+    django_paginator_class = CountedPaginator
     max_page_size = 200  # Increased max page size
+    cursor_ordering = ("-created_at", "-id")
 
     def get_paginated_response(self, data):
+        if self.keyset:
+            return self.get_keyset_response(data)
         return Response(
             OrderedDict(
                 [
@@ -86,16 +310,20 @@ class NotificationsPagination(PageNumberPagination):
         )
 
 
-class LogsResultsPagination(PageNumberPagination):
+class LogsResultsPagination(KeysetPaginationMixin, PageNumberPagination):
     """
     Pagination class optimized for logs display
     """
 
     page_size = 10  # Lower page size for logs to improve loading speed
     page_size_query_param = "page_size"
+    django_paginator_class = EstimatedCountPaginator
     max_page_size = 100  
+    cursor_ordering = ("-timestamp", "-id")
 
     def get_paginated_response(self, data):
+        if self.keyset:
+            return self.get_keyset_response(data)
         return Response(
             OrderedDict(
                 [
@@ -11,6 +11,8 @@ from django.utils.deprecation import MiddlewareMixin
 from django.http import JsonResponse
 import json
 
+from .cache_metrics import cache_metrics
+
 logger = logging.getLogger(__name__)
 
 
@@ -148,36 +150,17 @@ class DatabaseQueryLoggingMiddleware(MiddlewareMixin):
 
 class CacheHitRateMiddleware(MiddlewareMixin):
     """
-    Monitor cache hit rates for optimization
+    Publish this process's cache hit/miss counters
+    Counting happens in scheduling.cache_metrics around the actual cache
+    calls; this only makes sure quiet processes still flush periodically
     """
 
     def process_response(self, request, response):
-        """Track cache usage"""
+        """Flush cache metrics when due"""
         try:
-            cache_stats_key = "cache_hit_stats"
-            cache_stats = cache.get(
-                cache_stats_key, {"hits": 0, "misses": 0, "total_requests": 0}
-            )
-
-            cache_stats["total_requests"] += 1
-
-            # Check if this was likely a cache hit (fast response)
-            if hasattr(request, "_performance_start_time"):
-                response_time = time.time() - request._performance_start_time
-                if response_time < 0.1:  # Fast response likely indicates cache hit
-                    cache_stats["hits"] += 1
-                else:
-                    cache_stats["misses"] += 1
-
-            # Calculate hit rate
-            if cache_stats["total_requests"] > 0:
-                hit_rate = cache_stats["hits"] / cache_stats["total_requests"]
-                cache_stats["hit_rate"] = round(hit_rate * 100, 2)
-
-            cache.set(cache_stats_key, cache_stats, 3600)
-
+            cache_metrics.maybe_flush()
         except Exception as e:
-            logger.error(f"Error tracking cache stats: {e}")
+            logger.error(f"Error publishing cache metrics: {e}")
 
         return response
 
@@ -264,7 +247,7 @@ class HealthCheckMiddleware(MiddlewareMixin):
 
                 # Get performance metrics
                 performance_metrics = cache.get("api_performance_metrics", {})
-                cache_stats = cache.get("cache_hit_stats", {})
+                cache_stats = cache_metrics.aggregate()["overall"]
                 websocket_stats = cache.get("websocket_connection_stats", {})
 
                 health_data = {
@@ -280,7 +263,7 @@ class HealthCheckMiddleware(MiddlewareMixin):
                         ),
                         "request_count": performance_metrics.get("request_count", 0),
                         "slow_requests": performance_metrics.get("slow_requests", 0),
-                        "cache_hit_rate": cache_stats.get("hit_rate", 0),
+                        "cache_hit_rate": round(cache_stats["hit_rate"] * 100, 2),
                     },
                     "websocket": websocket_stats,
                 }
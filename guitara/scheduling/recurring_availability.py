@@ -0,0 +1,220 @@
+"""
+Lazy expansion of recurring availability templates
+Templates are turned into unsaved Availability objects only for the dates a
+query asks for; concrete rows for a user and date take precedence
+"""
+
+import logging
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def _dates(start_date, end_date):
+    day = start_date
+    while day <= end_date:
+        yield day
+        day += timedelta(days=1)
+
+
+def active_templates(
+    start_date, end_date, user_ids=None, role=None, is_available=True
+):
+    """Templates whose effective range touches [start_date, end_date]"""
+    from .models import RecurringAvailability
+
+    templates = RecurringAvailability.objects.select_related("user").filter(
+        Q(effective_until__isnull=True) | Q(effective_until__gte=start_date),
+        effective_from__lte=end_date,
+    )
+    if is_available is not None:
+        templates = templates.filter(is_available=is_available)
+    if user_ids is not None:
+        templates = templates.filter(user_id__in=list(user_ids))
+    if role:
+        templates = templates.filter(user__role=role, user__is_active=True)
+    return list(templates)
+
+
+def expand_availability(
+    start_date, end_date, user_ids=None, role=None, is_available=True
+):
+    """
+    Unsaved Availability objects for every template occurrence between the
+    dates, skipping exception dates and dates with concrete rows for the user.
+    Each object carries recurring_template_id and a synced start_at/end_at.
+    """
+    from .models import Availability, RecurringAvailabilityException
+
+    templates = active_templates(start_date, end_date, user_ids, role, is_available)
+    if not templates:
+        return []
+
+    skipped = set(
+        RecurringAvailabilityException.objects.filter(
+            template_id__in=[template.id for template in templates],
+            date__gte=start_date,
+            date__lte=end_date,
+        ).values_list("template_id", "date")
+    )
+    overridden = set(
+        Availability.objects.filter(
+            user_id__in={template.user_id for template in templates},
+            date__gte=start_date,
+            date__lte=end_date,
+        ).values_list("user_id", "date")
+    )
+
+    expanded = []
+    for day in _dates(start_date, end_date):
+        for template in templates:
+            if (
+                not template.occurs_on(day)
+                or (template.id, day) in skipped
+                or (template.user_id, day) in overridden
+            ):
+                continue
+            availability = Availability(
+                user=template.user,
+                date=day,
+                start_time=template.start_time,
+                end_time=template.end_time,
+                is_available=template.is_available,
+            )
+            availability.sync_datetime_range()
+            availability.recurring_template_id = template.id
+            expanded.append(availability)
+    return expanded
+
+
+def expand_for_day(day, user_ids=None, role=None, is_available=True):
+    """
+    Expanded slots touching a date: occurrences on the date itself plus
+    cross-day occurrences from the previous date that run into it.
+    """
+    return [
+        availability
+        for availability in expand_availability(
+            day - timedelta(days=1), day, user_ids, role, is_available
+        )
+        if availability.date == day
+        or availability.end_time < availability.start_time
+    ]
+
+
+def recurring_user_ids(day, role=None):
+    """Ids of users with an available template occurrence on the date"""
+    return {
+        availability.user_id
+        for availability in expand_availability(day, day, role=role)
+    }
+
+
+def has_recurring_cover(user_id, start_at, end_at):
+    """True if an expanded template slot fully contains [start_at, end_at]"""
+    day = timezone.localtime(start_at).date()
+    return any(
+        availability.start_at <= start_at and availability.end_at >= end_at
+        for availability in expand_for_day(day, user_ids=[user_id])
+    )
+
+
+def consolidate_weekly_rows(min_weeks=4, since=None, dry_run=False):
+    """
+    Replace stored weekly repeats with templates.
+
+    Rows are grouped per user and date into a day pattern (the set of slots
+    on that date); a pattern seen on the same weekday at least min_weeks
+    times becomes one template per slot, with exceptions for the weeks in
+    between that had a different pattern. Whole days are converted so no
+    leftover concrete row overrides the new templates.
+    Returns (templates_created, rows_removed).
+    """
+    from django.db import transaction
+
+    from .cache_tags import RECURRING_AVAILABILITY_TAG, tagged_cache
+    from .conditional_requests import AVAILABILITY_SCOPE, touch_scopes
+    from .interval_index import interval_index
+    from .models import (
+        Availability,
+        RecurringAvailability,
+        RecurringAvailabilityException,
+    )
+
+    rows = Availability.objects.all()
+    if since is not None:
+        rows = rows.filter(date__gte=since)
+
+    days = {}
+    for row_id, user_id, day, start_time, end_time, is_available in rows.values_list(
+        "id", "user_id", "date", "start_time", "end_time", "is_available"
+    ):
+        slots, row_ids = days.setdefault((user_id, day), (set(), []))
+        slots.add((start_time, end_time, is_available))
+        row_ids.append(row_id)
+
+    runs = {}
+    for (user_id, day), (slots, _) in days.items():
+        runs.setdefault((user_id, day.weekday(), frozenset(slots)), []).append(day)
+
+    templates = []
+    exceptions = []
+    removed_ids = []
+    for (user_id, weekday, slots), dates in runs.items():
+        dates.sort()
+        weeks = (dates[-1] - dates[0]).days // 7 + 1
+        # Sparse patterns would need more exceptions than they save
+        if len(dates) < min_weeks or weeks - len(dates) >= len(dates):
+            continue
+
+        present = set(dates)
+        skipped = [
+            dates[0] + timedelta(weeks=week)
+            for week in range(weeks)
+            if dates[0] + timedelta(weeks=week) not in present
+        ]
+        for start_time, end_time, is_available in slots:
+            template = RecurringAvailability(
+                user_id=user_id,
+                weekday_mask=1 << weekday,
+                start_time=start_time,
+                end_time=end_time,
+                is_available=is_available,
+                effective_from=dates[0],
+                effective_until=dates[-1],
+            )
+            templates.append(template)
+            exceptions.extend((template, day) for day in skipped)
+        for day in dates:
+            removed_ids.extend(days[(user_id, day)][1])
+
+    if dry_run or not templates:
+        return len(templates), len(removed_ids)
+
+    with transaction.atomic():
+        RecurringAvailability.objects.bulk_create(templates, batch_size=500)
+        RecurringAvailabilityException.objects.bulk_create(
+            [
+                RecurringAvailabilityException(
+                    template=template, date=day, reason="Consolidated gap"
+                )
+                for template, day in exceptions
+            ],
+            batch_size=1000,
+        )
+        for start in range(0, len(removed_ids), 1000):
+            Availability.objects.filter(
+                id__in=removed_ids[start : start + 1000]
+            ).delete()
+
+    # bulk_create skips the template signals
+    interval_index.invalidate_templates()
+    tagged_cache.invalidate(RECURRING_AVAILABILITY_TAG)
+    touch_scopes(AVAILABILITY_SCOPE)
+    logger.info(
+        f"Consolidated {len(removed_ids)} availability rows into {len(templates)} templates"
+    )
+    return len(templates), len(removed_ids)
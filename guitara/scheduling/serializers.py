@@ -1,15 +1,22 @@
 from rest_framework import serializers
-from django.db.models import Q, F
+from .cache_metrics import metered_cache
+from django.db.models import Q, F, Prefetch
 from .models import (
     Client,
     Availability,
     Appointment,
     Notification,
+    ArchivedNotification,
     AppointmentRejection,
     AppointmentMaterial,  # Add this import
+    RecurringAvailability,
+    RecurringAvailabilityException,
 )
 from core.models import CustomUser
 from datetime import datetime, timedelta
+from .occupancy import occupancy
+from .time_ranges import absolute_range, overlapping
+import logging
 
 # Try to import Service, or create a mock class if import fails
 try:
@@ -87,6 +94,8 @@ class UserSerializer(serializers.ModelSerializer):
 
 class AvailabilitySerializer(serializers.ModelSerializer):
     user_details = UserSerializer(source="user", read_only=True)
+    # Set on slots expanded from a recurring template (these have no id)
+    recurring_template_id = serializers.IntegerField(read_only=True, allow_null=True)
 
     class Meta:
         model = Availability
@@ -106,30 +115,28 @@ class AvailabilitySerializer(serializers.ModelSerializer):
                 "Start time and end time cannot be the same"
             )
 
-        # Check for overlapping availability slots
-        if self.instance:  # In case of update
-            overlapping = Availability.objects.filter(
-                user=attrs.get("user", self.instance.user),
-                date=attrs.get("date", self.instance.date),
-                is_available=attrs.get("is_available", self.instance.is_available),
-            ).exclude(pk=self.instance.pk)
-        else:  # In case of create
-            overlapping = Availability.objects.filter(
-                user=attrs.get("user"),
-                date=attrs.get("date"),
-                is_available=attrs.get("is_available", True),
+        # Check for overlapping availability slots, including cross-day ones
+        # from neighbouring dates, with a single range lookup
+        instance = self.instance
+        start_at, end_at = absolute_range(
+            attrs.get("date", getattr(instance, "date", None)),
+            start_time or getattr(instance, "start_time", None),
+            end_time or getattr(instance, "end_time", None),
+        )
+        if start_at is not None:
+            overlapping_slots = overlapping(
+                Availability.objects.filter(
+                    user=attrs.get("user", getattr(instance, "user", None)),
+                    is_available=attrs.get(
+                        "is_available", getattr(instance, "is_available", True)
+                    ),
+                ),
+                start_at,
+                end_at,
             )
-
-        for slot in overlapping:
-            # For cross-day availability, we need more complex overlap detection
-            # This is a simplified check - you may want to enhance this based on your needs
-            current_start = attrs.get("start_time")
-            current_end = attrs.get("end_time")
-            existing_start = slot.start_time
-            existing_end = slot.end_time
-
-            # Simple overlap check (can be enhanced for cross-day logic if needed)
-            if current_start <= existing_end and current_end >= existing_start:
+            if instance:  # In case of update
+                overlapping_slots = overlapping_slots.exclude(pk=instance.pk)
+            if overlapping_slots.exists():
                 raise serializers.ValidationError(
                     "This time slot overlaps with another availability slot"
                 )
@@ -137,6 +144,80 @@ class AvailabilitySerializer(serializers.ModelSerializer):
         return attrs
 
 
+class RecurringAvailabilityExceptionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RecurringAvailabilityException
+        fields = ["id", "date", "reason"]
+
+
+class RecurringAvailabilitySerializer(serializers.ModelSerializer):
+    user_details = UserSerializer(source="user", read_only=True)
+    weekdays = serializers.ListField(
+        child=serializers.ChoiceField(choices=RecurringAvailability.WEEKDAYS),
+        required=False,
+    )
+    exceptions = RecurringAvailabilityExceptionSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = RecurringAvailability
+        fields = [
+            "id",
+            "user",
+            "user_details",
+            "weekday_mask",
+            "weekdays",
+            "start_time",
+            "end_time",
+            "is_available",
+            "effective_from",
+            "effective_until",
+            "exceptions",
+            "created_at",
+            "updated_at",
+        ]
+        read_only_fields = ["created_at", "updated_at"]
+        extra_kwargs = {
+            "user": {"required": False},
+            "weekday_mask": {"required": False},
+        }
+
+    def validate(self, attrs):
+        """Accept weekday names as an alternative to the bit mask"""
+        weekdays = attrs.pop("weekdays", None)
+        if weekdays is not None:
+            attrs["weekday_mask"] = RecurringAvailability.mask_for(weekdays)
+
+        instance = self.instance
+        weekday_mask = attrs.get("weekday_mask", getattr(instance, "weekday_mask", 0))
+        if not 0 < weekday_mask < 1 << 7:
+            raise serializers.ValidationError("At least one weekday must be selected")
+
+        start_time = attrs.get("start_time", getattr(instance, "start_time", None))
+        end_time = attrs.get("end_time", getattr(instance, "end_time", None))
+        if start_time == end_time:
+            raise serializers.ValidationError(
+                "Start time and end time cannot be the same"
+            )
+
+        effective_from = attrs.get(
+            "effective_from", getattr(instance, "effective_from", None)
+        )
+        effective_until = attrs.get(
+            "effective_until", getattr(instance, "effective_until", None)
+        )
+        if effective_from and effective_until and effective_until < effective_from:
+            raise serializers.ValidationError(
+                "Effective until must not be before effective from"
+            )
+
+        user = attrs.get("user", getattr(instance, "user", None))
+        if user is not None and user.role not in ["therapist", "driver"]:
+            raise serializers.ValidationError(
+                "Only therapists and drivers can have availability slots"
+            )
+        return attrs
+
+
 class AppointmentRejectionSerializer(serializers.ModelSerializer):
     rejected_by_details = UserSerializer(source="rejected_by", read_only=True)
     reviewed_by_details = UserSerializer(source="reviewed_by", read_only=True)
@@ -158,6 +239,86 @@ class AppointmentRejectionSerializer(serializers.ModelSerializer):
         ]
 
 
+# Bump when AppointmentSerializer output changes so cached fragments are ignored
+APPOINTMENT_FRAGMENT_VERSION = 1
+# Fragments embed client/staff details that can change without touching the
+# appointment, so they are only trusted for a limited time
+APPOINTMENT_FRAGMENT_TIMEOUT = 900
+
+fragment_logger = logging.getLogger(__name__)
+
+
+def appointment_fragment_key(appointment):
+    """Cache key for an appointment's serialized dict, or None if unknown"""
+    updated_at = appointment.__dict__.get("updated_at")
+    if appointment.pk is None or updated_at is None:
+        return None
+    return (
+        f"appointment_fragment:v{APPOINTMENT_FRAGMENT_VERSION}:"
+        f"{appointment.pk}:{int(updated_at.timestamp() * 1_000_000)}"
+    )
+
+
+def with_appointment_relations(queryset):
+    """
+    Load everything AppointmentSerializer reads with a fixed number of
+    queries, whatever the number of rows
+    """
+    return queryset.select_related(
+        "client", "therapist", "driver", "operator", "rejected_by"
+    ).prefetch_related(
+        "services",
+        "therapists",
+        Prefetch(
+            "rejection_details",
+            queryset=AppointmentRejection.objects.select_related(
+                "rejected_by", "reviewed_by"
+            ),
+        ),
+        Prefetch(
+            "appointment_materials",
+            queryset=AppointmentMaterial.objects.select_related(
+                "inventory_item"
+            ).order_by("id"),
+        ),
+    )
+
+
+class CachedAppointmentListSerializer(serializers.ListSerializer):
+    """
+    Assemble appointment lists from per-appointment fragments fetched with
+    one multi-get; only new or changed appointments are serialized.
+    Time-dependent fields are recomputed for every response.
+    """
+
+    def to_representation(self, data):
+        appointments = list(data.all() if hasattr(data, "all") else data)
+        keys = [appointment_fragment_key(appointment) for appointment in appointments]
+        try:
+            cached = metered_cache.get_many([key for key in keys if key])
+        except Exception as e:
+            fragment_logger.error(f"Failed to read appointment fragments: {e}")
+            cached = {}
+
+        fresh = {}
+        representation = []
+        for appointment, key in zip(appointments, keys):
+            fragment = cached.get(key) if key else None
+            if fragment is None:
+                fragment = self.child.to_representation(appointment)
+                if key:
+                    fresh[key] = fragment
+            fragment["urgency_level"] = self.child.get_urgency_level(appointment)
+            representation.append(fragment)
+
+        if fresh:
+            try:
+                metered_cache.set_many(fresh, APPOINTMENT_FRAGMENT_TIMEOUT)
+            except Exception as e:
+                fragment_logger.error(f"Failed to cache appointment fragments: {e}")
+        return representation
+
+
 class AppointmentSerializer(serializers.ModelSerializer):
     client_details = ClientSerializer(source="client", read_only=True)
     therapist_details = UserSerializer(source="therapist", read_only=True)
@@ -199,6 +360,7 @@ class AppointmentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Appointment
+        list_serializer_class = CachedAppointmentListSerializer
         fields = [
             "id",
             "client",
@@ -422,7 +584,14 @@ class AppointmentSerializer(serializers.ModelSerializer):
     def get_appointment_materials(self, obj):
         """Get appointment materials as a list for frontend"""
         try:
-            materials = obj.appointment_materials.all().select_related("inventory_item")
+            # Use prefetched materials when the queryset loaded them
+            materials = getattr(obj, "_prefetched_objects_cache", {}).get(
+                "appointment_materials"
+            )
+            if materials is None:
+                materials = obj.appointment_materials.select_related(
+                    "inventory_item"
+                ).order_by("id")
             return [
                 {
                     "id": material.id,
@@ -458,7 +627,7 @@ class AppointmentSerializer(serializers.ModelSerializer):
     def validate(self, attrs):
         """
         Validate appointment data, checking for conflicts and availability
-        Optimized to reduce N+1 queries for therapists and drivers.
+        All assigned staff are checked at once against cached minute bitmaps.
         """
         instance = getattr(self, "instance", None)
         status_update_fields = {
@@ -479,103 +648,56 @@ class AppointmentSerializer(serializers.ModelSerializer):
             return attrs
 
         # Extract common fields
-        date = attrs.get("date")
-        start_time = attrs.get("start_time")
-        end_time = attrs.get("end_time")
+        date = attrs.get("date", getattr(instance, "date", None))
+        start_time = attrs.get("start_time", getattr(instance, "start_time", None))
+        end_time = attrs.get("end_time", getattr(instance, "end_time", None))
+        if not (date and start_time and end_time):
+            return attrs
 
-        # Note: This validation runs on the serializer data, but actual therapists are set in the view
-        # The view should perform this validation on the request data
-        therapists_ids = []
-        initial_data = getattr(self, "initial_data", {})
-        if initial_data:
-            therapists_ids = initial_data.get("therapists", [])
-        if therapists_ids and date and start_time and end_time:
+        # Collect every assigned staff member so they are checked in one pass
+        # against the per-day occupancy bitmaps
+        staff = []
+        therapists = attrs.get("therapists")
+        if therapists is None:
+            # Note: actual therapists may only be set in the view from request data
+            initial_data = getattr(self, "initial_data", {}) or {}
             therapists = CustomUser.objects.filter(
-                id__in=therapists_ids, role="therapist"
-            )
-            conflicting_appointments = Appointment.objects.filter(
-                (Q(therapist__in=therapists) | Q(therapists__in=therapists)),
-                date=date,
-                status__in=["pending", "confirmed", "in_progress"],
-            ).only("id", "therapist", "start_time", "end_time")
-            if instance:
-                conflicting_appointments = conflicting_appointments.exclude(
-                    pk=instance.pk
-                )
-            for appointment in conflicting_appointments:
-                if (
-                    start_time <= appointment.end_time
-                    and end_time >= appointment.start_time
-                ):
-                    raise serializers.ValidationError(
-                        {
-                            "therapists": f"Therapist is already booked during this time slot ({appointment.start_time} - {appointment.end_time})"
-                        }
-                    )
-            # Batch fetch availabilities for all therapists
-            availabilities = Availability.objects.filter(
-                user__in=therapists,
-                date__in=[date, date - timedelta(days=1)],
-                is_available=True,
-            )
-            # (You can add further logic here to check for time slot coverage)
-        # Validate therapist availability and conflicts
+                id__in=initial_data.get("therapists", []) or [], role="therapist"
+            ).only("id", "role")
+        for therapist in therapists:
+            if therapist.role == "therapist":
+                staff.append(("therapists", therapist.id))
+
         therapist = attrs.get(
             "therapist", getattr(instance, "therapist", None) if instance else None
         )
-        if therapist and date and start_time and end_time:
-            conflicting_query = Appointment.objects.filter(
-                therapist=therapist,
-                date=date,
-                status__in=["pending", "confirmed", "in_progress"],
-            )
-            if instance:
-                conflicting_query = conflicting_query.exclude(pk=instance.pk)
-            for appointment in conflicting_query.only("id", "start_time", "end_time"):
-                if (
-                    start_time <= appointment.end_time
-                    and end_time >= appointment.start_time
-                ):
-                    raise serializers.ValidationError(
-                        {
-                            "therapist": f"Therapist is already booked during this time slot ({appointment.start_time} - {appointment.end_time})"
-                        }
-                    )
-            # Check therapist availability
-            availabilities = Availability.objects.filter(
-                user=therapist,
-                date__in=[date, date - timedelta(days=1)],
-                is_available=True,
-            )
-            # (You can add further logic here to check for time slot coverage)
-        # Validate driver availability and conflicts
+        if therapist:
+            staff.append(("therapist", therapist.id))
+
         driver = attrs.get(
             "driver", getattr(instance, "driver", None) if instance else None
         )
-        if driver and date and start_time and end_time:
-            conflicting_query = Appointment.objects.filter(
-                driver=driver,
-                date=date,
-                status__in=["pending", "confirmed", "in_progress"],
-            )
-            if instance:
-                conflicting_query = conflicting_query.exclude(pk=instance.pk)
-            for appointment in conflicting_query.only("id", "start_time", "end_time"):
-                if (
-                    start_time <= appointment.end_time
-                    and end_time >= appointment.start_time
-                ):
-                    raise serializers.ValidationError(
-                        {
-                            "driver": f"Driver is already booked during this time slot ({appointment.start_time} - {appointment.end_time})"
-                        }
-                    )
-            availabilities = Availability.objects.filter(
-                user=driver,
-                date__in=[date, date - timedelta(days=1)],
-                is_available=True,
+        if driver:
+            staff.append(("driver", driver.id))
+
+        if not staff:
+            return attrs
+
+        conflict = occupancy.find_conflicts(
+            date,
+            start_time,
+            end_time,
+            staff,
+            exclude_id=instance.pk if instance else None,
+        )
+        if conflict:
+            field, booked_start, booked_end = conflict
+            label = "Driver" if field == "driver" else "Therapist"
+            raise serializers.ValidationError(
+                {
+                    field: f"{label} is already booked during this time slot ({booked_start} - {booked_end})"
+                }
             )
-            # (You can add further logic here to check for time slot coverage)
         return attrs
 
 
@@ -694,6 +816,36 @@ class NotificationSerializer(serializers.ModelSerializer):
                 }
 
 
+class SearchWindowSerializer(serializers.Serializer):
+    """One candidate window of AvailabilityViewSet.search_windows"""
+
+    date = serializers.DateField(input_formats=["%Y-%m-%d"])
+    start_time = serializers.TimeField(input_formats=["%H:%M"])
+    end_time = serializers.TimeField(input_formats=["%H:%M"])
+    specialization = serializers.CharField(
+        required=False, allow_blank=True, allow_null=True, max_length=100
+    )
+    massage_pressure = serializers.CharField(
+        required=False, allow_blank=True, allow_null=True, max_length=20
+    )
+
+
+class ArchivedNotificationSerializer(serializers.ModelSerializer):
+    """Archived notifications carry plain ids for the objects they mention"""
+
+    class Meta:
+        model = ArchivedNotification
+        fields = [
+            "id",
+            "notification_type",
+            "message",
+            "appointment_id",
+            "rejection_id",
+            "created_at",
+            "archived_at",
+        ]
+
+
 class AppointmentMaterialSerializer(serializers.ModelSerializer):
     """Serializer for AppointmentMaterial usage tracking"""
 
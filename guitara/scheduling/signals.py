@@ -3,9 +3,58 @@ Django Signals for Real-Time WebSocket Updates
 Automatically broadcasts WebSocket events when appointments are created, updated, or deleted
 """
 
-from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_init,
+    post_save,
+    pre_delete,
+)
 from django.dispatch import receiver, Signal
-from .models import Appointment, Notification
+from django.utils import timezone
+from core.models import CustomUser, SystemLog
+from registration.models import (
+    Driver,
+    Operator,
+    RegistrationMaterial,
+    Service,
+    Therapist,
+)
+from .models import (
+    Appointment,
+    AppointmentMaterial,
+    AppointmentRejection,
+    ArchivedNotification,
+    Availability,
+    Client,
+    Notification,
+    RecurringAvailability,
+    RecurringAvailabilityException,
+)
+from .delta_sync import appointment_staff_ids, record_deletion, record_removal
+from .driver_queue import (
+    BUSY_DRIVER_STATUSES,
+    DRIVER_RELEASE_STATUSES,
+    driver_queue,
+)
+from .cache_tags import (
+    RECURRING_AVAILABILITY_TAG,
+    appointment_tags,
+    date_tag,
+    role_tag,
+    tagged_cache,
+)
+from .conditional_requests import (
+    APPOINTMENT_DELETIONS_SCOPE,
+    AVAILABILITY_SCOPE,
+    notifications_scope,
+    touch_scopes,
+)
+from .count_service import count_service
+from .interval_index import interval_index
+from .notification_dispatcher import notification_dispatcher
+from .unread_counter import unread_counter
+from .workload import workload_counters, workload_keys
 from .websocket_handlers import (
     AppointmentWebSocketHandler,
     NotificationWebSocketHandler,
@@ -53,20 +102,11 @@ def appointment_saved(sender, instance, created, **kwargs):
             # New appointment created
             AppointmentWebSocketHandler.broadcast_appointment_created(instance)
 
-            # Create notifications for assigned users
-            if instance.therapists.exists():
-                for therapist in instance.therapists.all():
-                    NotificationWebSocketHandler.send_notification(
-                        user_id=therapist.id,
-                        notification_type="appointment_assigned",
-                        title="New Appointment Assigned",
-                        message=f"You have been assigned to an appointment on {instance.date}",
-                        data={"appointment_id": instance.id},
-                    )
-
-            if instance.driver:
-                NotificationWebSocketHandler.send_notification(
-                    user_id=instance.driver.id,
+            # Tell the driver once the appointment is committed; therapists
+            # are told by therapist_assignment_changed when they are added
+            if instance.driver_id:
+                notification_dispatcher.announce(
+                    [instance.driver_id],
                     notification_type="pickup_assigned",
                     title="New Pickup Assignment",
                     message=f"You have been assigned a pickup on {instance.date}",
@@ -128,9 +168,24 @@ def appointment_saved(sender, instance, created, **kwargs):
         logger.error(f"Error in appointment_saved signal: {e}")
 
 
+@receiver(pre_delete, sender=Appointment)
+def remember_appointment_staff(sender, instance, **kwargs):
+    """Read the assigned therapists before their through rows are deleted"""
+    try:
+        instance._sync_staff_ids = appointment_staff_ids(instance)
+    except Exception as e:
+        logger.error(f"Error reading staff of appointment {instance.id}: {e}")
+
+
 @receiver(post_delete, sender=Appointment)
 def appointment_deleted(sender, instance, **kwargs):
     """Handle appointment deletion"""
+    try:
+        # Tombstones for delta sync, written in the deleting transaction
+        record_deletion(instance, getattr(instance, "_sync_staff_ids", ()))
+    except Exception as e:
+        logger.error(f"Error recording tombstone for appointment {instance.id}: {e}")
+
     try:
         AppointmentWebSocketHandler.broadcast_appointment_deleted(
             appointment_id=instance.id,
@@ -146,52 +201,81 @@ def appointment_deleted(sender, instance, **kwargs):
         if instance.driver:
             affected_users.append(instance.driver.id)
 
-        for user_id in affected_users:
-            NotificationWebSocketHandler.send_notification(
-                user_id=user_id,
-                notification_type="appointment_cancelled",
-                title="Appointment Cancelled",
-                message=f"Your appointment on {instance.date} has been cancelled",
-                data={"appointment_id": instance.id},
-            )
+        notification_dispatcher.announce(
+            affected_users,
+            notification_type="appointment_cancelled",
+            title="Appointment Cancelled",
+            message=f"Your appointment on {instance.date} has been cancelled",
+            data={"appointment_id": instance.id},
+        )
 
     except Exception as e:
         logger.error(f"Error in appointment_deleted signal: {e}")
 
 
+@receiver(post_save, sender=Appointment)
+def record_reassignments(sender, instance, created, **kwargs):
+    """Tombstone staff reassigned off an appointment so delta sync drops it"""
+    try:
+        loaded = getattr(instance, "_sync_staff", (None, None))
+        instance._sync_staff = (instance.therapist_id, instance.driver_id)
+        if created:
+            return
+        removed = set(loaded) - {instance.therapist_id, instance.driver_id, None}
+        if removed:
+            # A primary therapist who stays in the group keeps the appointment
+            removed -= set(
+                instance.therapists.filter(id__in=removed).values_list("id", flat=True)
+            )
+            record_removal(instance, removed)
+    except Exception as e:
+        logger.error(f"Error recording reassignment of appointment {instance.id}: {e}")
+
+
+@receiver(m2m_changed, sender=Appointment.therapists.through)
+def record_therapist_removals(sender, instance, action, pk_set, reverse, **kwargs):
+    """
+    Tombstone therapists taken off the group. Added therapists need no row
+    here: touch_appointment_for_m2m_change advances updated_at for them.
+    """
+    if reverse:
+        return
+    try:
+        if action == "pre_clear":
+            instance._cleared_therapist_ids = set(
+                instance.therapists.values_list("id", flat=True)
+            )
+        elif action in ("post_remove", "post_clear"):
+            if action == "post_clear":
+                pk_set = getattr(instance, "_cleared_therapist_ids", set())
+            record_removal(instance, set(pk_set or ()) - {instance.therapist_id})
+    except Exception as e:
+        logger.error(f"Error recording therapist removals of {instance.id}: {e}")
+
+
 @receiver(m2m_changed, sender=Appointment.therapists.through)
 def therapist_assignment_changed(sender, instance, action, pk_set, **kwargs):
     """Handle therapist assignment changes"""
     try:
         if action == "post_add" and pk_set:
             # Therapists added to appointment
-            from core.models import CustomUser
-
-            for therapist_id in pk_set:
-                try:
-                    therapist = CustomUser.objects.get(id=therapist_id)
-                    NotificationWebSocketHandler.send_notification(
-                        user_id=therapist_id,
-                        notification_type="appointment_assigned",
-                        title="New Appointment Assignment",
-                        message=f"You have been assigned to an appointment on {instance.date}",
-                        data={"appointment_id": instance.id},
-                    )
-                except CustomUser.DoesNotExist:
-                    logger.warning(
-                        f"Therapist {therapist_id} not found during assignment"
-                    )
+            notification_dispatcher.announce(
+                sorted(pk_set),
+                notification_type="appointment_assigned",
+                title="New Appointment Assignment",
+                message=f"You have been assigned to an appointment on {instance.date}",
+                data={"appointment_id": instance.id},
+            )
 
         elif action == "post_remove" and pk_set:
             # Therapists removed from appointment
-            for therapist_id in pk_set:
-                NotificationWebSocketHandler.send_notification(
-                    user_id=therapist_id,
-                    notification_type="appointment_unassigned",
-                    title="Appointment Assignment Removed",
-                    message=f"You have been removed from the appointment on {instance.date}",
-                    data={"appointment_id": instance.id},
-                )
+            notification_dispatcher.announce(
+                sorted(pk_set),
+                notification_type="appointment_unassigned",
+                title="Appointment Assignment Removed",
+                message=f"You have been removed from the appointment on {instance.date}",
+                data={"appointment_id": instance.id},
+            )
 
     except Exception as e:
         logger.error(f"Error in therapist_assignment_changed signal: {e}")
@@ -199,48 +283,341 @@ def therapist_assignment_changed(sender, instance, action, pk_set, **kwargs):
 
 @receiver(post_save, sender=Notification)
 def notification_created(sender, instance, created, **kwargs):
-    """Handle new notification creation"""
+    """Push rows created one at a time through the dispatcher's batch path"""
     if created:
         try:
-            # Generate a title based on notification type
-            title_map = {
-                "appointment_created": "New Appointment",
-                "appointment_updated": "Appointment Updated",
-                "appointment_reminder": "Appointment Reminder",
-                "appointment_cancelled": "Appointment Cancelled",
-                "appointment_accepted": "Appointment Accepted",
-                "appointment_rejected": "Appointment Rejected",
-                "appointment_started": "Appointment Started",
-                "appointment_completed": "Appointment Completed",
-                "appointment_auto_cancelled": "Appointment Auto Cancelled",
-                "rejection_reviewed": "Rejection Reviewed",
-                "therapist_disabled": "Therapist Disabled",
-            }
-
-            title = title_map.get(instance.notification_type, "Notification")
-
-            # Determine related object ID
-            related_object_id = None
-            if instance.appointment:
-                related_object_id = instance.appointment.id
-            elif instance.rejection:
-                related_object_id = instance.rejection.id
-
-            NotificationWebSocketHandler.send_notification(
-                user_id=instance.user.id,
-                notification_type=instance.notification_type,
-                title=title,
-                message=instance.message,
-                data={
-                    "notification_id": instance.id,
-                    "related_object_id": related_object_id,
-                    "is_read": instance.is_read,
-                },
-            )
+            notification_dispatcher.push_on_commit([instance])
         except Exception as e:
             logger.error(f"Error in notification_created signal: {e}")
 
 
+@receiver(post_init, sender=Notification)
+def remember_loaded_read_state(sender, instance, **kwargs):
+    """Remember whether a row was loaded unread so saves can adjust the counter"""
+    instance._was_unread = (
+        instance.pk is not None and instance.__dict__.get("is_read") is False
+    )
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def adjust_unread_counter(sender, instance, signal, **kwargs):
+    """Keep the materialized unread count in step with single-row changes"""
+    try:
+        is_unread = signal is post_save and not instance.is_read
+        delta = int(is_unread) - int(getattr(instance, "_was_unread", False))
+        instance._was_unread = is_unread
+        if delta:
+            unread_counter.adjust({instance.user_id: delta})
+    except Exception as e:
+        logger.error(f"Error adjusting unread count for user {instance.user_id}: {e}")
+
+
+@receiver(post_init, sender=Availability)
+@receiver(post_init, sender=Appointment)
+def remember_loaded_date(sender, instance, **kwargs):
+    """Remember the date a row was loaded with so reschedules invalidate both days"""
+    instance._interval_index_date = instance.__dict__.get("date")
+    instance._cache_tags = _cache_tags(instance)
+    if sender is Appointment:
+        instance._driver_queue_state = (
+            instance.__dict__.get("status"),
+            instance.__dict__.get("driver_id"),
+        )
+        instance._sync_staff = (
+            instance.__dict__.get("therapist_id"),
+            instance.__dict__.get("driver_id"),
+        )
+        instance._workload_keys = _appointment_workload_keys(instance)
+
+
+def _cache_tags(instance):
+    """Cache tags a row currently belongs to (see cache_tags)"""
+    fields = instance.__dict__
+    if isinstance(instance, Appointment):
+        return set(
+            appointment_tags(
+                dates=[fields.get("date")],
+                user_ids=[fields.get("therapist_id"), fields.get("driver_id")],
+            )
+        )
+    return {date_tag(fields["date"])} if fields.get("date") else set()
+
+
+def _appointment_workload_keys(instance):
+    fields = instance.__dict__
+    return workload_keys(
+        fields.get("status"),
+        fields.get("date"),
+        fields.get("therapist_id"),
+        fields.get("driver_id"),
+    )
+
+
+@receiver(post_save, sender=Availability)
+@receiver(post_delete, sender=Availability)
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def invalidate_interval_index(sender, instance, **kwargs):
+    """Mark the affected days of the staff interval index as stale"""
+    try:
+        interval_index.invalidate(
+            instance.date, getattr(instance, "_interval_index_date", None)
+        )
+        instance._interval_index_date = instance.date
+    except Exception as e:
+        logger.error(f"Error invalidating interval index: {e}")
+
+
+@receiver(post_save, sender=Availability)
+@receiver(post_delete, sender=Availability)
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def invalidate_cache_tags(sender, instance, **kwargs):
+    """Bump the cache tags of the row before and after the change"""
+    try:
+        current_tags = _cache_tags(instance)
+        tagged_cache.invalidate(
+            *(current_tags | getattr(instance, "_cache_tags", set()))
+        )
+        instance._cache_tags = current_tags
+    except Exception as e:
+        logger.error(f"Error invalidating cache tags: {e}")
+
+
+@receiver(m2m_changed, sender=Appointment.therapists.through)
+def invalidate_cache_tags_therapists(sender, instance, action, pk_set, **kwargs):
+    """Group booking therapists are tagged by user as well"""
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    try:
+        if isinstance(instance, Appointment):
+            tagged_cache.invalidate(
+                *appointment_tags(dates=[instance.date], user_ids=pk_set or [])
+            )
+        else:
+            tagged_cache.invalidate(
+                *appointment_tags(
+                    dates=Appointment.objects.filter(pk__in=pk_set or [])
+                    .values_list("date", flat=True)
+                    .distinct(),
+                    user_ids=[instance.pk],
+                )
+            )
+    except Exception as e:
+        logger.error(f"Error invalidating cache tags: {e}")
+
+
+# User fields that appear in the role-tagged staff and availability listings
+ROLE_CACHE_FIELDS = (
+    "role",
+    "is_active",
+    "first_name",
+    "last_name",
+    "email",
+    "specialization",
+    "last_available_at",
+)
+
+
+def _role_cache_state(instance):
+    return {field: instance.__dict__.get(field) for field in ROLE_CACHE_FIELDS}
+
+
+@receiver(post_init, sender=CustomUser)
+def remember_role_cache_state(sender, instance, **kwargs):
+    """Remember the listed fields so saves that leave them alone keep the caches"""
+    instance._role_cache_state = _role_cache_state(instance)
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_role_cache_tag(sender, instance, created, update_fields, **kwargs):
+    """Staff listings are tagged by role; logins and other saves leave them be"""
+    try:
+        if update_fields is not None and set(update_fields).isdisjoint(
+            ROLE_CACHE_FIELDS
+        ):
+            return
+        old_state = getattr(instance, "_role_cache_state", None)
+        new_state = _role_cache_state(instance)
+        instance._role_cache_state = new_state
+        if not created and old_state == new_state:
+            return
+        # A role change empties the old role's listings as well as the new one's
+        old_role = old_state["role"] if old_state else None
+        tagged_cache.invalidate(
+            role_tag(instance.role), role_tag(old_role) if old_role else None
+        )
+        if old_state and old_state["is_active"] != new_state["is_active"]:
+            # Cached interval indexes only offer active staff for assignment
+            interval_index.invalidate_staff()
+    except Exception as e:
+        logger.error(f"Error invalidating cache tags: {e}")
+
+
+@receiver(m2m_changed, sender=Appointment.therapists.through)
+def invalidate_interval_index_therapists(sender, instance, action, **kwargs):
+    """Group booking therapists change after the appointment row is saved"""
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    try:
+        if isinstance(instance, Appointment):
+            interval_index.invalidate(instance.date)
+        else:
+            # Reverse side: instance is a user, pk_set holds appointment ids
+            interval_index.invalidate(
+                *Appointment.objects.filter(pk__in=kwargs.get("pk_set") or [])
+                .values_list("date", flat=True)
+                .distinct()
+            )
+    except Exception as e:
+        logger.error(f"Error invalidating interval index: {e}")
+
+
+@receiver(post_save, sender=RecurringAvailability)
+@receiver(post_delete, sender=RecurringAvailability)
+@receiver(post_save, sender=RecurringAvailabilityException)
+@receiver(post_delete, sender=RecurringAvailabilityException)
+def invalidate_interval_index_templates(sender, instance, **kwargs):
+    """Recurring templates expand into every date they cover"""
+    try:
+        interval_index.invalidate_templates()
+        tagged_cache.invalidate(RECURRING_AVAILABILITY_TAG)
+    except Exception as e:
+        logger.error(f"Error invalidating interval index: {e}")
+
+
+@receiver(post_save, sender=RecurringAvailability)
+@receiver(post_delete, sender=RecurringAvailability)
+def queue_recurring_driver(sender, instance, **kwargs):
+    """A driver template covering today changes whether they can take pickups"""
+    try:
+        today = timezone.localdate()
+        if instance.user.role == "driver" and instance.occurs_on(today):
+            driver_queue.refresh(instance.user_id, today)
+    except Exception as e:
+        logger.error(f"Error queueing available driver: {e}")
+
+
+@receiver(post_save, sender=Appointment)
+def update_driver_queue(sender, instance, **kwargs):
+    """Move the driver in or out of the pickup queue on workflow transitions"""
+    try:
+        previous_state = (
+            (None, None)
+            if kwargs.get("created")
+            else getattr(instance, "_driver_queue_state", (None, None))
+        )
+        instance._driver_queue_state = (instance.status, instance.driver_id)
+        if previous_state == instance._driver_queue_state:
+            return
+
+        previous_status, previous_driver_id = previous_state
+        if previous_driver_id and previous_driver_id != instance.driver_id:
+            if previous_status in BUSY_DRIVER_STATUSES:
+                driver_queue.release(previous_driver_id, instance.date)
+
+        if not instance.driver_id:
+            return
+        if instance.status in BUSY_DRIVER_STATUSES:
+            driver_queue.remove(instance.driver_id, instance.date)
+        elif instance.status in DRIVER_RELEASE_STATUSES:
+            driver_queue.release(instance.driver_id, instance.date, timezone.now())
+    except Exception as e:
+        logger.error(f"Error updating driver queue: {e}")
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def update_workload_counters(sender, instance, **kwargs):
+    """Keep daily workload counters in step with completed/in-progress status"""
+    try:
+        old_keys = (
+            set() if kwargs.get("created") else getattr(instance, "_workload_keys", set())
+        )
+        new_keys = (
+            set()
+            if kwargs.get("signal") is post_delete
+            else _appointment_workload_keys(instance)
+        )
+        if old_keys != new_keys:
+            workload_counters.apply_change(old_keys, new_keys)
+        instance._workload_keys = new_keys
+    except Exception as e:
+        logger.error(f"Error updating workload counters: {e}")
+
+
+@receiver(post_save, sender=Availability)
+@receiver(post_delete, sender=Availability)
+@receiver(post_save, sender=RecurringAvailability)
+@receiver(post_delete, sender=RecurringAvailability)
+@receiver(post_save, sender=RecurringAvailabilityException)
+@receiver(post_delete, sender=RecurringAvailabilityException)
+def touch_availability_scope(sender, instance, **kwargs):
+    """Availability list ETags are based on the last change to any slot"""
+    touch_scopes(AVAILABILITY_SCOPE)
+
+
+@receiver(post_delete, sender=Appointment)
+def touch_appointment_deletions_scope(sender, instance, **kwargs):
+    touch_scopes(APPOINTMENT_DELETIONS_SCOPE)
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def touch_notifications_scope(sender, instance, **kwargs):
+    touch_scopes(notifications_scope(instance.user_id))
+
+
+def _touch_appointment(appointment_id):
+    """
+    Bump updated_at when data shown with an appointment changes elsewhere,
+    so cached serializer fragments and delta sync pick it up
+    """
+    if appointment_id:
+        Appointment.objects.filter(pk=appointment_id).update(
+            updated_at=timezone.now()
+        )
+
+
+@receiver(post_save, sender=AppointmentMaterial)
+@receiver(post_delete, sender=AppointmentMaterial)
+@receiver(post_save, sender=AppointmentRejection)
+@receiver(post_delete, sender=AppointmentRejection)
+def touch_appointment_for_related_change(sender, instance, **kwargs):
+    try:
+        _touch_appointment(instance.appointment_id)
+    except Exception as e:
+        logger.error(f"Error touching appointment: {e}")
+
+
+@receiver(m2m_changed, sender=Appointment.services.through)
+@receiver(m2m_changed, sender=Appointment.therapists.through)
+def touch_appointment_for_m2m_change(sender, instance, action, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    try:
+        if isinstance(instance, Appointment):
+            _touch_appointment(instance.pk)
+        else:
+            Appointment.objects.filter(pk__in=kwargs.get("pk_set") or []).update(
+                updated_at=timezone.now()
+            )
+    except Exception as e:
+        logger.error(f"Error touching appointment: {e}")
+
+
+@receiver(post_save, sender=Availability)
+@receiver(post_delete, sender=Availability)
+def queue_available_driver(sender, instance, **kwargs):
+    """A driver's availability for a day decides whether they take pickups"""
+    try:
+        if instance.user.role == "driver":
+            driver_queue.refresh(instance.user_id, instance.date)
+    except Exception as e:
+        logger.error(f"Error queueing available driver: {e}")
+
+
 # Custom signal for therapist responses
 therapist_response_signal = Signal()
 
@@ -269,3 +646,20 @@ def handle_therapist_response(sender, appointment, therapist, accepted, **kwargs
 
     except Exception as e:
         logger.error(f"Error handling therapist response: {e}")
+
+
+# Cached list counts are dropped by the writes that change their tables
+count_service.track(
+    Appointment,
+    Availability,
+    Client,
+    Notification,
+    ArchivedNotification,
+    CustomUser,
+    SystemLog,
+    Therapist,
+    Driver,
+    Operator,
+    Service,
+    RegistrationMaterial,
+)
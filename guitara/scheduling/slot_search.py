@@ -0,0 +1,182 @@
+"""
+Roster-wide earliest-fit slot search
+Finds the earliest (therapist, driver, start) combinations over a horizon of
+days with a priority-queue sweep over each staff member's free intervals
+"""
+
+import heapq
+from datetime import datetime, timedelta
+
+from .interval_index import interval_index
+
+# Bookings use closed intervals, so free time starts a minute after a booking
+BOOKING_GAP = timedelta(minutes=1)
+SLOT_GRANULARITY_MINUTES = 5
+
+
+def _round_up(value, minutes=SLOT_GRANULARITY_MINUTES):
+    """Round a datetime up to the next multiple of the slot granularity"""
+    value = value.replace(second=0, microsecond=0)
+    remainder = (value.hour * 60 + value.minute) % minutes
+    if remainder:
+        value += timedelta(minutes=minutes - remainder)
+    return value
+
+
+def _merge(intervals):
+    """Merge overlapping or touching (start, end) pairs"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _subtract(available, busy):
+    """Remove closed busy intervals from merged available intervals"""
+    free = []
+    busy = sorted(busy)
+    for avail_start, avail_end in available:
+        cursor = avail_start
+        for busy_start, busy_end in busy:
+            if busy_end < cursor:
+                continue
+            if busy_start > avail_end:
+                break
+            if busy_start > cursor:
+                free.append((cursor, busy_start - BOOKING_GAP))
+            cursor = max(cursor, busy_end + BOOKING_GAP)
+        if cursor <= avail_end:
+            free.append((cursor, avail_end))
+    return free
+
+
+class RosterTimeline:
+    """Free intervals for every staff member across several days"""
+
+    def __init__(self, days):
+        self.staff = {}
+        self._indexes = [interval_index.get_day(day) for day in days]
+        available = {}
+        busy = {}
+        for day_index in self._indexes:
+            self.staff.update(day_index.staff)
+            # Neighbouring days share cross-day slots and bookings, so
+            # collect them into sets before merging
+            for user_id, intervals in day_index.availability.items():
+                available.setdefault(user_id, set()).update(
+                    zip(intervals.starts, intervals.ends)
+                )
+            for user_id, intervals in day_index.busy.items():
+                busy.setdefault(user_id, set()).update(
+                    zip(intervals.starts, intervals.ends, intervals.payloads)
+                )
+
+        self.free = {}
+        for user_id, intervals in available.items():
+            booked = [(start, end) for start, end, _ in busy.get(user_id, ())]
+            self.free[user_id] = _subtract(_merge(intervals), booked)
+
+    def staff_ids(self, role, specialization=None, massage_pressure=None):
+        user_ids = set()
+        for day_index in self._indexes:
+            user_ids.update(
+                day_index.staff_ids(role, specialization, massage_pressure)
+            )
+        return sorted(user_ids)
+
+
+def _earliest_in_interval(window, duration, not_before, drivers, free):
+    """
+    Earliest start inside one therapist window, paired with the driver who
+    allows it (None when no driver is required). Returns (start, driver_id)
+    """
+    window_start = _round_up(max(window[0], not_before))
+    if drivers is None:
+        if window_start + duration <= window[1]:
+            return window_start, None
+        return None
+
+    best = None
+    for driver_id in drivers:
+        for driver_start, driver_end in free.get(driver_id, ()):
+            if driver_start > window[1]:
+                break
+            start = _round_up(max(window_start, driver_start))
+            if start + duration <= min(window[1], driver_end):
+                if best is None or start < best[0]:
+                    best = (start, driver_id)
+                break
+    return best
+
+
+def _therapist_candidates(therapist_id, duration, not_before, drivers, free):
+    """Yield one candidate per free window of a therapist, earliest first"""
+    for window in free.get(therapist_id, ()):
+        if window[1] < not_before + duration:
+            continue
+        candidate = _earliest_in_interval(window, duration, not_before, drivers, free)
+        if candidate is not None:
+            yield candidate
+
+
+def find_earliest_slots(
+    start_date,
+    duration_minutes,
+    horizon_days=7,
+    specialization=None,
+    massage_pressure=None,
+    needs_driver=True,
+    limit=5,
+    not_before=None,
+):
+    """
+    Return up to `limit` earliest (therapist, driver, start, end) combinations.
+
+    Every therapist contributes a lazily generated stream of candidates in
+    start order; a heap merges the streams so only as many candidates as
+    needed are evaluated.
+    """
+    days = [start_date + timedelta(days=offset) for offset in range(horizon_days)]
+    roster = RosterTimeline(days)
+    duration = timedelta(minutes=duration_minutes)
+
+    horizon_start = datetime.combine(start_date, datetime.min.time())
+    horizon_end = horizon_start + timedelta(days=horizon_days)
+    not_before = max(not_before or horizon_start, horizon_start)
+
+    drivers = roster.staff_ids("driver") if needs_driver else None
+    heap = []
+    for therapist_id in roster.staff_ids(
+        "therapist", specialization, massage_pressure
+    ):
+        stream = _therapist_candidates(
+            therapist_id, duration, not_before, drivers, roster.free
+        )
+        first = next(stream, None)
+        if first is not None:
+            heapq.heappush(heap, (first[0], therapist_id, first[1], stream))
+
+    results = []
+    while heap and len(results) < limit:
+        start, therapist_id, driver_id, stream = heapq.heappop(heap)
+        # Slots must start inside the requested horizon
+        if start >= horizon_end:
+            break
+        results.append(
+            {
+                "therapist": roster.staff[therapist_id],
+                "driver": roster.staff[driver_id] if driver_id else None,
+                "start": start,
+                "end": start + duration,
+            }
+        )
+        following = next(stream, None)
+        if following is not None:
+            heapq.heappush(heap, (following[0], therapist_id, following[1], stream))
+
+    return results
+
@@ -95,47 +95,20 @@ def send_appointment_notifications(self, appointment_id, notification_type, mess
     Send notifications to relevant users asynchronously.
     """
     try:
-        from .models import Appointment, Notification
-
-        appointment = Appointment.objects.select_related(
-            "client", "therapist", "driver", "operator"
-        ).get(id=appointment_id)
+        from .models import Appointment
+        from .notification_dispatcher import notification_dispatcher
 
-        notifications_created = 0
+        appointment = Appointment.objects.get(id=appointment_id)
 
-        # Create notification for therapist if assigned
-        if appointment.therapist:
-            Notification.objects.create(
-                user=appointment.therapist,
-                appointment=appointment,
-                notification_type=notification_type,
-                message=message,
-            )
-            notifications_created += 1
-
-        # Create notification for driver if assigned
-        if appointment.driver:
-            Notification.objects.create(
-                user=appointment.driver,
-                appointment=appointment,
-                notification_type=notification_type,
-                message=message,
+        # One bulk insert for every recipient, pushed to each after commit
+        notifications_created = len(
+            notification_dispatcher.notify_appointment(
+                appointment, notification_type, message
             )
-            notifications_created += 1
-
-        # Create notification for operator if assigned
-        if appointment.operator:
-            Notification.objects.create(
-                user=appointment.operator,
-                appointment=appointment,
-                notification_type=notification_type,
-                message=message,
-            )
-            notifications_created += 1
+        )
 
-        # Notify via WebSocket
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
+        # Notify dashboards on the shared group once the rows are committed
+        notification_dispatcher.broadcast_on_commit(
             "appointments",
             {
                 "type": "notification_broadcast",
@@ -293,30 +266,83 @@ def preload_dashboard_data(self, user_id):
     This can be triggered when a user logs in to warm up the cache.
     """
     try:
-        from .models import Appointment
-        from core.models import CustomUser
-
-        user = CustomUser.objects.get(id=user_id)
-        today = timezone.now().date()
-
-        # Preload today's appointments
-        if user.role == "operator":
-            appointments = Appointment.objects.select_related(
-                "client", "therapist", "driver"
-            ).filter(date=today)
-        else:
-            appointments = Appointment.objects.select_related(
-                "client", "therapist", "driver"
-            ).filter(Q(therapist=user) | Q(driver=user), date=today)
+        from .cache_warming import cache_warmer
 
-        # Convert to list to execute the query
-        appointment_list = list(appointments)
+        warmed = cache_warmer.warm(user_ids=[user_id])
 
         logger.info(
-            f"Preloaded {len(appointment_list)} appointments for user {user_id}"
+            f"Preloaded {warmed['appointments']} appointments for user {user_id}"
         )
-        return {"success": True, "appointments_count": len(appointment_list)}
+        return {"success": True, "appointments_count": warmed["appointments"]}
 
     except Exception as e:
         logger.error(f"Error preloading dashboard data for user {user_id}: {str(e)}")
         return {"success": False, "error": str(e)}
+
+
+@shared_task(bind=True, name="scheduling.tasks.warm_dashboard_caches")
+def warm_dashboard_caches(self):
+    """
+    Periodic task to warm today's and tomorrow's dashboard caches for all
+    active staff in one batch. Also queued when a worker starts.
+    """
+    try:
+        from .cache_warming import cache_warmer
+
+        warmed = cache_warmer.warm()
+        return {"success": True, **warmed}
+
+    except Exception as e:
+        logger.error(f"Error warming dashboard caches: {str(e)}")
+        return {"success": False, "error": str(e)}
+
+
+@shared_task(bind=True, name="scheduling.tasks.prune_appointment_tombstones")
+def prune_appointment_tombstones(self):
+    """
+    Periodic task to drop delta-sync tombstones past the retention window.
+    Clients with older cursors are told to do a full reload instead.
+    """
+    try:
+        from .delta_sync import prune_tombstones
+
+        removed = prune_tombstones()
+        return {"success": True, "removed_count": removed}
+
+    except Exception as e:
+        logger.error(f"Error pruning appointment tombstones: {str(e)}")
+        return {"success": False, "error": str(e)}
+
+
+@shared_task(bind=True, name="scheduling.tasks.reconcile_unread_notification_counts")
+def reconcile_unread_notification_counts(self):
+    """
+    Periodic task to recount unread notifications per user, repairing counters
+    that drifted through writes which bypass the hooks (raw update(), races)
+    """
+    try:
+        from .unread_counter import unread_counter
+
+        drifted = unread_counter.reconcile()
+        return {"success": True, "drifted_count": drifted}
+
+    except Exception as e:
+        logger.error(f"Error reconciling unread notification counts: {str(e)}")
+        return {"success": False, "error": str(e)}
+
+
+@shared_task(bind=True, name="scheduling.tasks.archive_read_notifications")
+def archive_read_notifications(self):
+    """
+    Periodic task to move read notifications past the retention window into
+    the archive, a bounded number of batches per run
+    """
+    try:
+        from .notification_retention import archive_max_batches, archive_notifications
+
+        archived, batches = archive_notifications(max_batches=archive_max_batches())
+        return {"success": True, "archived_count": archived, "batches": batches}
+
+    except Exception as e:
+        logger.error(f"Error archiving read notifications: {str(e)}")
+        return {"success": False, "error": str(e)}
@@ -0,0 +1,180 @@
+from datetime import date, time
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+
+from core.models import CustomUser
+from inventory.models import InventoryItem
+from registration.models import Service
+
+from . import appointment_projection as projection_module
+from .appointment_projection import appointment_projection
+from .models import (
+    Appointment,
+    AppointmentMaterial,
+    AppointmentRejection,
+    Availability,
+    Client,
+)
+from .optimized_data_manager import data_manager
+from .serializers import AppointmentSerializer, with_appointment_relations
+
+
+class AppointmentProjectionParityTest(TestCase):
+    """The projection must produce the serializer's JSON byte for byte"""
+
+    @classmethod
+    def setUpTestData(cls):
+        def user(username, role, **extra):
+            return CustomUser.objects.create_user(
+                username,
+                password="x",
+                role=role,
+                first_name=username.title(),
+                last_name="Tester",
+                **extra,
+            )
+
+        operator = user("operator", "operator")
+        therapist = user("lead", "therapist", specialization="Shiatsu")
+        helper = user("helper", "therapist", massage_pressure="soft")
+        driver = user("driver", "driver", motorcycle_plate="ABC 123")
+        client = Client.objects.create(
+            first_name="Ana", last_name="Cruz", phone_number="0917", address="Manila"
+        )
+        swedish = Service.objects.create(
+            name="Swedish", description="x", duration=90, price=Decimal("1250.50")
+        )
+        stone = Service.objects.create(
+            name="Hot Stone", description="y", duration=45, price=Decimal("800.25")
+        )
+        oil = InventoryItem.objects.create(
+            name="Massage Oil",
+            category="Oils",
+            current_stock=10,
+            unit="bottle",
+            cost_per_unit=Decimal("99.90"),
+        )
+
+        def appointment(hour, **fields):
+            return Appointment.objects.create(
+                client=client,
+                date=date(2030, 1, 15),
+                start_time=time(hour),
+                end_time=time(hour + 1),
+                location="Makati Tower",
+                **fields,
+            )
+
+        group = appointment(
+            9,
+            therapist=therapist,
+            driver=driver,
+            operator=operator,
+            group_size=2,
+            payment_amount=Decimal("2050.75"),
+            metadata={"extensions": [{"minutes": 30, "price": "300.00"}], "vip": True},
+        )
+        group.services.set([swedish, stone])
+        group.therapists.set([therapist, helper])
+        AppointmentMaterial.objects.create(
+            appointment=group, inventory_item=oil, quantity_used=2, notes="Lavender"
+        )
+        AppointmentMaterial.objects.create(
+            appointment=group,
+            inventory_item=oil,
+            quantity_used=1,
+            usage_type="reusable",
+            is_reusable=True,
+        )
+
+        rejected = appointment(
+            11,
+            therapist=helper,
+            operator=operator,
+            status="rejected",
+            rejection_reason="Too far",
+            rejected_by=helper,
+        )
+        rejected.services.set([stone])
+        AppointmentRejection.objects.create(
+            appointment=rejected, rejection_reason="Too far", rejected_by=helper
+        )
+
+        # Every nullable relation empty, no services, metadata unset
+        appointment(13)
+
+        cls.ids = list(
+            Appointment.objects.order_by("start_time").values_list("id", flat=True)
+        )
+
+    def serializer_bytes(self):
+        queryset = with_appointment_relations(
+            Appointment.objects.filter(id__in=self.ids).order_by("start_time")
+        )
+        data = AppointmentSerializer(queryset, many=True).data
+        return JSONRenderer().render(data)
+
+    def projection_bytes(self):
+        self.assertTrue(appointment_projection.available())
+        return appointment_projection.encode(appointment_projection.represent(self.ids))
+
+    def test_matches_serializer_with_orjson(self):
+        if projection_module.orjson is None:
+            self.skipTest("orjson is not installed")
+        self.assertEqual(self.projection_bytes(), self.serializer_bytes())
+
+    def test_matches_serializer_without_orjson(self):
+        with mock.patch.object(projection_module, "orjson", None):
+            self.assertEqual(self.projection_bytes(), self.serializer_bytes())
+
+
+class AvailableStaffTest(TestCase):
+    """Busy-staff exclusion in get_available_staff_optimized"""
+
+    day = date(2030, 1, 15)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.driver = CustomUser.objects.create_user(
+            "driver", password="x", role="driver"
+        )
+        cls.therapist = CustomUser.objects.create_user(
+            "therapist", password="x", role="therapist"
+        )
+        for user in (cls.driver, cls.therapist):
+            Availability.objects.create(
+                user=user, date=cls.day, start_time=time(8), end_time=time(18)
+            )
+        cls.client_record = Client.objects.create(
+            first_name="Ana", last_name="Cruz", phone_number="0917", address="Manila"
+        )
+
+    def available_ids(self, role):
+        cache.clear()
+        staff = data_manager.get_available_staff_optimized(role, self.day)
+        return [member["id"] for member in staff]
+
+    def busy_appointment(self, **staff):
+        return Appointment.objects.create(
+            client=self.client_record,
+            date=self.day,
+            start_time=time(9),
+            end_time=time(10),
+            location="Makati Tower",
+            status="in_progress",
+            **staff,
+        )
+
+    def test_busy_appointment_without_staff_excludes_nobody(self):
+        self.busy_appointment()
+        self.assertEqual(self.available_ids("driver"), [self.driver.id])
+        self.assertEqual(self.available_ids("therapist"), [self.therapist.id])
+
+    def test_busy_staff_are_excluded(self):
+        self.busy_appointment(driver=self.driver)
+        self.assertEqual(self.available_ids("driver"), [])
+        self.assertEqual(self.available_ids("therapist"), [self.therapist.id])
@@ -0,0 +1,97 @@
+"""
+Absolute datetime ranges for availability slots and appointments
+Cross-day slots (end_time earlier than start_time) are resolved once when a
+row is saved, so overlap lookups become a single range comparison
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.utils import timezone
+
+
+def normalize_range(day, start_time, end_time):
+    """
+    Convert a (date, start_time, end_time) slot into absolute naive datetimes.
+    A slot whose end_time is earlier than its start_time spans midnight,
+    so its end is moved onto the following day.
+    """
+    start_dt = datetime.combine(day, start_time)
+    end_dt = datetime.combine(day, end_time)
+    if end_dt < start_dt:
+        end_dt += timedelta(days=1)
+    return start_dt, end_dt
+
+
+def absolute_range(day, start_time, end_time):
+    """Timezone-aware (start_at, end_at) for a slot, or (None, None) if incomplete"""
+    if day is None or start_time is None or end_time is None:
+        return None, None
+    start_dt, end_dt = normalize_range(day, start_time, end_time)
+    return timezone.make_aware(start_dt), timezone.make_aware(end_dt)
+
+
+def day_bounds(day, days=1):
+    """Aware (first, last) instants of a run of days, for closed range lookups"""
+    start_at = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+    return start_at, start_at + timedelta(days=days) - timedelta(microseconds=1)
+
+
+def overlapping(queryset, start_at, end_at, inclusive=True):
+    """
+    Rows whose [start_at, end_at] range overlaps the given one.
+    inclusive treats touching ranges as overlapping, matching the booking
+    conflict rule; pass False for a strict overlap.
+    """
+    if inclusive:
+        return queryset.filter(start_at__lte=end_at, end_at__gte=start_at)
+    return queryset.filter(start_at__lt=end_at, end_at__gt=start_at)
+
+
+def covering(queryset, start_at, end_at):
+    """Rows whose range fully contains [start_at, end_at]"""
+    return queryset.filter(start_at__lte=start_at, end_at__gte=end_at)
+
+
+def sweep_overlaps(existing, candidates):
+    """
+    Check candidate (start_at, end_at) ranges against existing ranges and
+    against each other with a sort-and-sweep.
+
+    Returns a list parallel to candidates holding None for ranges that can be
+    inserted, "existing" when they touch a stored range, or "submitted" when
+    they touch an earlier-starting candidate.
+    """
+    results = [None] * len(candidates)
+    if not candidates:
+        return results
+
+    new_starts = np.array([start.timestamp() for start, _ in candidates])
+    new_ends = np.array([end.timestamp() for _, end in candidates])
+
+    if existing:
+        existing = sorted(existing)
+        old_starts = np.array([start.timestamp() for start, _ in existing])
+        old_max_ends = np.maximum.accumulate(
+            np.array([end.timestamp() for _, end in existing])
+        )
+        # Last stored range starting at or before each candidate's end; it
+        # overlaps if the running max end reaches the candidate's start
+        position = np.searchsorted(old_starts, new_ends, side="right") - 1
+        clashes = (position >= 0) & (
+            old_max_ends[np.maximum(position, 0)] >= new_starts
+        )
+        for index in np.flatnonzero(clashes):
+            results[index] = "existing"
+
+    running_end = None
+    for index in np.argsort(new_starts, kind="stable"):
+        if results[index] is not None:
+            continue
+        if running_end is not None and new_starts[index] <= running_end:
+            results[index] = "submitted"
+            continue
+        running_end = (
+            new_ends[index] if running_end is None else max(running_end, new_ends[index])
+        )
+    return results
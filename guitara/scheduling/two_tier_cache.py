@@ -0,0 +1,221 @@
+"""
+Two-tier cache: a bounded process-local LRU in front of the shared backend
+Hot keys are served from memory for a few seconds; deletes are broadcast
+over Redis pub/sub so every worker drops its local copy at the same time
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache_metrics import cache_metrics, metered_cache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TwoTierCache:
+    """
+    get/set/delete with the same signatures as django.core.cache.cache.
+
+    Local entries live at most LOCAL_TTL seconds, which bounds staleness if
+    an invalidation message is lost; without Redis (LocMemCache) there is a
+    single process and local deletes are enough. Sizes come from the
+    optional TWO_TIER_CACHE setting (MAX_ENTRIES, LOCAL_TTL).
+    """
+
+    CHANNEL = "guitara:cache_invalidation"
+
+    def __init__(self, max_entries=None, local_ttl=None):
+        options = getattr(settings, "TWO_TIER_CACHE", {})
+        self.max_entries = max_entries or options.get("MAX_ENTRIES", 2000)
+        self.local_ttl = local_ttl or options.get("LOCAL_TTL", 5)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            "local": {"hits": 0, "misses": 0},
+            "shared": {"hits": 0, "misses": 0},
+        }
+        self._sender_id = uuid.uuid4().hex
+        self._listener_pid = None
+        self._redis_client = None
+        self._redis_checked = False
+
+    # ------------------------------------------------------------------
+    # Local tier
+    # ------------------------------------------------------------------
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self._counters["local"]["misses"] += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self._counters["local"]["hits"] += 1
+        cache_metrics.record_local_hit(key)
+        return entry[0]
+
+    def _set_local(self, key, value, timeout=None):
+        ttl = self.local_ttl if timeout is None else min(self.local_ttl, timeout)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _drop_local(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def _count_shared(self, hit):
+        with self._lock:
+            self._counters["shared"]["hits" if hit else "misses"] += 1
+
+    # ------------------------------------------------------------------
+    # Cache API
+    # ------------------------------------------------------------------
+
+    def get(self, key, default=None):
+        self._ensure_listener()
+        value = self._get_local(key)
+        if value is not _MISSING:
+            return value
+
+        value = metered_cache.get(key, _MISSING)
+        self._count_shared(value is not _MISSING)
+        if value is _MISSING:
+            return default
+        self._set_local(key, value)
+        return value
+
+    def get_many(self, keys):
+        self._ensure_listener()
+        found = {}
+        remaining = []
+        for key in keys:
+            value = self._get_local(key)
+            if value is _MISSING:
+                remaining.append(key)
+            else:
+                found[key] = value
+
+        if remaining:
+            shared = metered_cache.get_many(remaining)
+            for key in remaining:
+                self._count_shared(key in shared)
+                if key in shared:
+                    found[key] = shared[key]
+                    self._set_local(key, shared[key])
+        return found
+
+    def set(self, key, value, timeout=None):
+        metered_cache.set(key, value, timeout)
+        self._set_local(key, value, timeout)
+
+    def set_many(self, mapping, timeout=None):
+        metered_cache.set_many(mapping, timeout)
+        for key, value in mapping.items():
+            self._set_local(key, value, timeout)
+
+    def delete(self, key):
+        self.delete_many([key])
+
+    def delete_many(self, keys):
+        cache.delete_many(keys)
+        self.discard(keys)
+
+    def discard(self, keys):
+        """Drop keys from the local tier of every worker, leaving the shared tier"""
+        keys = list(keys)
+        self._drop_local(keys)
+        self._publish({"sender": self._sender_id, "keys": keys})
+
+    def clear_local(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Per-tier hit/miss counters and hit rates"""
+        with self._lock:
+            stats = {
+                tier: dict(counters) for tier, counters in self._counters.items()
+            }
+            stats["local"]["entries"] = len(self._entries)
+        for counters in stats.values():
+            total = counters["hits"] + counters["misses"]
+            counters["hit_rate"] = round(counters["hits"] / total, 4) if total else 0.0
+        return stats
+
+    # ------------------------------------------------------------------
+    # Cross-worker invalidation
+    # ------------------------------------------------------------------
+
+    def _redis(self):
+        if not self._redis_checked:
+            self._redis_checked = True
+            try:
+                from django_redis import get_redis_connection
+
+                self._redis_client = get_redis_connection("default")
+            except Exception:
+                # LocMemCache or django-redis not installed
+                self._redis_client = None
+        return self._redis_client
+
+    def _publish(self, message):
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            client.publish(self.CHANNEL, json.dumps(message))
+        except Exception as e:
+            logger.warning(f"Failed to publish cache invalidation: {e}")
+
+    def _ensure_listener(self):
+        """Start the subscriber thread once per process (including after fork)"""
+        if self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            # A forked child inherits the parent's entries and sender id but
+            # not its listener thread
+            self._entries.clear()
+            self._sender_id = uuid.uuid4().hex
+        if self._redis() is None:
+            return
+        threading.Thread(
+            target=self._listen, name="two-tier-cache-invalidation", daemon=True
+        ).start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.CHANNEL)
+                for message in pubsub.listen():
+                    payload = json.loads(message["data"])
+                    if payload.get("sender") != self._sender_id:
+                        self._drop_local(payload.get("keys", []))
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener error, reconnecting: {e}")
+                # Entries may have missed invalidations while disconnected
+                self.clear_local()
+                time.sleep(1)
+
+
+# Global instance
+two_tier_cache = TwoTierCache()
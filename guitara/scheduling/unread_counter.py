@@ -0,0 +1,216 @@
+"""
+Materialized unread-notification counts
+Each user's count lives in the cache, backed by an UnreadNotificationCounter
+row that is adjusted in the same transaction as the notification change.
+After commit the cached copy is refreshed from the row and the new count is
+pushed to the user, so badge refreshes never scan the notification table.
+"""
+
+import logging
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .notification_dispatcher import notification_dispatcher
+
+logger = logging.getLogger(__name__)
+
+
+class UnreadCounter:
+    CACHE_KEY = "notifications_unread:{}"
+    # Entries are rewritten from the row on every change; this bounds the rest
+    CACHE_TIMEOUT = 60 * 60 * 24
+
+    def _key(self, user_id):
+        return self.CACHE_KEY.format(user_id)
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def get(self, user_id):
+        """The user's unread count: cache, then the counter row, then a recount"""
+        from .models import UnreadNotificationCounter
+
+        count = cache.get(self._key(user_id))
+        if count is not None:
+            return count
+        count = (
+            UnreadNotificationCounter.objects.filter(user_id=user_id)
+            .values_list("unread_count", flat=True)
+            .first()
+        )
+        if count is None:
+            count = self._recount([user_id])[user_id]
+        cache.set(self._key(user_id), count, self.CACHE_TIMEOUT)
+        return count
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def adjust(self, deltas):
+        """Apply {user_id: delta} to the counter rows; publish after commit"""
+        from .models import UnreadNotificationCounter
+
+        deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        existing = set(
+            UnreadNotificationCounter.objects.filter(
+                user_id__in=list(deltas)
+            ).values_list("user_id", flat=True)
+        )
+        # A fan-out adds the same delta for every recipient: one UPDATE each
+        by_delta = {}
+        for user_id in existing:
+            by_delta.setdefault(deltas[user_id], []).append(user_id)
+        for delta, user_ids in by_delta.items():
+            UnreadNotificationCounter.objects.filter(user_id__in=user_ids).update(
+                unread_count=Greatest(F("unread_count") + delta, 0)
+            )
+        missing = [user_id for user_id in deltas if user_id not in existing]
+        if missing:
+            # First change for these users: the recount already includes it
+            self._recount(missing)
+        self._publish_on_commit(deltas)
+
+    def lock(self, user_id):
+        """Hold the user's counter row until the surrounding transaction ends"""
+        from .models import UnreadNotificationCounter
+
+        list(
+            UnreadNotificationCounter.objects.select_for_update()
+            .filter(user_id=user_id)
+            .values_list("user_id", flat=True)
+        )
+
+    def reset(self, user_id):
+        """Zero a user's count (everything was marked as read)"""
+        from .models import UnreadNotificationCounter
+
+        UnreadNotificationCounter.objects.update_or_create(
+            user_id=user_id, defaults={"unread_count": 0}
+        )
+        self._publish_on_commit([user_id])
+
+    def _recount(self, user_ids):
+        """Store counts computed from the notification table for these users"""
+        from .models import Notification, UnreadNotificationCounter
+
+        counts = {user_id: 0 for user_id in user_ids}
+        counts.update(
+            Notification.objects.filter(user_id__in=user_ids, is_read=False)
+            .values("user_id")
+            .annotate(total=Count("id"))
+            .values_list("user_id", "total")
+        )
+        UnreadNotificationCounter.objects.bulk_create(
+            [
+                UnreadNotificationCounter(user_id=user_id, unread_count=total)
+                for user_id, total in counts.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=["unread_count"],
+        )
+        return counts
+
+    def reconcile(self):
+        """
+        Find users whose stored count differs from the notification table and
+        recount each of them under a lock on their counter row, so adjustments
+        committed while reconciling are kept. Returns the number of users
+        whose count was corrected.
+        """
+        from .models import Notification, UnreadNotificationCounter
+
+        actual = dict(
+            Notification.objects.filter(is_read=False)
+            .values("user_id")
+            .annotate(total=Count("id"))
+            .values_list("user_id", "total")
+        )
+        stored = dict(
+            UnreadNotificationCounter.objects.values_list("user_id", "unread_count")
+        )
+        # A snapshot only nominates users; each is checked again below
+        candidates = [
+            user_id
+            for user_id in set(stored) | set(actual)
+            if stored.get(user_id) != actual.get(user_id, 0)
+        ]
+
+        corrected = []
+        for user_id in candidates:
+            with transaction.atomic():
+                counter = (
+                    UnreadNotificationCounter.objects.select_for_update()
+                    .filter(user_id=user_id)
+                    .first()
+                )
+                total = Notification.objects.filter(
+                    user_id=user_id, is_read=False
+                ).count()
+                if counter is None:
+                    self._recount([user_id])
+                elif counter.unread_count != total:
+                    counter.unread_count = total
+                    counter.save(update_fields=["unread_count", "updated_at"])
+                else:
+                    continue
+            corrected.append(user_id)
+
+        if corrected:
+            self._publish(corrected)
+            logger.info(f"Reconciled unread counts for {len(corrected)} users")
+        return len(corrected)
+
+    # ------------------------------------------------------------------
+    # Publishing
+    # ------------------------------------------------------------------
+
+    def _publish_on_commit(self, user_ids):
+        transaction.on_commit(partial(self._publish, list(user_ids)))
+
+    def _publish(self, user_ids):
+        """Copy the committed counts into the cache and push them"""
+        from .models import UnreadNotificationCounter
+
+        try:
+            counts = {user_id: 0 for user_id in user_ids}
+            counts.update(
+                UnreadNotificationCounter.objects.filter(
+                    user_id__in=user_ids
+                ).values_list("user_id", "unread_count")
+            )
+            cache.set_many(
+                {self._key(user_id): total for user_id, total in counts.items()},
+                self.CACHE_TIMEOUT,
+            )
+        except Exception as e:
+            logger.error(f"Failed to publish unread counts: {e}")
+            cache.delete_many([self._key(user_id) for user_id in user_ids])
+            return
+        self._push(counts)
+
+    def _push(self, counts):
+        notification_dispatcher.send_events(
+            [
+                (
+                    user_id,
+                    {
+                        "type": "user_notification",
+                        "message": {"type": "unread_count", "unread_count": total},
+                    },
+                )
+                for user_id, total in counts.items()
+            ]
+        )
+
+
+# Global instance
+unread_counter = UnreadCounter()
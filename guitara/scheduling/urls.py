@@ -6,6 +6,11 @@ from .health_check import health_check, simple_health
 router = DefaultRouter()
 router.register(r"clients", views.ClientViewSet, basename="client")
 router.register(r"availabilities", views.AvailabilityViewSet, basename="availability")
+router.register(
+    r"recurring-availabilities",
+    views.RecurringAvailabilityViewSet,
+    basename="recurring-availability",
+)
 router.register(r"appointments", views.AppointmentViewSet, basename="appointment")
 router.register(r"notifications", views.NotificationViewSet, basename="notification")
 router.register(r"staff", views.StaffViewSet, basename="staff")
@@ -8,8 +8,8 @@ from django_filters.rest_framework import (
     TimeFilter,
     CharFilter,
 )
-from django.db import models
-from django.db.models import Q, F, Prefetch
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, Max, Q, F, Prefetch
 from datetime import datetime, timedelta, date
 from .models import (
     Client,
@@ -17,8 +17,39 @@ from .models import (
     Appointment,
     AppointmentMaterial,
     Notification,
+    ArchivedNotification,
     AppointmentRejection,
+    RecurringAvailability,
+    RecurringAvailabilityException,
 )
+from .appointment_projection import appointment_projection
+from .notification_dispatcher import notification_dispatcher
+from .auto_assignment import AssignmentPlanner, StaleAssignmentPlan, apply_plan
+from .cache_tags import date_tag, tagged_cache
+from .conditional_requests import (
+    APPOINTMENT_DELETIONS_SCOPE,
+    AVAILABILITY_SCOPE,
+    URGENCY_BUCKET_MINUTES,
+    ConditionalListMixin,
+    notifications_scope,
+    scope_modified,
+    time_bucket,
+    touch_scopes,
+)
+from .count_service import count_service
+from .delta_sync import (
+    DEFAULT_LIMIT,
+    ExpiredCursor,
+    InvalidCursor,
+    changes_since,
+    current_cursor,
+)
+from .driver_queue import driver_queue
+from .interval_index import interval_index
+from .recurring_availability import expand_availability
+from .slot_search import find_earliest_slots
+from .time_ranges import day_bounds, overlapping, sweep_overlaps
+from .unread_counter import unread_counter
 from .pagination import (
     AppointmentsPagination,
     StandardResultsPagination,
@@ -55,10 +86,15 @@ except ImportError:
 from .serializers import (
     ClientSerializer,
     AvailabilitySerializer,
+    RecurringAvailabilitySerializer,
+    RecurringAvailabilityExceptionSerializer,
     AppointmentSerializer,
     NotificationSerializer,
+    ArchivedNotificationSerializer,
+    SearchWindowSerializer,
     UserSerializer,
     ServiceSerializer,
+    with_appointment_relations,
 )
 from core.permissions import IsOperator
 from core.models import CustomUser
@@ -162,7 +198,7 @@ class AvailabilityFilter(FilterSet):
         }
 
 
-class AvailabilityViewSet(viewsets.ModelViewSet):
+class AvailabilityViewSet(ConditionalListMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing therapist and driver availability with pagination
     """
@@ -174,6 +210,10 @@ class AvailabilityViewSet(viewsets.ModelViewSet):
     filterset_class = AvailabilityFilter
     ordering_fields = ["date", "start_time", "end_time", "created_at"]
     ordering = ["-date", "start_time"]
+    # Upper bound on windows accepted by search_windows
+    MAX_SEARCH_WINDOWS = 100
+    # Upper bound on (date, slot) pairs accepted by bulk_create
+    MAX_BULK_SLOTS = 1000
 
     def get_queryset(self):
         user = self.request.user
@@ -189,10 +229,18 @@ class AvailabilityViewSet(viewsets.ModelViewSet):
 
     def list(self, request, *args, **kwargs):
         """Override list to handle filtering by staff_id and date parameters"""
+        # Any availability or template change moves the scope timestamp
+        last_modified = scope_modified(AVAILABILITY_SCOPE)
+        etag = self.make_etag(request, last_modified.isoformat())
+        not_modified = self.not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
         # Get query parameters
         staff_id = request.query_params.get("staff_id")
         date_str = request.query_params.get("date")  # Start with the base queryset
         queryset = self.filter_queryset(self.get_queryset())
+        recurring = []
 
         # Apply additional filtering if parameters are provided
         if staff_id:
@@ -204,20 +252,13 @@ class AvailabilityViewSet(viewsets.ModelViewSet):
 
                 date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
 
-                # Get availabilities for the requested date
-                date_availabilities = queryset.filter(date=date_obj)
-
-                # Also get cross-day availabilities from the previous day that extend into this date
+                # Availabilities for the requested date plus cross-day
+                # availabilities from the previous day that extend into it
                 previous_day = date_obj - timedelta(days=1)
-                previous_day_cross_day = queryset.filter(date=previous_day).filter(
-                    # Cross-day indicator: start_time > end_time
-                    start_time__gt=models.F("end_time"),
-                    is_available=True,
+                queryset = overlapping(queryset, *day_bounds(date_obj)).filter(
+                    Q(date=date_obj) | Q(date=previous_day, is_available=True)
                 )
 
-                # Combine both querysets
-                queryset = date_availabilities.union(previous_day_cross_day)
-
                 # Add a flag to distinguish cross-day availabilities
                 for availability in queryset:
                     if (
@@ -229,18 +270,49 @@ class AvailabilityViewSet(viewsets.ModelViewSet):
                     else:
                         availability.is_cross_day = False
 
+                recurring = self._expand_recurring(request, date_obj, staff_id)
+
             except ValueError:
                 pass  # Invalid date format, continue without date filtering
 
         # Serialize and return
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        serializer = self.get_serializer(list(queryset) + recurring, many=True)
+        return self.with_validators(Response(serializer.data), etag, last_modified)
+
+    def _expand_recurring(self, request, date_obj, staff_id=None):
+        """
+        Template occurrences for the date, plus cross-day occurrences from
+        the previous day, filtered like the concrete rows in list()
+        """
+        user_id = request.query_params.get("user") or staff_id
+        if request.user.role != "operator":
+            if user_id and str(user_id) != str(request.user.id):
+                return []
+            user_id = request.user.id
+
+        is_available = request.query_params.get("is_available")
+        if is_available is not None:
+            is_available = is_available.lower() in ("true", "1")
+
+        previous_day = date_obj - timedelta(days=1)
+        return [
+            availability
+            for availability in expand_availability(
+                previous_day,
+                date_obj,
+                user_ids=[user_id] if user_id else None,
+                is_available=is_available,
+            )
+            if availability.date == date_obj
+            or (
+                availability.is_available
+                and availability.end_time < availability.start_time
+            )
+        ]
 
     @action(detail=False, methods=["get"])
     def available_therapists(self, request):
         """Get all available therapists for a given date and time range"""
-        from django.db.models import Q
-
         date_str = request.query_params.get("date")
         start_time_str = request.query_params.get("start_time")
         end_time_str = request.query_params.get("end_time")
@@ -263,164 +335,29 @@ class AvailabilityViewSet(viewsets.ModelViewSet):
                     "error": "Invalid date or time format. Use YYYY-MM-DD for date and HH:MM for time"
                 },
                 status=status.HTTP_400_BAD_REQUEST,
-            )  # Start with therapists who have availability at this time
-        # Handle both same-day and cross-day availability
-        from datetime import timedelta
-
-        # Query logic for availability:
-        # 1. Same day: Normal case where start_time <= requested_time <= end_time
-        # 2. Cross-day: end_time < start_time (spans midnight)
-        #    - For times after start_time on same day
-        #    - For times before end_time on next day
-
-        # Build availability queries
-        same_day_normal = Q(
-            availabilities__date=date_obj,
-            availabilities__start_time__lte=start_time,
-            availabilities__end_time__gte=end_time,
-            availabilities__is_available=True,
-        ) & Q(
-            availabilities__start_time__lte=F(
-                "availabilities__end_time"
-            )  # Normal (non-cross-day)
-        )
-
-        same_day_cross_day = Q(
-            availabilities__date=date_obj,
-            availabilities__start_time__lte=start_time,
-            availabilities__start_time__gt=F(
-                "availabilities__end_time"
-            ),  # Cross-day indicator
-            availabilities__is_available=True,
-        )
+            )
 
-        # For cross-day availability from previous day (when requesting early morning times)
-        previous_day = date_obj - timedelta(days=1)
-        previous_day_cross_day = Q(
-            availabilities__date=previous_day,
-            availabilities__end_time__gte=end_time,
-            availabilities__start_time__gt=F(
-                "availabilities__end_time"
-            ),  # Cross-day indicator
-            availabilities__is_available=True,
+        # The day index covers same-day slots, cross-day slots from the previous
+        # day and bookings spilling over midnight, so no per-therapist queries
+        day_index = interval_index.get_day(date_obj)
+        free_therapists = day_index.free_staff(
+            "therapist",
+            start_time,
+            end_time,
+            specialization=specialization,
+            massage_pressure=massage_pressure,
         )
 
-        available_therapists_query = (
-            CustomUser.objects.filter(
-                Q(role="therapist")
-                & (same_day_normal | same_day_cross_day | previous_day_cross_day)
-            )
-            .select_related()
-            .prefetch_related(
-                Prefetch(
-                    "availabilities",
-                    queryset=Availability.objects.select_related("user"),
-                ),
-                Prefetch(
-                    "therapist_appointments",
-                    queryset=Appointment.objects.select_related("client"),
-                ),
-            )
-            .distinct()
-        )
-
-        # Filter by specialization if provided
-        if specialization:
-            available_therapists_query = available_therapists_query.filter(
-                specialization__icontains=specialization
-            )
-
-        # Filter by massage pressure if provided
-        if massage_pressure:
-            available_therapists_query = available_therapists_query.filter(
-                massage_pressure__icontains=massage_pressure
-            )  # Exclude therapists who have conflicting appointments (including cross-day conflicts)
-        # Normal same-day conflicts
-        same_day_conflicts = Q(
-            therapist_appointments__date=date_obj,
-            therapist_appointments__status__in=["pending", "confirmed", "in_progress"],
-        ) & (
-            Q(therapist_appointments__start_time__lte=end_time)
-            & Q(therapist_appointments__end_time__gte=start_time)
-        )
-
-        # Cross-day conflicts (appointments that span midnight)
-        cross_day_conflicts = Q(
-            therapist_appointments__date=date_obj,
-            therapist_appointments__status__in=["pending", "confirmed", "in_progress"],
-            therapist_appointments__start_time__gt=F(
-                "therapist_appointments__end_time"
-            ),  # Cross-day appointment
-        ) & Q(therapist_appointments__start_time__lte=start_time)
-
-        # Previous day cross-day conflicts
-        previous_day_conflicts = Q(
-            therapist_appointments__date=previous_day,
-            therapist_appointments__status__in=["pending", "confirmed", "in_progress"],
-            therapist_appointments__start_time__gt=F(
-                "therapist_appointments__end_time"
-            ),  # Cross-day appointment
-        ) & Q(therapist_appointments__end_time__gte=end_time)
-
-        conflicting_therapists = CustomUser.objects.filter(
-            same_day_conflicts | cross_day_conflicts | previous_day_conflicts
-        ).distinct()
-
-        available_therapists = available_therapists_query.exclude(
-            pk__in=conflicting_therapists
-        )  # Build custom response with availability data
-        therapists_data = []
-        for therapist in available_therapists:
-            # Get the specific availability for this date (current day first, then previous day for cross-day)
-            availability = therapist.availabilities.filter(date=date_obj).first()
-
-            # If not found on current day, check previous day for cross-day availability
-            if not availability:
-                previous_day = date_obj - timedelta(days=1)
-                cross_day_availabilities = therapist.availabilities.filter(
-                    date=previous_day, is_available=True
-                )
-                # Check for cross-day manually since we can't use F() in filter here
-                for avail in cross_day_availabilities:
-                    if avail.start_time > avail.end_time and avail.end_time >= end_time:
-                        availability = avail
-                        break
-
-            therapist_data = {
-                "id": therapist.id,
-                "first_name": therapist.first_name,
-                "last_name": therapist.last_name,
-                "email": therapist.email,
-                "role": therapist.role,
-                "specialization": getattr(therapist, "specialization", ""),
-                "massage_pressure": getattr(therapist, "massage_pressure", ""),
-                # Add availability data
-                "start_time": (
-                    availability.start_time.strftime("%H:%M") if availability else None
-                ),
-                "end_time": (
-                    availability.end_time.strftime("%H:%M") if availability else None
-                ),
-                "is_available": availability.is_available if availability else False,
-                "availability_date": (
-                    availability.date.strftime("%Y-%m-%d") if availability else None
-                ),
-                # Add cross-day indicator
-                "is_cross_day": (
-                    (availability and availability.end_time < availability.start_time)
-                    if availability
-                    else False
-                ),
-            }
-            therapists_data.append(therapist_data)
+        therapists_data = [
+            self._serialize_free_therapist(therapist, availability)
+            for therapist, availability in free_therapists
+        ]
 
         return Response(therapists_data)
 
     @action(detail=False, methods=["get"])
     def available_drivers(self, request):
         """Get all available drivers for a given date and time range"""
-        from django.db.models import Q
-
         date_str = request.query_params.get("date")
         start_time_str = request.query_params.get("start_time")
         end_time_str = request.query_params.get("end_time")
@@ -443,166 +380,248 @@ class AvailabilityViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Start with drivers who have availability at this time
-        # Handle both same-day and cross-day availability
-        from datetime import timedelta
-
-        # Query logic for availability:
-        # 1. Same day: Normal case where start_time <= requested_time <= end_time
-        # 2. Cross-day: end_time < start_time (spans midnight)
-        #    - For times after start_time on same day
-        #    - For times before end_time on next day
-        # Build availability queries
-        same_day_normal = Q(
-            availabilities__date=date_obj,
-            availabilities__start_time__lte=start_time,
-            availabilities__end_time__gte=end_time,
-            availabilities__is_available=True,
-        ) & Q(
-            availabilities__start_time__lte=F(
-                "availabilities__end_time"
-            )  # Normal (non-cross-day)
-        )
-
-        same_day_cross_day = Q(
-            availabilities__date=date_obj,
-            availabilities__start_time__lte=start_time,
-            availabilities__start_time__gt=F(
-                "availabilities__end_time"
-            ),  # Cross-day indicator
-            availabilities__is_available=True,
-        )
+        day_index = interval_index.get_day(date_obj)
+        free_drivers = day_index.free_staff("driver", start_time, end_time)
 
-        # For cross-day availability from previous day (when requesting early morning times)
-        previous_day = date_obj - timedelta(days=1)
-        previous_day_cross_day = Q(
-            availabilities__date=previous_day,
-            availabilities__end_time__gte=end_time,
-            availabilities__start_time__gt=F(
-                "availabilities__end_time"
-            ),  # Cross-day indicator
-            availabilities__is_available=True,
-        )
+        drivers_data = [
+            self._serialize_free_driver(driver, availability)
+            for driver, availability in free_drivers
+        ]
 
-        available_drivers_query = (
-            CustomUser.objects.filter(
-                Q(role="driver")
-                & (same_day_normal | same_day_cross_day | previous_day_cross_day)
+        return Response(drivers_data)
+
+    @action(detail=False, methods=["post"])
+    def search_windows(self, request):
+        """
+        Find free therapists and drivers for many candidate windows at once.
+        Expects {"windows": [{"date", "start_time", "end_time",
+        "specialization", "massage_pressure"}, ...]}
+        """
+        windows = request.data.get("windows")
+        if not isinstance(windows, list) or not windows:
+            return Response(
+                {"error": "A non-empty list of windows is required"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
-            .select_related()
-            .prefetch_related(
-                Prefetch(
-                    "availabilities",
-                    queryset=Availability.objects.select_related("user"),
-                ),
-                Prefetch(
-                    "driver_appointments",
-                    queryset=Appointment.objects.select_related("client"),
-                ),
+        if len(windows) > self.MAX_SEARCH_WINDOWS:
+            return Response(
+                {
+                    "error": f"At most {self.MAX_SEARCH_WINDOWS} windows can be searched per request"
+                },
+                status=status.HTTP_400_BAD_REQUEST,
             )
-            .distinct()
-        )
-
-        # Exclude drivers who have conflicting appointments (including cross-day conflicts)
-        same_day_conflicts = Q(
-            driver_appointments__date=date_obj,
-            driver_appointments__status__in=["pending", "confirmed", "in_progress"],
-        ) & (
-            Q(driver_appointments__start_time__lte=end_time)
-            & Q(driver_appointments__end_time__gte=start_time)
-        )
-
-        # Cross-day conflicts (appointments that span midnight)
-        cross_day_conflicts = Q(
-            driver_appointments__date=date_obj,
-            driver_appointments__status__in=["pending", "confirmed", "in_progress"],
-            driver_appointments__start_time__gt=F(
-                "driver_appointments__end_time"
-            ),  # Cross-day appointment
-        ) & Q(driver_appointments__start_time__lte=start_time)
-
-        # Previous day cross-day conflicts
-        previous_day_conflicts = Q(
-            driver_appointments__date=previous_day,
-            driver_appointments__status__in=["pending", "confirmed", "in_progress"],
-            driver_appointments__start_time__gt=F(
-                "driver_appointments__end_time"
-            ),  # Cross-day appointment
-        ) & Q(driver_appointments__end_time__gte=end_time)
-
-        conflicting_drivers = CustomUser.objects.filter(
-            same_day_conflicts | cross_day_conflicts | previous_day_conflicts
-        ).distinct()
 
-        available_drivers = available_drivers_query.exclude(pk__in=conflicting_drivers)
+        parsed_windows = []
+        window_errors = []
+        for position, window in enumerate(windows):
+            serializer = SearchWindowSerializer(data=window)
+            if serializer.is_valid():
+                parsed_windows.append((window, serializer.validated_data))
+            else:
+                window_errors.append({"window": position, **serializer.errors})
+        if window_errors:
+            return Response(
+                {
+                    "error": "Invalid windows; dates are YYYY-MM-DD and times HH:MM",
+                    "window_errors": window_errors,
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        # Build custom response with availability data
-        drivers_data = []
-        for driver in available_drivers:
-            # Get the specific availability for this date (current day first, then previous day for cross-day)
-            availability = driver.availabilities.filter(date=date_obj).first()
+        # Each distinct date is loaded once and shared by all of its windows
+        day_indexes = {}
+        results = []
+        for window, fields in parsed_windows:
+            date_obj = fields["date"]
+            if date_obj not in day_indexes:
+                day_indexes[date_obj] = interval_index.get_day(date_obj)
+            day_index = day_indexes[date_obj]
+
+            free_therapists = day_index.free_staff(
+                "therapist",
+                fields["start_time"],
+                fields["end_time"],
+                specialization=fields.get("specialization"),
+                massage_pressure=fields.get("massage_pressure"),
+            )
+            free_drivers = day_index.free_staff(
+                "driver", fields["start_time"], fields["end_time"]
+            )
+            results.append(
+                {
+                    "date": window["date"],
+                    "start_time": window["start_time"],
+                    "end_time": window["end_time"],
+                    "therapists": [
+                        self._serialize_free_therapist(therapist, availability)
+                        for therapist, availability in free_therapists
+                    ],
+                    "drivers": [
+                        self._serialize_free_driver(driver, availability)
+                        for driver, availability in free_drivers
+                    ],
+                }
+            )
 
-            # If not found on current day, check previous day for cross-day availability
-            if not availability:
-                previous_day = date_obj - timedelta(days=1)
-                cross_day_availabilities = driver.availabilities.filter(
-                    date=previous_day, is_available=True
+        return Response({"results": results})
+
+    @action(detail=False, methods=["get"])
+    def earliest_slots(self, request):
+        """
+        Find the earliest (therapist, driver, start) combinations across the
+        whole roster for the chosen services or an explicit duration
+        """
+        params = request.query_params
+        try:
+            start_date = (
+                datetime.strptime(params["date"], "%Y-%m-%d").date()
+                if params.get("date")
+                else timezone.localdate()
+            )
+            horizon_days = min(int(params.get("horizon_days", 7)), 31)
+            limit = min(int(params.get("limit", 5)), 20)
+            service_ids = [
+                int(service_id)
+                for service_id in params.get("services", "").split(",")
+                if service_id.strip()
+            ]
+            duration_minutes = int(params.get("duration_minutes") or 0)
+        except ValueError:
+            return Response(
+                {
+                    "error": "Invalid parameters. Use YYYY-MM-DD for date and integers for services, duration_minutes, horizon_days and limit"
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if service_ids:
+            duration_minutes = sum(
+                Service.objects.filter(id__in=service_ids).values_list(
+                    "duration", flat=True
                 )
-                # Check for cross-day manually since we can't use F() in filter here
-                for avail in cross_day_availabilities:
-                    if avail.start_time > avail.end_time and avail.end_time >= end_time:
-                        availability = avail
-                        break
-
-            driver_data = {
-                "id": driver.id,
-                "first_name": driver.first_name,
-                "last_name": driver.last_name,
-                "email": driver.email,
-                "role": driver.role,
-                "motorcycle_plate": getattr(driver, "motorcycle_plate", ""),
-                # Add availability data
-                "start_time": (
-                    availability.start_time.strftime("%H:%M") if availability else None
-                ),
-                "end_time": (
-                    availability.end_time.strftime("%H:%M") if availability else None
-                ),
-                "is_available": availability.is_available if availability else False,
-                "availability_date": (
-                    availability.date.strftime("%Y-%m-%d") if availability else None
-                ),
-                # Add cross-day indicator
-                "is_cross_day": (
-                    (availability and availability.end_time < availability.start_time)
-                    if availability
-                    else False
-                ),
-            }
-            drivers_data.append(driver_data)
+            )
+        if duration_minutes <= 0 or horizon_days <= 0 or limit <= 0:
+            return Response(
+                {"error": "Services or a positive duration_minutes are required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        return Response(drivers_data)
+        not_before = None
+        if start_date == timezone.localdate():
+            not_before = timezone.localtime().replace(tzinfo=None)
+
+        slots = find_earliest_slots(
+            start_date,
+            duration_minutes,
+            horizon_days=horizon_days,
+            specialization=params.get("specialization"),
+            massage_pressure=params.get("massage_pressure"),
+            needs_driver=params.get("needs_driver", "true").lower()
+            not in ("false", "0", "no"),
+            limit=limit,
+            not_before=not_before,
+        )
+
+        results = []
+        for slot in slots:
+            therapist = slot["therapist"]
+            driver = slot["driver"]
+            results.append(
+                {
+                    "date": slot["start"].strftime("%Y-%m-%d"),
+                    "start_time": slot["start"].strftime("%H:%M"),
+                    "end_time": slot["end"].strftime("%H:%M"),
+                    "is_cross_day": slot["end"].date() != slot["start"].date(),
+                    "therapist": {
+                        "id": therapist["id"],
+                        "first_name": therapist["first_name"],
+                        "last_name": therapist["last_name"],
+                        "specialization": therapist["specialization"] or "",
+                        "massage_pressure": therapist["massage_pressure"] or "",
+                    },
+                    "driver": (
+                        {
+                            "id": driver["id"],
+                            "first_name": driver["first_name"],
+                            "last_name": driver["last_name"],
+                            "motorcycle_plate": driver["motorcycle_plate"] or "",
+                        }
+                        if driver
+                        else None
+                    ),
+                }
+            )
+
+        return Response({"duration_minutes": duration_minutes, "results": results})
+
+    @classmethod
+    def _serialize_free_therapist(cls, therapist, availability):
+        return {
+            "id": therapist["id"],
+            "first_name": therapist["first_name"],
+            "last_name": therapist["last_name"],
+            "email": therapist["email"],
+            "role": therapist["role"],
+            "specialization": therapist["specialization"] or "",
+            "massage_pressure": therapist["massage_pressure"] or "",
+            **cls._serialize_index_availability(availability),
+        }
+
+    @classmethod
+    def _serialize_free_driver(cls, driver, availability):
+        return {
+            "id": driver["id"],
+            "first_name": driver["first_name"],
+            "last_name": driver["last_name"],
+            "email": driver["email"],
+            "role": driver["role"],
+            "motorcycle_plate": driver["motorcycle_plate"] or "",
+            **cls._serialize_index_availability(availability),
+        }
+
+    @staticmethod
+    def _serialize_index_availability(availability):
+        """Availability fields shared by the available_* responses"""
+        return {
+            "start_time": availability["start_time"].strftime("%H:%M"),
+            "end_time": availability["end_time"].strftime("%H:%M"),
+            "is_available": availability["is_available"],
+            "availability_date": availability["date"].strftime("%Y-%m-%d"),
+            # Cross-day slots end earlier in the clock than they start
+            "is_cross_day": availability["end_time"] < availability["start_time"],
+        }
 
     @action(detail=False, methods=["post"])
     def bulk_create(self, request):
-        """Create multiple availability slots at once"""
+        """
+        Create multiple availability slots at once.
+        Accepts a single "date" or a list of "dates"; each slot may also carry
+        its own "date". Every slot is applied to each of its dates.
+        """
         if not request.user.is_authenticated:
             return Response(status=status.HTTP_401_UNAUTHORIZED)
 
         user_id = request.data.get("user_id", request.user.id)
         if request.user.role == "operator" or str(request.user.id) == str(user_id):
-            date_str = request.data.get("date")
+            date_strs = request.data.get("dates") or (
+                [request.data["date"]] if request.data.get("date") else []
+            )
             slots = request.data.get("slots", [])
 
-            if not date_str or not slots:
+            if not slots or not (
+                date_strs or all(isinstance(s, dict) and s.get("date") for s in slots)
+            ):
                 return Response(
                     {"error": "Date and slots are required"},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
             try:
-                date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
-            except ValueError:
+                default_dates = [
+                    datetime.strptime(date_str, "%Y-%m-%d").date()
+                    for date_str in date_strs
+                ]
+            except (TypeError, ValueError):
                 return Response(
                     {"error": "Invalid date format. Use YYYY-MM-DD"},
                     status=status.HTTP_400_BAD_REQUEST,
@@ -617,9 +636,10 @@ class AvailabilityViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            created_slots = []
             errors = []
+            candidates = []
 
+            # Parse every (date, slot) pair up front
             for slot in slots:
                 try:
                     start_time_str = slot.get("start_time")
@@ -628,6 +648,11 @@ class AvailabilityViewSet(viewsets.ModelViewSet):
 
                     start_time = datetime.strptime(start_time_str, "%H:%M").time()
                     end_time = datetime.strptime(end_time_str, "%H:%M").time()
+                    slot_dates = (
+                        [datetime.strptime(slot["date"], "%Y-%m-%d").date()]
+                        if slot.get("date")
+                        else default_dates
+                    )
 
                     if start_time >= end_time:
                         errors.append(
@@ -635,41 +660,122 @@ class AvailabilityViewSet(viewsets.ModelViewSet):
                         )
                         continue
 
-                    # Check for overlapping slots
-                    overlapping = Availability.objects.filter(
-                        user=user, date=date_obj, is_available=is_available
-                    )
-
-                    has_overlap = False
-                    for existing_slot in overlapping:
-                        if (
-                            start_time <= existing_slot.end_time
-                            and end_time >= existing_slot.start_time
-                        ):
-                            errors.append(
-                                f"Time slot {start_time}-{end_time} overlaps with existing slot"
+                    for slot_date in slot_dates:
+                        candidates.append(
+                            Availability(
+                                user=user,
+                                date=slot_date,
+                                start_time=start_time,
+                                end_time=end_time,
+                                is_available=is_available,
                             )
-                            has_overlap = True
-                            break
+                        )
 
-                    if has_overlap:
-                        continue
+                except (TypeError, ValueError) as e:
+                    errors.append(f"Invalid time format in slot: {e}")
+                except Exception as e:
+                    errors.append(f"Error creating slot: {e}")
 
-                    # Create the availability slot
-                    availability = Availability.objects.create(
-                        user=user,
-                        date=date_obj,
-                        start_time=start_time,
-                        end_time=end_time,
-                        is_available=is_available,
+            if len(candidates) > self.MAX_BULK_SLOTS:
+                return Response(
+                    {
+                        "error": f"At most {self.MAX_BULK_SLOTS} slots can be created per request"
+                    },
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            for candidate in candidates:
+                candidate.sync_datetime_range()
+
+            created_slots = []
+            if candidates:
+                # One query for every existing slot around the submitted dates
+                existing_slots = list(
+                    overlapping(
+                        Availability.objects.filter(user=user),
+                        min(candidate.start_at for candidate in candidates),
+                        max(candidate.end_at for candidate in candidates),
+                    ).values_list(
+                        "start_at",
+                        "end_at",
+                        "is_available",
+                        "date",
+                        "start_time",
+                        "end_time",
                     )
+                )
 
-                    created_slots.append(availability)
+                # The unique constraint ignores the availability flag, so the
+                # same times are a duplicate whichever flag either slot has
+                taken = {tuple(row[3:]) for row in existing_slots}
+                unique_candidates = []
+                for candidate in candidates:
+                    times = (candidate.date, candidate.start_time, candidate.end_time)
+                    if times in taken:
+                        errors.append(
+                            f"Time slot {candidate.start_time}-{candidate.end_time} on {candidate.date} already exists"
+                        )
+                    else:
+                        taken.add(times)
+                        unique_candidates.append(candidate)
+                candidates = unique_candidates
+
+                # Otherwise slots only clash with slots of the same flag
+                accepted = []
+                for flag in {candidate.is_available for candidate in candidates}:
+                    group = [c for c in candidates if c.is_available == flag]
+                    clashes = sweep_overlaps(
+                        [
+                            (start_at, end_at)
+                            for start_at, end_at, is_available, *_ in existing_slots
+                            if is_available == flag
+                        ],
+                        [(c.start_at, c.end_at) for c in group],
+                    )
+                    for candidate, clash in zip(group, clashes):
+                        if clash == "existing":
+                            errors.append(
+                                f"Time slot {candidate.start_time}-{candidate.end_time} on {candidate.date} overlaps with existing slot"
+                            )
+                        elif clash == "submitted":
+                            errors.append(
+                                f"Time slot {candidate.start_time}-{candidate.end_time} on {candidate.date} overlaps with another submitted slot"
+                            )
+                        else:
+                            accepted.append(candidate)
 
-                except ValueError as e:
-                    errors.append(f"Invalid time format in slot: {e}")
-                except Exception as e:
-                    errors.append(f"Error creating slot: {e}")
+                if accepted:
+                    accepted.sort(key=lambda candidate: candidate.start_at)
+                    try:
+                        with transaction.atomic():
+                            created_slots = Availability.objects.bulk_create(accepted)
+                    except IntegrityError:
+                        # A concurrent request stored one of these slots first;
+                        # create them one by one to report just the duplicates
+                        created_slots = []
+                        for candidate in accepted:
+                            candidate.pk = None
+                            try:
+                                with transaction.atomic():
+                                    created_slots += Availability.objects.bulk_create(
+                                        [candidate]
+                                    )
+                            except IntegrityError:
+                                errors.append(
+                                    f"Time slot {candidate.start_time}-{candidate.end_time} on {candidate.date} already exists"
+                                )
+                    # bulk_create skips post_save, so refresh the derived
+                    # schedule structures for the affected dates here
+                    created_dates = {slot.date for slot in created_slots}
+                    interval_index.invalidate(*created_dates)
+                    tagged_cache.invalidate(*map(date_tag, created_dates))
+                    count_service.invalidate_table(Availability._meta.db_table)
+                    touch_scopes(AVAILABILITY_SCOPE)
+                    if user.role == "driver":
+                        for slot_date in {
+                            slot.date for slot in created_slots if slot.is_available
+                        }:
+                            driver_queue.release(user.id, slot_date)
 
             # Serialize created slots
             serializer = self.get_serializer(created_slots, many=True)
@@ -727,6 +833,103 @@ class AvailabilityViewSet(viewsets.ModelViewSet):
         serializer.save()
 
 
+class RecurringAvailabilityViewSet(viewsets.ModelViewSet):
+    """
+    Weekly availability templates. Occurrences are expanded on demand by the
+    availability endpoints instead of being stored as Availability rows.
+    """
+
+    serializer_class = RecurringAvailabilitySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = StandardResultsPagination
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ["user", "is_available"]
+    ordering_fields = ["effective_from", "start_time", "created_at"]
+    ordering = ["user", "start_time"]
+
+    def get_queryset(self):
+        user = self.request.user
+        base_queryset = RecurringAvailability.objects.select_related(
+            "user"
+        ).prefetch_related("exceptions")
+
+        # Operators can see all templates
+        if user.role == "operator":
+            return base_queryset
+        # Therapists and drivers can only see their own templates
+        return base_queryset.filter(user=user)
+
+    def _check_target_user(self, target_user):
+        user = self.request.user
+        if not target_user.is_active:
+            from rest_framework.exceptions import ValidationError
+
+            raise ValidationError(
+                f"Cannot create availability for {target_user.first_name} {target_user.last_name}. "
+                "This staff account is currently disabled. Please contact an administrator to reactivate the account."
+            )
+        if user.role != "operator" and target_user != user:
+            from rest_framework.exceptions import PermissionDenied
+
+            raise PermissionDenied("You can only manage your own availability")
+
+    def perform_create(self, serializer):
+        target_user = serializer.validated_data.get("user") or self.request.user
+        self._check_target_user(target_user)
+        serializer.save(user=target_user)
+
+    def perform_update(self, serializer):
+        target_user = serializer.validated_data.get("user") or serializer.instance.user
+        self._check_target_user(target_user)
+        serializer.save()
+
+    @action(detail=True, methods=["post"])
+    def skip_date(self, request, pk=None):
+        """Skip a single occurrence of the template"""
+        template = self.get_object()
+        try:
+            skip_date = datetime.strptime(
+                request.data.get("date", ""), "%Y-%m-%d"
+            ).date()
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "Invalid date format. Use YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        exception, created = RecurringAvailabilityException.objects.get_or_create(
+            template=template,
+            date=skip_date,
+            defaults={"reason": request.data.get("reason", "")},
+        )
+        return Response(
+            RecurringAvailabilityExceptionSerializer(exception).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+    @action(detail=True, methods=["post"])
+    def restore_date(self, request, pk=None):
+        """Undo a skipped occurrence"""
+        template = self.get_object()
+        try:
+            restore_date = datetime.strptime(
+                request.data.get("date", ""), "%Y-%m-%d"
+            ).date()
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "Invalid date format. Use YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        deleted, _ = template.exceptions.filter(date=restore_date).delete()
+        if not deleted:
+            return Response(
+                {"error": "No skipped occurrence on this date"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class AppointmentFilter(FilterSet):
     date_after = DateFilter(field_name="date", lookup_expr="gte")
     date_before = DateFilter(field_name="date", lookup_expr="lte")
@@ -754,7 +957,7 @@ class AppointmentFilter(FilterSet):
         }
 
 
-class AppointmentViewSet(viewsets.ModelViewSet):
+class AppointmentViewSet(ConditionalListMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing appointments/bookings with server-side pagination
     """
@@ -783,9 +986,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         user = (
             self.request.user
         )  # Optimized base queryset with all necessary relationships prefetched
-        base_queryset = Appointment.objects.select_related(
-            "client", "therapist", "driver", "operator", "rejected_by"
-        ).prefetch_related("services", "therapists", "rejection_details")
+        base_queryset = with_appointment_relations(Appointment.objects.all())
 
         # Operators can see all appointments
         if user.role == "operator":
@@ -804,6 +1005,98 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         # Other roles can't see any appointments
         return Appointment.objects.none()
 
+    def list(self, request, *args, **kwargs):
+        """
+        Paginated list that answers unchanged polls with 304.
+        The ETag covers the filtered rows' count and latest updated_at plus
+        the last deletion, without serializing anything. urgency_level is
+        computed from the clock, so the current time bucket is included too.
+        """
+        fingerprint = (
+            self.filter_queryset(self.get_queryset())
+            .order_by()
+            .aggregate(
+                total=Count("id", distinct=True), last_updated=Max("updated_at")
+            )
+        )
+        last_deleted = scope_modified(APPOINTMENT_DELETIONS_SCOPE)
+        urgency_bucket = time_bucket(URGENCY_BUCKET_MINUTES)
+        last_modified = max(
+            filter(None, [fingerprint["last_updated"], last_deleted, urgency_bucket])
+        )
+        etag = self.make_etag(
+            request,
+            fingerprint["total"],
+            fingerprint["last_updated"],
+            last_deleted.isoformat(),
+            urgency_bucket.isoformat(),
+        )
+        not_modified = self.not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        response = super().list(request, *args, **kwargs)
+        return self.with_validators(response, etag, last_modified)
+
+    @action(detail=False, methods=["get"])
+    def changes(self, request):
+        """
+        Delta sync: appointments changed and deleted since ?since=<cursor>.
+        Without since, returns only a starting cursor; take it before the
+        full load. Keep requesting with the returned cursor while has_more.
+        """
+        since = request.query_params.get("since")
+        if not since:
+            return Response(
+                {"appointments": [], "deleted": [], "cursor": current_cursor()}
+            )
+
+        try:
+            limit = int(request.query_params.get("limit", DEFAULT_LIMIT))
+        except ValueError:
+            return Response(
+                {"error": "limit must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            changes = changes_since(self.get_queryset(), since, request.user, limit)
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except ExpiredCursor as e:
+            # The client missed deletions that have since been pruned
+            return Response(
+                {"error": str(e), "full_reload": True}, status=status.HTTP_410_GONE
+            )
+
+        changes["appointments"] = self.get_serializer(
+            changes["appointments"], many=True
+        ).data
+        return Response(changes)
+
+    def _projected_list(self, queryset, paginate=False):
+        """
+        Read-only list through the values() projection: same JSON as
+        AppointmentSerializer, without model instances or per-row queries
+        """
+        ids = queryset.values_list("id", flat=True)
+        page = None
+        if paginate:
+            # Keyset pages read their ordering columns off the rows
+            page = self.paginate_queryset(
+                queryset.select_related(None)
+                .prefetch_related(None)
+                .only("id", "date", "start_time")
+            )
+        if page is not None:
+            ids = [appointment.id for appointment in page]
+        data = appointment_projection.represent(ids)
+        if page is not None:
+            response = self.get_paginated_response(data)
+        else:
+            response = Response(data)
+        return appointment_projection.render(self.request, response)
+
     def get_object(self):
         """
         Always fetch the appointment with all related objects to avoid N+1 queries.
@@ -813,13 +1106,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         return queryset.get(pk=self.kwargs["pk"])
 
     def _get_optimized_appointment(self, pk):
-        return (
-            Appointment.objects.select_related(
-                "client", "therapist", "driver", "operator", "rejected_by"
-            )
-            .prefetch_related("services", "therapists", "rejection_details")
-            .get(pk=pk)
-        )
+        return with_appointment_relations(Appointment.objects.all()).get(pk=pk)
 
     def perform_create(self, serializer):
         # TODO: Re-enable operator-only restriction after fixing auth
@@ -1220,6 +1507,8 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         """Get all appointments for today"""
         today = date.today()
         appointments = self.filter_queryset(self.get_queryset().filter(date=today))
+        if appointment_projection.available():
+            return self._projected_list(appointments)
         serializer = self.get_serializer(appointments, many=True)
         return Response(serializer.data)
 
@@ -1236,6 +1525,8 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                 status__in=["pending", "confirmed"],
             )
         )
+        if appointment_projection.available():
+            return self._projected_list(appointments)
 
         serializer = self.get_serializer(appointments, many=True)
         return Response(serializer.data)
@@ -1269,6 +1560,8 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                 date__lte=week_end,
             )
         )
+        if appointment_projection.available():
+            return self._projected_list(appointments)
 
         serializer = self.get_serializer(appointments, many=True)
         return Response(serializer.data)
@@ -1893,6 +2186,45 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(appointment)
         return Response(serializer.data)
 
+    @action(detail=False, methods=["post"])
+    def auto_assign(self, request):
+        """
+        Propose (and optionally apply) therapist/driver assignments for all
+        pending appointments on a date. Send {"date": ..., "apply": true} to
+        commit the plan atomically.
+        """
+        if request.user.role != "operator":
+            return Response(
+                {"error": "Only operators can run auto-assignment"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        date_str = request.data.get("date")
+        try:
+            day = (
+                datetime.strptime(date_str, "%Y-%m-%d").date()
+                if date_str
+                else timezone.localdate()
+            )
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "Invalid date format. Use YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        plan = AssignmentPlanner(day).plan()
+        if str(request.data.get("apply", "")).lower() not in ("true", "1", "yes"):
+            return Response({**plan, "applied": False})
+
+        try:
+            apply_plan(plan)
+        except StaleAssignmentPlan as e:
+            return Response(
+                {"error": str(e), **plan, "applied": False},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response({**plan, "applied": True})
+
     @action(detail=True, methods=["post"])
     def review_rejection(self, request, pk=None):
         """Operator reviews a rejection - can accept or deny the reason"""
@@ -2068,57 +2400,15 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     def _create_notifications(self, appointment, notification_type, message):
         """Helper method to create notifications for all involved parties"""
         try:
-            # Create notification for therapist
-            if appointment.therapist and hasattr(appointment.therapist, "id"):
-                try:
-                    Notification.objects.create(
-                        user=appointment.therapist,
-                        appointment=appointment,
-                        notification_type=notification_type,
-                        message=message,
-                    )
-                    logger.info(
-                        f"Created notification for therapist {appointment.therapist.username}"
-                    )
-                except Exception as e:
-                    logger.error(f"Error creating notification for therapist: {e}")
-
-            # Create notification for driver
-            if appointment.driver and hasattr(appointment.driver, "id"):
-                try:
-                    Notification.objects.create(
-                        user=appointment.driver,
-                        appointment=appointment,
-                        notification_type=notification_type,
-                        message=message,
-                    )
-                    logger.info(
-                        f"Created notification for driver {appointment.driver.username}"
-                    )
-                except Exception as e:
-                    logger.error(f"Error creating notification for driver: {e}")
-
-            # Create notification for operator
-            if appointment.operator and hasattr(appointment.operator, "id"):
-                try:
-                    Notification.objects.create(
-                        user=appointment.operator,
-                        appointment=appointment,
-                        notification_type=notification_type,
-                        message=message,
-                    )
-                    logger.info(
-                        f"Created notification for operator {appointment.operator.username}"
-                    )
-                except Exception as e:
-                    logger.error(f"Error creating notification for operator: {e}")
-
+            # One bulk insert for every recipient, pushed to each after commit
+            notification_dispatcher.notify_appointment(
+                appointment, notification_type, message
+            )
         except Exception as e:
             logger.error(f"Error in _create_notifications: {e}", exc_info=True)
 
-        # Send WebSocket notification
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
+        # Dashboards listening on the shared group, also after commit
+        notification_dispatcher.broadcast_on_commit(
             "appointments",
             {
                 "type": "appointment_message",
@@ -2132,44 +2422,10 @@ class AppointmentViewSet(viewsets.ModelViewSet):
 
     def _get_next_available_driver_for_pickup(self, appointment):
         """Get the next available driver for pickup using FIFO system"""
-        from datetime import date
-        from django.db.models import Q
-
-        # Get drivers who are available today and not currently busy
-        today = date.today()
-
-        # Find drivers with availability today who are not currently assigned to active appointments
-        available_drivers = (
-            CustomUser.objects.filter(
-                role="driver",
-                is_active=True,
-                # Have availability today
-                availabilities__date=today,
-                availabilities__is_available=True,
-            )
-            .exclude(
-                # Exclude drivers who are currently busy with active appointments
-                Q(
-                    driver_appointments__status__in=[
-                        "in_progress",
-                        "journey",
-                        "arrived",
-                        "driver_assigned_pickup",
-                        "return_journey",
-                    ]
-                )
-                & Q(driver_appointments__date=today)
-            )
-            .distinct()
-        )
-
-        # Apply FIFO logic - get driver who became available earliest
-        if (
-            available_drivers.exists()
-        ):  # Sort by last_available_at (earliest first) for FIFO
-            return available_drivers.order_by("last_available_at").first()
-
-        return None
+        # The queue is kept ordered by last_available_at through appointment
+        # status signals; claiming pops atomically so concurrent pickup
+        # requests cannot receive the same driver
+        return driver_queue.claim(timezone.localdate())
 
     def _get_busy_drivers_with_availability(self, appointment_date):
         """Get drivers who are busy but have availability for the given date"""
@@ -2377,13 +2633,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     def start_journey(self, request, pk=None):
         """Driver starts journey to client location (optimized)"""
         # Use optimized queryset to fetch the appointment
-        appointment = (
-            Appointment.objects.select_related(
-                "client", "therapist", "driver", "operator", "rejected_by"
-            )
-            .prefetch_related("services", "therapists", "rejection_details")
-            .get(pk=pk)
-        )
+        appointment = with_appointment_relations(Appointment.objects.all()).get(pk=pk)
 
         if request.user != appointment.driver:
             return Response(
@@ -2905,37 +3155,43 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         available_driver = self._get_next_available_driver_for_pickup(appointment)
 
         if available_driver:
-            # Auto-assign the driver and require confirmation
-            appointment.status = "driver_assigned_pickup"
-            appointment.pickup_urgency = pickup_urgency
-            appointment.pickup_notes = pickup_notes
-            appointment.pickup_request_time = timezone.now()
-            appointment.driver = (
-                available_driver  # Use the main driver field for pickup assignment
-            )
-
-            # Set estimated pickup time based on urgency
-            from datetime import timedelta
-
-            if pickup_urgency == "urgent":
-                appointment.estimated_pickup_time = timezone.now() + timedelta(
-                    minutes=15
-                )
-            else:
-                appointment.estimated_pickup_time = timezone.now() + timedelta(
-                    minutes=20
-                )
+            # The driver is already out of the queue: put them back if the
+            # assignment does not commit
+            try:
+                with transaction.atomic():
+                    # Auto-assign the driver and require confirmation
+                    appointment.status = "driver_assigned_pickup"
+                    appointment.pickup_urgency = pickup_urgency
+                    appointment.pickup_notes = pickup_notes
+                    appointment.pickup_request_time = timezone.now()
+                    # Use the main driver field for pickup assignment
+                    appointment.driver = available_driver
+
+                    # Set estimated pickup time based on urgency
+                    from datetime import timedelta
+
+                    if pickup_urgency == "urgent":
+                        appointment.estimated_pickup_time = timezone.now() + timedelta(
+                            minutes=15
+                        )
+                    else:
+                        appointment.estimated_pickup_time = timezone.now() + timedelta(
+                            minutes=20
+                        )
 
-            appointment.save()
+                    appointment.save()
 
-            # Create notifications for driver confirmation requirement
-            self._create_notifications(
-                appointment,
-                "driver_assigned_pickup",
-                f"🚖 PICKUP ASSIGNMENT: Driver {available_driver.get_full_name()} automatically assigned for pickup. "
-                f"Client: {appointment.client}, Location: {appointment.location}. "
-                f"Urgency: {pickup_urgency.upper()}. Driver must CONFIRM to proceed.",
-            )
+                    # Create notifications for driver confirmation requirement
+                    self._create_notifications(
+                        appointment,
+                        "driver_assigned_pickup",
+                        f"🚖 PICKUP ASSIGNMENT: Driver {available_driver.get_full_name()} automatically assigned for pickup. "
+                        f"Client: {appointment.client}, Location: {appointment.location}. "
+                        f"Urgency: {pickup_urgency.upper()}. Driver must CONFIRM to proceed.",
+                    )
+            except Exception:
+                driver_queue.requeue(available_driver, timezone.localdate())
+                raise
 
             # Send WebSocket notification to driver
             channel_layer = get_channel_layer()
@@ -3281,6 +3537,8 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     def rejected(self, request):
         """Get rejected appointments with pagination"""
         queryset = self.filter_queryset(self.get_queryset().filter(status="rejected"))
+        if appointment_projection.available():
+            return self._projected_list(queryset, paginate=True)
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -3293,6 +3551,8 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     def pending(self, request):
         """Get pending appointments with pagination"""
         queryset = self.filter_queryset(self.get_queryset().filter(status="pending"))
+        if appointment_projection.available():
+            return self._projected_list(queryset, paginate=True)
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -3341,6 +3601,8 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         queryset = self.filter_queryset(
             self.get_queryset().filter(status="in_progress")
         )
+        if appointment_projection.available():
+            return self._projected_list(queryset, paginate=True)
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -3448,7 +3710,7 @@ class ServiceViewSet(viewsets.ModelViewSet):
         return Service.objects.all()
 
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(ConditionalListMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing notifications with server-side pagination
     """
@@ -3555,17 +3817,35 @@ class NotificationViewSet(viewsets.ModelViewSet):
 
             # OPTIMIZATION: Get counts more efficiently with single queries
             try:
-                # Use aggregate to get both counts in a single query
-                from django.db.models import Count, Case, When, IntegerField
+                from django.db.models import Count
 
                 counts = Notification.objects.filter(user=request.user).aggregate(
                     total_notifications=Count("id"),
-                    unread_notifications=Count(
-                        Case(When(is_read=False, then=1), output_field=IntegerField())
-                    ),
+                    latest_id=Max("id"),
+                    latest_created_at=Max("created_at"),
                 )
                 total_notifications = counts["total_notifications"]
-                unread_notifications = counts["unread_notifications"]
+                # Materialized per user, so no scan of the unread rows
+                unread_notifications = unread_counter.get(request.user.id)
+
+                # Polls that find nothing new get a 304 before serialization;
+                # bulk inserts show up in the counts, edits in the scope time
+                scope_changed = scope_modified(notifications_scope(request.user.id))
+                last_modified = max(
+                    filter(None, [counts["latest_created_at"], scope_changed])
+                )
+                etag = self.make_etag(
+                    request,
+                    total_notifications,
+                    unread_notifications,
+                    counts["latest_id"],
+                    scope_changed.isoformat(),
+                )
+                not_modified = self.not_modified_response(
+                    request, etag, last_modified
+                )
+                if not_modified is not None:
+                    return not_modified
 
                 logger.debug(
                     f"User {request.user.username} has {total_notifications} total notifications, {unread_notifications} unread"
@@ -3574,6 +3854,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
                 logger.warning(f"Error counting notifications: {count_error}")
                 total_notifications = 0
                 unread_notifications = 0
+                etag = last_modified = None
 
             # Get the actual queryset
             queryset = self.get_queryset()
@@ -3590,11 +3871,13 @@ class NotificationViewSet(viewsets.ModelViewSet):
 
             # OPTIMIZATION: Limit queryset to recent notifications if no specific filtering
             # This prevents loading thousands of old notifications
+            # Cursor pages are bounded by the keyset and must not be sliced
             if not any(
                 [
                     request.query_params.get("search"),
                     request.query_params.get("is_read"),
                     request.query_params.get("notification_type"),
+                    "cursor" in request.query_params,
                 ]
             ):
                 # Limit to last 100 notifications for performance
@@ -3607,12 +3890,15 @@ class NotificationViewSet(viewsets.ModelViewSet):
                     # Ensure format_kwarg is set for serializer context
                     self.format_kwarg = getattr(self, "format_kwarg", None)
                     serializer = self.get_serializer(page, many=True)
-                    return self.get_paginated_response(
+                    response = self.get_paginated_response(
                         {
                             "notifications": serializer.data,
                             "unreadCount": unread_notifications,
                         }
                     )
+                    if etag:
+                        self.with_validators(response, etag, last_modified)
+                    return response
             except Exception as pagination_error:
                 logger.warning(
                     f"Pagination error, using full queryset: {pagination_error}"
@@ -3629,13 +3915,16 @@ class NotificationViewSet(viewsets.ModelViewSet):
                     f"Successfully serialized {len(serialized_data)} notifications"
                 )
 
-                return Response(
+                response = Response(
                     {
                         "notifications": serialized_data,
                         "unreadCount": unread_notifications,
                         "totalCount": total_notifications,
                     }
                 )
+                if etag:
+                    self.with_validators(response, etag, last_modified)
+                return response
             except Exception as serialization_error:
                 logger.error(
                     f"Serialization error: {serialization_error}", exc_info=True
@@ -3681,6 +3970,31 @@ class NotificationViewSet(viewsets.ModelViewSet):
         notification.save()
         return Response({"status": "marked as unread"})
 
+    @action(detail=False, methods=["get"])
+    def unread_count(self, request):
+        """Unread notification count for badges, served from the counter"""
+        return Response({"unread_count": unread_counter.get(request.user.id)})
+
+    @action(detail=False, methods=["get"])
+    def history(self, request):
+        """
+        Archived notifications for the current user, newest first; paginated
+        like the list, including ?cursor= keyset pages
+        """
+        queryset = ArchivedNotification.objects.filter(user=request.user).order_by(
+            "-created_at", "-id"
+        )
+        notification_type = request.query_params.get("notification_type")
+        if notification_type:
+            queryset = queryset.filter(notification_type=notification_type)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = ArchivedNotificationSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = ArchivedNotificationSerializer(queryset, many=True)
+        return Response(serializer.data)
+
     @action(detail=False, methods=["get"])
     def debug_all(self, request):
         """Debug endpoint to see all notifications for a user without role filtering"""
@@ -3750,9 +4064,18 @@ class NotificationViewSet(viewsets.ModelViewSet):
         # OPTIMIZATION: Use bulk_update or raw SQL for better performance
         # when marking many notifications as read
         try:
-            count = Notification.objects.filter(
-                user=request.user, is_read=False
-            ).update(is_read=True)
+            with transaction.atomic():
+                # Locking the counter first makes notifications created
+                # meanwhile wait, so their increment lands after the reset
+                unread_counter.lock(request.user.id)
+                count = Notification.objects.filter(
+                    user=request.user, is_read=False
+                ).update(is_read=True)
+                # update() skips the post_save hook that adjusts the counter
+                unread_counter.reset(request.user.id)
+            # ... and the ones that drop cached counts and touch the list scope
+            count_service.invalidate_table(Notification._meta.db_table)
+            touch_scopes(notifications_scope(request.user.id))
             logger.debug(
                 f"Marked {count} notifications as read for user {request.user.username}"
             )
@@ -0,0 +1,144 @@
+"""
+Rolling workload counters for fair staff distribution
+Keeps per-user, per-day counts of completed and in-progress appointments so
+window scores for the whole roster come from a single aggregate read
+"""
+
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+logger = logging.getLogger(__name__)
+
+# Appointment statuses that count towards a staff member's workload
+WORKLOAD_STATUSES = ["completed", "in_progress"]
+
+
+def workload_keys(status, date, therapist_id, driver_id):
+    """(user_id, date) pairs an appointment in this state contributes to"""
+    if status not in WORKLOAD_STATUSES or date is None:
+        return set()
+    return {(user_id, date) for user_id in (therapist_id, driver_id) if user_id}
+
+
+class WorkloadCounters:
+    """Read and maintain StaffDailyWorkload rows"""
+
+    def apply_change(self, old_keys, new_keys):
+        """Decrement keys an appointment left and increment keys it entered"""
+        from .models import StaffDailyWorkload
+
+        changes = [(key, -1) for key in old_keys - new_keys]
+        changes += [(key, 1) for key in new_keys - old_keys]
+        for (user_id, date), delta in changes:
+            row, _ = StaffDailyWorkload.objects.get_or_create(
+                user_id=user_id, date=date
+            )
+            StaffDailyWorkload.objects.filter(pk=row.pk).update(
+                appointment_count=F("appointment_count") + delta
+            )
+
+    def _totals(self, appointments):
+        """Counts per (user_id, date) with one GROUP BY per staff column"""
+        totals = {}
+        for field in ("therapist_id", "driver_id"):
+            rows = (
+                appointments.exclude(**{field: None})
+                .values(field, "date")
+                .annotate(total=Count("id"))
+            )
+            for row in rows:
+                key = (row[field], row["date"])
+                totals[key] = totals.get(key, 0) + row["total"]
+        return totals
+
+    def _correct(self, keys):
+        """
+        Recount keys with their counter rows locked. apply_change updates the
+        same rows, so it waits for this transaction and then adds its delta on
+        top of the recount instead of being overwritten by it.
+        """
+        from .models import Appointment, StaffDailyWorkload
+
+        user_ids = {user_id for user_id, _ in keys}
+        dates = {date for _, date in keys}
+        with transaction.atomic():
+            StaffDailyWorkload.objects.bulk_create(
+                [StaffDailyWorkload(user_id=u, date=d) for u, d in keys],
+                ignore_conflicts=True,
+            )
+            rows = {
+                (row.user_id, row.date): row
+                for row in StaffDailyWorkload.objects.select_for_update()
+                .filter(user_id__in=user_ids, date__in=dates)
+                .order_by("user_id", "date")
+            }
+            fresh = self._totals(
+                Appointment.objects.filter(
+                    status__in=WORKLOAD_STATUSES, date__in=dates
+                ).filter(Q(therapist_id__in=user_ids) | Q(driver_id__in=user_ids))
+            )
+            changed = []
+            for key in keys:
+                row = rows[key]
+                if row.appointment_count != fresh.get(key, 0):
+                    row.appointment_count = fresh.get(key, 0)
+                    changed.append(row)
+            StaffDailyWorkload.objects.bulk_update(changed, ["appointment_count"])
+        return len(changed)
+
+    def rebuild(self, since=None, batch_size=500):
+        """
+        Correct counters that drifted from the appointments. A snapshot only
+        nominates the drifted keys; each batch is recounted under row locks,
+        so increments made while the rebuild runs are kept. Returns the number
+        of rows corrected.
+        """
+        from .models import Appointment, StaffDailyWorkload
+
+        appointments = Appointment.objects.filter(status__in=WORKLOAD_STATUSES)
+        stored = StaffDailyWorkload.objects.all()
+        if since is not None:
+            appointments = appointments.filter(date__gte=since)
+            stored = stored.filter(date__gte=since)
+
+        totals = self._totals(appointments)
+        counts = {
+            (user_id, date): count
+            for user_id, date, count in stored.values_list(
+                "user_id", "date", "appointment_count"
+            )
+        }
+        drifted = sorted(
+            key
+            for key in set(totals) | set(counts)
+            if totals.get(key, 0) != counts.get(key, 0)
+        )
+
+        corrected = 0
+        for start in range(0, len(drifted), batch_size):
+            corrected += self._correct(drifted[start : start + batch_size])
+        return corrected
+
+    def scores(self, user_ids, date, window_days=7):
+        """Workload over the window ending on date for every user, in one query"""
+        from .models import StaffDailyWorkload
+
+        rows = (
+            StaffDailyWorkload.objects.filter(
+                user_id__in=list(user_ids),
+                date__gte=date - timedelta(days=window_days),
+                date__lte=date,
+            )
+            .values("user_id")
+            .annotate(total=Sum("appointment_count"))
+        )
+        result = {user_id: 0 for user_id in user_ids}
+        result.update({row["user_id"]: row["total"] for row in rows})
+        return result
+
+
+# Global instance
+workload_counters = WorkloadCounters()